@@ -17,3 +17,40 @@ STREAMING_PROTOCOL=cv2.CAP_DSHOW
 # Opc-UA server configuration   
 OPC_SERVER_HOST = "0.0.0.0"
 OPC_SERVER_PORT = 4840
+# Seconds between samples per variable while a client is subscribed
+OPC_SAMPLING_INTERVALS = {"Temperature": 2.0, "Humidity": 2.0, "FanSpeed": 1.0}
+# Seconds between samples while no client is subscribed, also the history resolution during that time
+OPC_IDLE_SAMPLING_INTERVAL = 10.0
+# Read the DHT22 on DHT_PIN instead of generating random values
+USE_DHT_SENSOR = False
+DHT_PIN = 4
+# Values kept per variable for HistoryRead, also stored in OPC_HISTORY_DB (None keeps them in memory only)
+OPC_HISTORY_CAPACITY = 43200
+OPC_HISTORY_DAYS = 7
+OPC_HISTORY_DB = "sensor_history.db"
+OPC_HISTORY_FLUSH_INTERVAL = 30.0
+# Windows in seconds of the aggregate variables and seconds between their updates
+OPC_AGGREGATE_WINDOWS = {"1Min": 60, "15Min": 900}
+OPC_AGGREGATE_INTERVAL = 10.0
+
+# Supervisor in start_services.py
+# Seconds between health checks and between resource usage reports
+SUPERVISOR_CHECK_INTERVAL = 5.0
+SUPERVISOR_REPORT_INTERVAL = 60.0
+# Restart delay doubles after every crash up to the maximum, and resets once a service ran SUPERVISOR_STABLE_AFTER seconds
+SUPERVISOR_BACKOFF_INITIAL = 1.0
+SUPERVISOR_BACKOFF_MAX = 60.0
+SUPERVISOR_STABLE_AFTER = 60.0
+# Seconds after a start before liveness probes count, and failed probes in a row that restart a service
+SUPERVISOR_STARTUP_GRACE = 30.0
+SUPERVISOR_PROBE_FAILURES = 3
+# Seconds a service may exceed its CPU limit (percent of one core) or memory limit (MB of RSS) before it is restarted
+SUPERVISOR_LIMIT_GRACE = 30.0
+OPC_CPU_LIMIT = 100.0
+OPC_MEMORY_LIMIT_MB = 300.0
+STREAM_CPU_LIMIT = 300.0
+STREAM_MEMORY_LIMIT_MB = 500.0
+# stream.py reports its FPS to the supervisor on this local UDP port, None disables the heartbeat
+STREAM_HEARTBEAT_PORT = 9998
+STREAM_HEARTBEAT_TIMEOUT = 15.0
+STREAM_MIN_FPS = 1.0
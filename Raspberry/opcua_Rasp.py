@@ -1,10 +1,14 @@
-from opcua import Server, ua
+from asyncua import Server, ua
+from asyncua.common.callback import CallbackType
+from concurrent.futures import ThreadPoolExecutor
 import random
 import asyncio
 import json
 import config
 import os
 import datetime
+import time
+from sensor_history import SensorHistory
 from cryptography import x509
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import rsa
@@ -92,55 +96,166 @@ def _generate_self_signed_cert(cert_path, key_path, hostname, app_uri):
         f.write(certificate.public_bytes(serialization.Encoding.PEM))
     print(f"New certificate was saved in {cert_path} and key in {key_path}.")
 
-async def get_sensor():
+def read_sensor():
+    """
+    Reads temperature and humidity. Blocks for up to a few seconds, so only call it in an executor.
+    """
+    if not config.USE_DHT_SENSOR:
+        return random.uniform(1, 50), random.uniform(10, 100)
     import Adafruit_DHT
-    DHT_SENSOR = Adafruit_DHT.DHT22
-    DHT_PIN = 4
-    
-    humidity, temperature = Adafruit_DHT.read_retry(DHT_SENSOR, DHT_PIN)
+    humidity, temperature = Adafruit_DHT.read_retry(Adafruit_DHT.DHT22, config.DHT_PIN)
     if humidity is not None and temperature is not None:
-        print(f"Temperature={temperature:.1f}°C  Humidity={humidity:.1f}%")
         return temperature, humidity
-    
-    else:
-        print("Sensor could not be read.")
-        return None, None
+    print("Sensor could not be read.")
+    return None, None
+
+
+class SensorReader:
+    """
+    Runs sensor reads in a single worker thread and shares each reading between the variables.
+    """
+    def __init__(self, read_function=read_sensor):
+        self.read_function = read_function
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sensor")
+        self.reading = (None, None)
+        self.read_at = float("-inf")
+        self._pending = None
+
+    async def read(self, max_age):
+        """
+        Returns the last reading if it is younger than max_age seconds, otherwise reads the sensor.
+        Concurrent callers share one read.
+        """
+        if time.monotonic() - self.read_at < max_age:
+            return self.reading
+        if self._pending is None:
+            self._pending = asyncio.get_running_loop().run_in_executor(self.executor, self.read_function)
+        pending = self._pending
+        try:
+            reading = await asyncio.shield(pending)
+        finally:
+            if self._pending is pending and pending.done():
+                self._pending = None
+        self.reading = reading
+        self.read_at = time.monotonic()
+        return reading
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def has_subscribers(server):
+    return bool(server.iserver.subscription_service.subscriptions)
+
+
+async def write_double(server, node, value):
+    """
+    Writes a value directly to the address space, subscribed clients are notified of the change.
+    Values of historized nodes are also stored in the history.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    data_value = ua.DataValue(
+        ua.Variant(float(value), ua.VariantType.Double), SourceTimestamp=now, ServerTimestamp=now
+    )
+    await server.write_attribute_value(node.nodeid, data_value)
+    await server.iserver.history_manager.storage.save_node_value(node.nodeid, data_value)
+
+
+async def enable_history(server, node):
+    """
+    Marks a variable as historized, so clients can read its history with HistoryRead.
+    """
+    await node.write_attribute(ua.AttributeIds.Historizing, ua.DataValue(True))
+    await node.set_attr_bit(ua.AttributeIds.AccessLevel, ua.AccessLevel.HistoryRead)
+    await node.set_attr_bit(ua.AttributeIds.UserAccessLevel, ua.AccessLevel.HistoryRead)
+    await server.iserver.history_manager.storage.new_historized_node(
+        node.nodeid, datetime.timedelta(days=config.OPC_HISTORY_DAYS)
+    )
+
+
+async def publish_aggregates(server, history, aggregates):
+    """
+    Writes mean, min and max of every sensor variable over each window in OPC_AGGREGATE_WINDOWS
+    every OPC_AGGREGATE_INTERVAL seconds.
+    """
+    while True:
+        for (source, seconds), nodes in aggregates.items():
+            result = history.aggregate(source.nodeid, seconds)
+            if result is not None:
+                for node, value in zip(nodes, result):
+                    await write_double(server, node, value)
+        await asyncio.sleep(config.OPC_AGGREGATE_INTERVAL)
+
+
+async def sample_variable(server, node, interval, sample, subscribed):
+    """
+    Writes the value returned by sample every interval seconds, but only if it changed.
+    Without subscribed clients it samples every OPC_IDLE_SAMPLING_INTERVAL seconds at most,
+    until the subscribed event is set.
+    """
+    loop = asyncio.get_running_loop()
+    last_value = None
+    next_sample = loop.time()
+    while True:
+        active = has_subscribers(server)
+        if not active:
+            subscribed.clear()
+        period = interval if active else max(interval, config.OPC_IDLE_SAMPLING_INTERVAL)
+        value = await sample(period)
+        if value is not None and value != last_value:
+            await write_double(server, node, value)
+            last_value = value
+        next_sample = max(next_sample + period, loop.time())
+        if active:
+            await asyncio.sleep(next_sample - loop.time())
+            continue
+        try:
+            await asyncio.wait_for(subscribed.wait(), next_sample - loop.time())
+            next_sample = loop.time()
+        except asyncio.TimeoutError:
+            pass
+
 
 async def run_server():
     server = Server()
+    history = SensorHistory(config.OPC_HISTORY_CAPACITY, config.OPC_HISTORY_DB, config.OPC_HISTORY_FLUSH_INTERVAL)
+    server.iserver.history_manager.set_storage(history)
+    await server.init()
 
     app_uri = f"urn:{config.OPC_SERVER_HOST.lower()}:{server.get_application_uri().split(':')[-1]}" 
-    server.application_uri = app_uri
+    await server.set_application_uri(app_uri)
 
     if not os.path.exists(CERT_FILE) or not os.path.exists(KEY_FILE):
         print(f"Certificate ({CERT_FILE}) or key ({KEY_FILE}) not found.")
-        _generate_self_signed_cert(CERT_FILE, KEY_FILE, config.OPC_SERVER_HOST, server.application_uri)
+        _generate_self_signed_cert(CERT_FILE, KEY_FILE, config.OPC_SERVER_HOST, server.get_application_uri())
     else:
         print(f"Using existing certificate {CERT_FILE} and key {KEY_FILE}")
     
-    server.load_certificate(CERT_FILE)
-    server.load_private_key(KEY_FILE)
+    await server.load_certificate(CERT_FILE)
+    await server.load_private_key(KEY_FILE)
 
     server.set_security_policy([
         ua.SecurityPolicyType.Basic256Sha256_SignAndEncrypt,
         ua.SecurityPolicyType.Basic256Sha256_Sign,
     ])
     
-    endpoint = server.set_endpoint(f"opc.tcp://{config.OPC_SERVER_HOST}:{config.OPC_SERVER_PORT}/freeopcua/server/")
+    server.set_endpoint(f"opc.tcp://{config.OPC_SERVER_HOST}:{config.OPC_SERVER_PORT}/freeopcua/server/")
     server.set_server_name("SensorDataServer")
     
     uri = "http://example.org"
-    idx = server.register_namespace(uri)
+    idx = await server.register_namespace(uri)
+    sensor = SensorReader()
+    tasks = []
     
     try:
-        device = server.nodes.objects.add_object(idx, "Device")
+        device = await server.nodes.objects.add_object(idx, "Device")
         
-        fan_speed = device.add_variable(idx, "FanSpeed", 0.0)
-        temperature = device.add_variable(idx, "Temperature", 0.0)
-        humidity = device.add_variable(idx, "Humidity", 0.0)
-        set_fan_speed = device.add_variable(idx, "SetFanSpeed", 0.0)
+        fan_speed = await device.add_variable(idx, "FanSpeed", 0.0)
+        temperature = await device.add_variable(idx, "Temperature", 0.0)
+        humidity = await device.add_variable(idx, "Humidity", 0.0)
+        set_fan_speed = await device.add_variable(idx, "SetFanSpeed", 0.0)
        
-        set_fan_speed.set_writable()
+        await set_fan_speed.set_writable()
         
         node_ids = {
             "FanSpeed": fan_speed.nodeid.to_string(),
@@ -148,44 +263,71 @@ async def run_server():
             "Humidity": humidity.nodeid.to_string(),
             "SetFanSpeed": set_fan_speed.nodeid.to_string(),
         }
+
+        # Device/Aggregates/<Variable>/Mean1Min, Min1Min, Max1Min, Mean15Min, ...
+        aggregates = {}
+        aggregates_object = await device.add_object(idx, "Aggregates")
+        for name, source in (("FanSpeed", fan_speed), ("Temperature", temperature), ("Humidity", humidity)):
+            await enable_history(server, source)
+            source_object = await aggregates_object.add_object(idx, name)
+            for label, seconds in config.OPC_AGGREGATE_WINDOWS.items():
+                nodes = []
+                for statistic in ("Mean", "Min", "Max"):
+                    node = await source_object.add_variable(idx, f"{statistic}{label}", 0.0)
+                    node_ids[f"{name}.{statistic}{label}"] = node.nodeid.to_string()
+                    nodes.append(node)
+                aggregates[(source, seconds)] = nodes
         
-        node_ids_variable = device.add_variable(
-        idx, "NodeIDs", json.dumps(node_ids)
-        )
-        node_ids_variable.set_writable(False)
+        await device.add_variable(idx, "NodeIDs", json.dumps(node_ids))
         
         print(f"NodeIDs variable created with NodeID: {node_ids}")
 
-        server.start()
-        print("Server started successfully.")
-
-        while True:
-            current_set_fan_speed = set_fan_speed.get_value()
-           
-            if current_set_fan_speed != 0:
-                fan_speed.set_value(current_set_fan_speed)
-            else:
-                fan_speed.set_value(random.uniform(0, 100))
-
-           # Comment for Raspberry Pi 
-            temperature.set_value(random.uniform(1, 50))
-            humidity.set_value(random.uniform(10, 100))
-            
-            # Uncomment for reading from a real sensor
-            
-            # sensor_temperature, sensor_humidity = await get_sensor()
-            # if sensor_temperature is not None and sensor_humidity is not None:
-            #     temperature.set_value(sensor_temperature)
-            #     humidity.set_value(sensor_humidity)
-       
-            await asyncio.sleep(1)
+        fan = {"set_speed": 0.0}
+        subscribed = asyncio.Event()
+
+        async def on_subscription(event, dispatcher):
+            """Wakes the idle samplers, so a new subscriber gets fresh values at full rate."""
+            subscribed.set()
+
+        async def on_write(event, dispatcher):
+            """Applies a written SetFanSpeed right away instead of waiting for the next sample."""
+            for write_value, status in zip(event.request_params.NodesToWrite, event.response_params):
+                if write_value.NodeId == set_fan_speed.nodeid and status.is_good():
+                    fan["set_speed"] = float(write_value.Value.Value.Value)
+                    if fan["set_speed"] != 0:
+                        await write_double(server, fan_speed, fan["set_speed"])
+
+        async def sample_fan_speed(max_age):
+            # Without a set speed the fan speed is simulated
+            return fan["set_speed"] if fan["set_speed"] != 0 else random.uniform(0, 100)
+
+        async def sample_temperature(max_age):
+            return (await sensor.read(max_age))[0]
+
+        async def sample_humidity(max_age):
+            return (await sensor.read(max_age))[1]
+
+        server.subscribe_server_callback(CallbackType.PostWrite, on_write)
+        server.subscribe_server_callback(CallbackType.ItemSubscriptionCreated, on_subscription)
+
+        async with server:
+            print("Server started successfully.")
+            intervals = config.OPC_SAMPLING_INTERVALS
+            tasks = [
+                asyncio.create_task(sample_variable(server, fan_speed, intervals["FanSpeed"], sample_fan_speed, subscribed)),
+                asyncio.create_task(sample_variable(server, temperature, intervals["Temperature"], sample_temperature, subscribed)),
+                asyncio.create_task(sample_variable(server, humidity, intervals["Humidity"], sample_humidity, subscribed)),
+            ]
+            tasks.append(asyncio.create_task(publish_aggregates(server, history, aggregates)))
+            await asyncio.gather(*tasks)
 
     except Exception as e:
         print(f"An error occurred: {e}")
     finally:
-        if server:
-            server.stop()
-            print("Server stopped.")
+        for task in tasks:
+            task.cancel()
+        sensor.close()
+        print("Server stopped.")
 
 if __name__ == "__main__":
-    asyncio.run(run_server())
\ No newline at end of file
+    asyncio.run(run_server())
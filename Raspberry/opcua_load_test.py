@@ -0,0 +1,149 @@
+"""
+Load test for the OPC UA server: how many concurrently subscribed clients does the Pi sustain?
+
+For every step, the given number of clients connect at the same time, subscribe to
+FanSpeed, Temperature and Humidity, and count the data change notifications for
+--duration seconds. All clients watch the same values, so they should all receive the
+same notifications. A step is sustained if every client connected, none received less
+than 95 % of the notifications of the best client, and the p95 latency stayed below one
+second. The latency is the receive time minus the server's source timestamp,
+so the clocks of both machines have to be in sync. Pass --server-pid when running on
+the Pi itself to also report the CPU load of the server process.
+
+Usage:
+    python opcua_load_test.py opc.tcp://<pi>:4840/freeopcua/server/ --clients 1 5 10 25 50
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from asyncua import Client, ua
+from asyncua.crypto.cert_gen import setup_self_signed_certificate
+from asyncua.crypto.security_policies import SecurityPolicyBasic256Sha256
+from cryptography.x509.oid import ExtendedKeyUsageOID
+
+NAMESPACE = "http://example.org"
+VARIABLES = ("FanSpeed", "Temperature", "Humidity")
+
+
+class NotificationCounter:
+    def __init__(self):
+        self.notifications = 0
+        self.latencies = []
+
+    def datachange_notification(self, node, val, data):
+        self.notifications += 1
+        source_timestamp = data.monitored_item.Value.SourceTimestamp
+        if source_timestamp is not None:
+            self.latencies.append(time.time() - source_timestamp.timestamp())
+
+    def status_change_notification(self, status):
+        pass
+
+
+async def client_certificate():
+    """Generates a self-signed client certificate in a temporary directory."""
+    directory = Path(tempfile.mkdtemp())
+    app_uri = f"urn:{socket.gethostname()}:opcua-load-test"
+    await setup_self_signed_certificate(
+        directory / "client_key.pem",
+        directory / "client_cert.der",
+        app_uri,
+        socket.gethostname(),
+        [ExtendedKeyUsageOID.CLIENT_AUTH],
+        {"countryName": "DE", "organizationName": "OPC UA Load Test"},
+    )
+    return app_uri, str(directory / "client_cert.der"), str(directory / "client_key.pem")
+
+
+async def run_client(url, certificate, interval, counter):
+    client = Client(url=url)
+    if certificate:
+        app_uri, cert_path, key_path = certificate
+        client.application_uri = app_uri
+        await client.set_security(
+            SecurityPolicyBasic256Sha256, cert_path, key_path, mode=ua.MessageSecurityMode.SignAndEncrypt
+        )
+    await client.connect()
+    idx = await client.get_namespace_index(NAMESPACE)
+    nodes = [await client.nodes.objects.get_child([f"{idx}:Device", f"{idx}:{name}"]) for name in VARIABLES]
+    subscription = await client.create_subscription(interval, counter)
+    await subscription.subscribe_data_change(nodes, queuesize=1, sampling_interval=interval)
+    return client
+
+
+def process_cpu_seconds(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+async def run_step(url, count, certificate, interval, duration, server_pid):
+    counters = [NotificationCounter() for _ in range(count)]
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(run_client(url, certificate, interval, counter) for counter in counters), return_exceptions=True
+    )
+    connect_time = time.perf_counter() - started
+    clients = [result for result in results if isinstance(result, Client)]
+    errors = [result for result in results if not isinstance(result, Client)]
+    # Let the initial values arrive before counting
+    await asyncio.sleep(interval / 1000 * 2)
+    for counter in counters:
+        counter.notifications = 0
+        counter.latencies.clear()
+    cpu_before = process_cpu_seconds(server_pid) if server_pid else None
+    await asyncio.sleep(duration)
+    cpu = (process_cpu_seconds(server_pid) - cpu_before) / duration * 100 if server_pid else None
+    await asyncio.gather(*(client.disconnect() for client in clients), return_exceptions=True)
+    connected = [counter for counter, result in zip(counters, results) if isinstance(result, Client)]
+    rates = np.array([counter.notifications / duration for counter in connected]) if connected else np.zeros(1)
+    latencies = np.concatenate([counter.latencies for counter in connected if counter.latencies] or [np.zeros(1)])
+    return {
+        "clients": count,
+        "connected": len(clients),
+        "errors": sorted({type(error).__name__ for error in errors}),
+        "connect_s": connect_time,
+        "min_rate": float(rates.min()),
+        "mean_rate": float(rates.mean()),
+        "max_rate": float(rates.max()),
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p95_ms": float(np.percentile(latencies, 95) * 1000),
+        "cpu": cpu,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Load test the OPC UA server with concurrently subscribed clients")
+    parser.add_argument("url", nargs="?", default="opc.tcp://127.0.0.1:4840/freeopcua/server/")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 5, 10, 25, 50])
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to count notifications per step")
+    parser.add_argument("--interval", type=float, default=500.0, help="Requested sampling and publishing interval in ms")
+    parser.add_argument("--no-security", action="store_true", help="Connect without encryption, e.g. to a test server")
+    parser.add_argument("--server-pid", type=int, help="PID of the server process, to report its CPU load")
+    args = parser.parse_args()
+    certificate = None if args.no_security else await client_certificate()
+    print(f"{'clients':>7} {'connected':>9} {'connect s':>9} {'min/s':>7} {'mean/s':>7} {'p50 ms':>7} {'p95 ms':>7} {'cpu %':>6}  result")
+    for count in args.clients:
+        step = await run_step(args.url, count, certificate, args.interval, args.duration, args.server_pid)
+        sustained = (
+            step["connected"] == count
+            and step["min_rate"] >= 0.95 * step["max_rate"]
+            and step["p95_ms"] < 1000
+        )
+        cpu = f"{step['cpu']:.0f}" if step["cpu"] is not None else "-"
+        result = "sustained" if sustained else "degraded " + ",".join(step["errors"])
+        print(
+            f"{count:>7} {step['connected']:>9} {step['connect_s']:>9.2f} {step['min_rate']:>7.2f} {step['mean_rate']:>7.2f} "
+            f"{step['p50_ms']:>7.1f} {step['p95_ms']:>7.1f} {cpu:>6}  {result}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,200 @@
+from asyncua import ua
+from asyncua.server.history import HistoryStorageInterface
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import asyncio
+import sqlite3
+import time
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Fixed-size buffer of timestamped values, the oldest value is overwritten when it is full.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.head = 0
+        self.count = 0
+
+    def append(self, timestamp, value):
+        self.timestamps[self.head] = timestamp
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def ordered(self):
+        """
+        Returns all timestamps and values in chronological order.
+        """
+        if self.count < self.capacity:
+            return self.timestamps[:self.count], self.values[:self.count]
+        return np.roll(self.timestamps, -self.head), np.roll(self.values, -self.head)
+
+    def window(self, since, until):
+        """
+        Returns the values in [since, until] and the last value before since, which still held at since.
+        """
+        timestamps, values = self.ordered()
+        start = max(np.searchsorted(timestamps, since, side="left") - 1, 0)
+        end = np.searchsorted(timestamps, until, side="right")
+        return timestamps[start:end], values[start:end]
+
+    def aggregate(self, since, until):
+        """
+        Returns the time-weighted mean, the min and the max over [since, until], or None without values.
+        Values are only stored when they change, so each one is weighted by how long it held.
+        """
+        timestamps, values = self.window(since, until)
+        if len(values) == 0 or timestamps[0] > until:
+            return None
+        weights = np.diff(np.append(np.clip(timestamps, since, until), until))
+        total = weights.sum()
+        mean = float(values @ weights / total) if total > 0 else float(values[-1])
+        return mean, float(values.min()), float(values.max())
+
+
+class SensorHistory(HistoryStorageInterface):
+    """
+    History backend that keeps the values of each historized node in a NumPy ring buffer.
+
+    With a database path the values are also written to SQLite in batches, and the ring
+    buffers are filled from it again when the server starts.
+    """
+    def __init__(self, capacity, db_path=None, flush_interval=30.0, max_history_data_response_size=10000):
+        super().__init__(max_history_data_response_size)
+        self.capacity = capacity
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.buffers = {}
+        self.periods = {}
+        self._pending = []
+        self._db = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history")
+        self._flush_task = None
+
+    async def _run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    def _open(self):
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS history (node TEXT, timestamp REAL, value REAL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS history_node_timestamp ON history (node, timestamp)")
+        self._db.commit()
+
+    async def init(self):
+        if self.db_path:
+            await self._run(self._open)
+            self._flush_task = asyncio.create_task(self._flush_periodically())
+
+    def _load(self, node, limit):
+        rows = self._db.execute(
+            "SELECT timestamp, value FROM history WHERE node = ? ORDER BY timestamp DESC LIMIT ?", (node, limit)
+        ).fetchall()
+        return rows[::-1]
+
+    async def new_historized_node(self, node_id, period, count=0):
+        buffer = RingBuffer(min(count, self.capacity) if count else self.capacity)
+        self.buffers[node_id] = buffer
+        self.periods[node_id] = period
+        if self._db:
+            for timestamp, value in await self._run(self._load, node_id.to_string(), buffer.capacity):
+                buffer.append(timestamp, value)
+
+    async def save_node_value(self, node_id, datavalue):
+        buffer = self.buffers.get(node_id)
+        if buffer is None or datavalue.Value is None:
+            return
+        timestamp = (datavalue.SourceTimestamp or datetime.now(timezone.utc)).timestamp()
+        value = float(datavalue.Value.Value)
+        buffer.append(timestamp, value)
+        if self._db:
+            self._pending.append((node_id.to_string(), timestamp, value))
+
+    def aggregate(self, node_id, seconds):
+        """
+        Returns mean, min and max of the last seconds of a historized node, or None without values.
+        """
+        now = time.time()
+        return self.buffers[node_id].aggregate(now - seconds, now)
+
+    async def read_node_history(self, node_id, start, end, nb_values):
+        buffer = self.buffers.get(node_id)
+        if buffer is None:
+            return [], None
+        timestamps, values = buffer.ordered()
+        period = self.periods.get(node_id)
+        oldest = (time.time() - period.total_seconds()) if period else float("-inf")
+        unset = ua.get_win_epoch()
+        start = start.timestamp() if start and start != unset else None
+        end = end.timestamp() if end and end != unset else None
+        if start is not None and end is not None and start > end:
+            # Start after end means newest first
+            low, high, reverse = end, start, True
+        else:
+            low, high, reverse = start, end, start is None
+        first = np.searchsorted(timestamps, max(low, oldest) if low is not None else oldest, side="left")
+        last = np.searchsorted(timestamps, high, side="right") if high is not None else len(timestamps)
+        selected = np.arange(first, last)
+        if reverse:
+            selected = selected[::-1]
+        if nb_values:
+            selected = selected[:nb_values]
+        cont = None
+        if len(selected) > self.max_history_data_response_size:
+            cont = datetime.fromtimestamp(timestamps[selected[self.max_history_data_response_size]], timezone.utc)
+            selected = selected[:self.max_history_data_response_size]
+        results = []
+        for index in selected:
+            moment = datetime.fromtimestamp(timestamps[index], timezone.utc)
+            results.append(ua.DataValue(
+                ua.Variant(float(values[index]), ua.VariantType.Double), SourceTimestamp=moment, ServerTimestamp=moment
+            ))
+        return results, cont
+
+    def _write(self, rows):
+        self._db.executemany("INSERT INTO history VALUES (?, ?, ?)", rows)
+        for node, buffer in self.buffers.items():
+            timestamps, _ = buffer.ordered()
+            # Keep the database bounded like the ring buffer
+            if buffer.count == buffer.capacity:
+                self._db.execute(
+                    "DELETE FROM history WHERE node = ? AND timestamp < ?", (node.to_string(), float(timestamps[0]))
+                )
+        self._db.commit()
+
+    async def flush(self):
+        """
+        Writes the values received since the last flush to the database in one transaction.
+        """
+        if not self._db or not self._pending:
+            return
+        rows, self._pending = self._pending, []
+        await self._run(self._write, rows)
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except sqlite3.Error as e:
+                print(f"Sensor history could not be written: {e}")
+
+    async def new_historized_event(self, source_id, evtypes, period, count=0):
+        raise ua.UaStatusCodeError(ua.StatusCodes.BadNotImplemented)
+
+    async def save_event(self, event):
+        pass
+
+    async def read_event_history(self, source_id, start, end, nb_values, evfilter):
+        return [], None
+
+    async def stop(self):
+        if self._flush_task:
+            self._flush_task.cancel()
+        if self._db:
+            await self.flush()
+            await self._run(self._db.close)
+        self._executor.shutdown(wait=False)
@@ -1,111 +1,335 @@
-import threading
+import asyncio
+import json
 import signal
-import time
+import socket
 import sys
-import subprocess
+import time
 import os
+from pathlib import Path
+
+from asyncua import Client, ua
+from asyncua.crypto.cert_gen import setup_self_signed_certificate
+from asyncua.crypto.security_policies import SecurityPolicyBasic256Sha256
+from cryptography.x509.oid import ExtendedKeyUsageOID
+import config
 
+PROBE_CERT_FILE = "./certs/supervisor_cert.der"
+PROBE_KEY_FILE = "./certs/supervisor_key.pem"
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
 
-shutdown_event = threading.Event()
-processes = []
 
-def run_script_as_process(script_path, thread_name):
-    """Run a Python script as a subprocess."""
+def read_usage(pid):
+    """
+    Returns the CPU seconds and the resident memory in MB of a process, or None without /proc.
+    """
     try:
-        print(f"Starting {thread_name} from {script_path}...")
-        
-        process = subprocess.Popen([sys.executable, script_path])
-        processes.append(process)
-        
-        
-        while process.poll() is None and not shutdown_event.is_set():
-            time.sleep(0.5)
-            
-        if process.poll() is None:  
-            print(f"Terminating {thread_name}...")
-            process.terminate()
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS, resident_pages * PAGE_SIZE / 2**20
+
+
+class OPCUAProbe:
+    """
+    Reads the server state over an encrypted session like the robot's client does.
+    The session is kept between checks and opened again after a failure.
+    """
+    def __init__(self, url, timeout=5.0):
+        self.url = url
+        self.timeout = timeout
+        self.client = None
+
+    async def _connect(self):
+        app_uri = f"urn:{socket.gethostname()}:supervisor"
+        await setup_self_signed_certificate(
+            Path(PROBE_KEY_FILE),
+            Path(PROBE_CERT_FILE),
+            app_uri,
+            socket.gethostname(),
+            [ExtendedKeyUsageOID.CLIENT_AUTH],
+            {"countryName": "DE", "organizationName": "OPC UA Supervisor"},
+        )
+        client = Client(url=self.url, timeout=self.timeout)
+        client.application_uri = app_uri
+        await client.set_security(
+            SecurityPolicyBasic256Sha256, PROBE_CERT_FILE, PROBE_KEY_FILE, mode=ua.MessageSecurityMode.SignAndEncrypt
+        )
+        await asyncio.wait_for(client.connect(), self.timeout)
+        self.client = client
+
+    async def check(self):
+        """
+        Returns None if the server answers a read and is running, otherwise the problem.
+        """
+        try:
+            if self.client is None:
+                await self._connect()
+            state_node = self.client.get_node(ua.NodeId(ua.ObjectIds.Server_ServerStatus_State))
+            state = await asyncio.wait_for(state_node.read_value(), self.timeout)
+        except Exception as e:
+            await self.reset()
+            return f"OPC UA read failed: {e!r}"
+        if state != ua.ServerState.Running:
+            return f"OPC UA server state is {ua.ServerState(state).name}"
+        return None
+
+    async def reset(self):
+        if self.client is not None:
+            client, self.client = self.client, None
             try:
-                process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                print(f"Forcefully killing {thread_name}...")
-                process.kill()
-                process.wait()
-        
-        exitcode = process.returncode
-        print(f"{thread_name} exited with code {exitcode}")
-        
-    except Exception as e:
-        print(f"Error managing {thread_name}: {e}")
-
-def signal_handler(sig, frame):
-    """Handle Ctrl+C and other termination signals."""
-    print("\nShutdown signal received. Stopping services...")
-    shutdown_event.set()
-
-def main():
-    
+                await asyncio.wait_for(client.disconnect(), self.timeout)
+            except Exception:
+                pass
+
+
+class HeartbeatProbe(asyncio.DatagramProtocol):
+    """
+    Receives the FPS heartbeats of stream.py. Fails without a heartbeat for timeout seconds,
+    or while the stream is connected but sends fewer than min_fps frames per second.
+    """
+    def __init__(self, timeout, min_fps):
+        self.timeout = timeout
+        self.min_fps = min_fps
+        self.received_at = None
+        self.fps = None
+        self.connected = False
+        self.started_at = time.monotonic()
+
+    def datagram_received(self, data, addr):
+        try:
+            message = json.loads(data)
+            self.fps = float(message["fps"])
+            self.connected = bool(message["connected"])
+        except (ValueError, KeyError, TypeError):
+            return
+        self.received_at = time.monotonic()
+
+    async def check(self):
+        silent = time.monotonic() - (self.received_at or self.started_at)
+        if silent > self.timeout:
+            return f"no heartbeat for {silent:.0f} s"
+        if self.connected and self.fps < self.min_fps:
+            return f"streaming at {self.fps:.1f} FPS"
+        return None
+
+    async def reset(self):
+        self.received_at = None
+        self.fps = None
+        self.connected = False
+        self.started_at = time.monotonic()
+
+
+class Service:
+    """
+    A script run as a child process, with an optional liveness probe and resource limits.
+    """
+    def __init__(self, name, script_path, probe=None, cpu_limit=None, memory_limit_mb=None):
+        self.name = name
+        self.script_path = script_path
+        self.probe = probe
+        self.cpu_limit = cpu_limit
+        self.memory_limit_mb = memory_limit_mb
+        self.process = None
+        self.started_at = None
+        self.restarts = 0
+        self.crashes = 0
+        self.cpu_percent = None
+        self.memory_mb = None
+        self._cpu_sample = None
+        self._over_limit_since = None
+
+    async def start(self):
+        print(f"Starting {self.name} from {self.script_path}...")
+        self.process = await asyncio.create_subprocess_exec(sys.executable, self.script_path)
+        self.started_at = time.monotonic()
+        self.cpu_percent = None
+        self.memory_mb = None
+        self._cpu_sample = None
+        self._over_limit_since = None
+        if self.probe:
+            await self.probe.reset()
+
+    async def stop(self, timeout=5.0):
+        if self.process is None or self.process.returncode is not None:
+            return
+        print(f"Terminating {self.name}...")
+        self.process.terminate()
+        try:
+            await asyncio.wait_for(self.process.wait(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Forcefully killing {self.name}...")
+            self.process.kill()
+            await self.process.wait()
+
+    def sample_usage(self):
+        """Updates the CPU load since the last sample in percent of one core and the resident memory."""
+        usage = read_usage(self.process.pid)
+        if usage is None:
+            return
+        cpu_seconds, self.memory_mb = usage
+        now = time.monotonic()
+        if self._cpu_sample is not None and now > self._cpu_sample[0]:
+            self.cpu_percent = (cpu_seconds - self._cpu_sample[1]) / (now - self._cpu_sample[0]) * 100
+        self._cpu_sample = (now, cpu_seconds)
+
+    def limit_exceeded(self):
+        """Returns the exceeded limit once it was exceeded for SUPERVISOR_LIMIT_GRACE seconds, otherwise None."""
+        exceeded = None
+        if self.cpu_limit and self.cpu_percent is not None and self.cpu_percent > self.cpu_limit:
+            exceeded = f"CPU at {self.cpu_percent:.0f} % (limit {self.cpu_limit:.0f} %)"
+        if self.memory_limit_mb and self.memory_mb is not None and self.memory_mb > self.memory_limit_mb:
+            exceeded = f"memory at {self.memory_mb:.0f} MB (limit {self.memory_limit_mb:.0f} MB)"
+        if exceeded is None:
+            self._over_limit_since = None
+            return None
+        if self._over_limit_since is None:
+            self._over_limit_since = time.monotonic()
+        if time.monotonic() - self._over_limit_since >= config.SUPERVISOR_LIMIT_GRACE:
+            return exceeded
+        return None
+
+    def status(self):
+        if self.process is None or self.process.returncode is not None:
+            return f"{self.name}: stopped, {self.restarts} restarts"
+        cpu = f"{self.cpu_percent:.0f} %" if self.cpu_percent is not None else "-"
+        memory = f"{self.memory_mb:.0f} MB" if self.memory_mb is not None else "-"
+        uptime = time.monotonic() - self.started_at
+        return (
+            f"{self.name}: PID {self.process.pid}, up {uptime:.0f} s, CPU {cpu}, memory {memory}, {self.restarts} restarts"
+        )
+
+
+async def watch_health(service):
+    """
+    Returns why the service has to be restarted: a resource limit it keeps exceeding,
+    or a liveness probe that failed SUPERVISOR_PROBE_FAILURES times in a row.
+    """
+    probe_failures = 0
+    while True:
+        await asyncio.sleep(config.SUPERVISOR_CHECK_INTERVAL)
+        service.sample_usage()
+        exceeded = service.limit_exceeded()
+        if exceeded:
+            return exceeded
+        if service.probe is None or time.monotonic() - service.started_at < config.SUPERVISOR_STARTUP_GRACE:
+            continue
+        problem = await service.probe.check()
+        if problem is None:
+            probe_failures = 0
+            continue
+        probe_failures += 1
+        print(f"{service.name} liveness probe failed ({probe_failures}/{config.SUPERVISOR_PROBE_FAILURES}): {problem}")
+        if probe_failures >= config.SUPERVISOR_PROBE_FAILURES:
+            return problem
+
+
+async def supervise(service, shutdown_event):
+    """
+    Runs the service until shutdown and restarts it with exponential backoff when it exits or becomes unhealthy.
+    """
+    while not shutdown_event.is_set():
+        try:
+            await service.start()
+        except OSError as e:
+            print(f"Error starting {service.name}: {e}")
+            break
+        exited = asyncio.create_task(service.process.wait())
+        health = asyncio.create_task(watch_health(service))
+        shutdown = asyncio.create_task(shutdown_event.wait())
+        await asyncio.wait({exited, health, shutdown}, return_when=asyncio.FIRST_COMPLETED)
+        health.cancel()
+        shutdown.cancel()
+        if health.done() and not health.cancelled():
+            print(f"{service.name} is unhealthy: {health.result()}")
+        await service.stop()
+        await exited
+        print(f"{service.name} exited with code {service.process.returncode}")
+        if shutdown_event.is_set():
+            break
+        if time.monotonic() - service.started_at >= config.SUPERVISOR_STABLE_AFTER:
+            service.crashes = 0
+        delay = min(config.SUPERVISOR_BACKOFF_INITIAL * 2 ** service.crashes, config.SUPERVISOR_BACKOFF_MAX)
+        service.crashes += 1
+        service.restarts += 1
+        print(f"Restarting {service.name} in {delay:.0f} s...")
+        try:
+            await asyncio.wait_for(shutdown_event.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+    if service.probe:
+        await service.probe.reset()
+
+
+async def report_usage(services):
+    while True:
+        await asyncio.sleep(config.SUPERVISOR_REPORT_INTERVAL)
+        for service in services:
+            print(service.status())
+
+
+def use_pidfd_child_watcher():
+    """
+    Waits for the children with pidfds in the event loop instead of one waitpid thread per child.
+    Python 3.12 and newer do this by default on Linux.
+    """
+    if sys.version_info >= (3, 12) or not hasattr(os, "pidfd_open"):
+        return
+    try:
+        os.close(os.pidfd_open(os.getpid()))
+    except OSError:
+        # Kernel without pidfd support, keep the default watcher
+        return
+    watcher = asyncio.PidfdChildWatcher()
+    watcher.attach_loop(asyncio.get_running_loop())
+    asyncio.set_child_watcher(watcher)
+
+
+async def main():
+    loop = asyncio.get_running_loop()
+    use_pidfd_child_watcher()
+    shutdown_event = asyncio.Event()
+
+    def signal_handler(sig, frame):
+        """Handle Ctrl+C and other termination signals."""
+        print("\nShutdown signal received. Stopping services...")
+        loop.call_soon_threadsafe(shutdown_event.set)
+
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
 
-    
     current_dir = os.path.dirname(os.path.abspath(__file__))
-    opcua_script = os.path.join(current_dir, "opcua_Rasp.py")
-    stream_script = os.path.join(current_dir, "stream.py")
-    
-    print("Starting services as separate processes...")
-    
-    
-    opcua_thread = threading.Thread(
-        target=run_script_as_process, 
-        args=(opcua_script, "OPC UA Server"),
-        name="OPCUAProcessManager"
-    )
-    
-    stream_thread = threading.Thread(
-        target=run_script_as_process, 
-        args=(stream_script, "Video Stream"),
-        name="StreamProcessManager"
-    )
-    
-    opcua_thread.daemon = True
-    stream_thread.daemon = True
-    
-    opcua_thread.start()
-    stream_thread.start()
-    
-    print("Process manager threads started. Press Ctrl+C to stop all services.")
-    
+    opcua_probe = OPCUAProbe(f"opc.tcp://127.0.0.1:{config.OPC_SERVER_PORT}/freeopcua/server/")
+    heartbeat_probe = None
+    if config.STREAM_HEARTBEAT_PORT:
+        heartbeat_probe = HeartbeatProbe(config.STREAM_HEARTBEAT_TIMEOUT, config.STREAM_MIN_FPS)
+        await loop.create_datagram_endpoint(
+            lambda: heartbeat_probe, local_addr=("127.0.0.1", config.STREAM_HEARTBEAT_PORT)
+        )
+    services = [
+        Service(
+            "OPC UA Server", os.path.join(current_dir, "opcua_Rasp.py"), opcua_probe,
+            config.OPC_CPU_LIMIT, config.OPC_MEMORY_LIMIT_MB,
+        ),
+        Service(
+            "Video Stream", os.path.join(current_dir, "stream.py"), heartbeat_probe,
+            config.STREAM_CPU_LIMIT, config.STREAM_MEMORY_LIMIT_MB,
+        ),
+    ]
+
+    print("Starting services as separate processes. Press Ctrl+C to stop all services.")
+    reporter = asyncio.create_task(report_usage(services))
     try:
-        
-        while not shutdown_event.is_set():
-            
-            if not opcua_thread.is_alive() and not stream_thread.is_alive():
-                print("All process manager threads terminated. Exiting.")
-                break
-            time.sleep(0.5)
-                
-    except KeyboardInterrupt:
-        print("\nKeyboard interrupt received in main thread.")
+        await asyncio.gather(*(supervise(service, shutdown_event) for service in services))
     finally:
-        
-        shutdown_event.set()
-        
-        
-        for process in processes:
-            if process.poll() is None:  
-                try:
-                    print(f"Terminating process with PID {process.pid}...")
-                    process.terminate()
-                    process.wait(timeout=3)
-                except subprocess.TimeoutExpired:
-                    print(f"Forcefully killing process with PID {process.pid}...")
-                    process.kill()
-        
-        print("Waiting for process manager threads to complete...")
-        opcua_thread.join(timeout=5)
-        stream_thread.join(timeout=5)
-        
+        reporter.cancel()
+        for service in services:
+            print(service.status())
         print("All processes terminated. Main program exiting.")
 
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    asyncio.run(main())
@@ -3,10 +3,48 @@ import socket
 import struct
 import time
 import asyncio  
+import json
 from datetime import datetime, timedelta
 import config
 
 
+class Heartbeat:
+    """
+    Reports the streaming FPS to the supervisor in start_services.py over local UDP, at most once per interval.
+    """
+    def __init__(self, port, interval=1.0):
+        self.address = ("127.0.0.1", port)
+        self.interval = interval
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM) if port else None
+        self.frames = 0
+        self.window_start = time.monotonic()
+
+    def send(self, fps, connected):
+        if self.socket is None:
+            return
+        try:
+            self.socket.sendto(json.dumps({"fps": fps, "connected": connected}).encode(), self.address)
+        except OSError:
+            pass
+
+    def frame_sent(self):
+        self.frames += 1
+        elapsed = time.monotonic() - self.window_start
+        if elapsed >= self.interval:
+            self.send(self.frames / elapsed, True)
+            self.frames = 0
+            self.window_start = time.monotonic()
+
+    def waiting(self):
+        """Reports that the streamer is alive but not connected, so it has no frames to count."""
+        self.send(0.0, False)
+        self.frames = 0
+        self.window_start = time.monotonic()
+
+
+heartbeat = Heartbeat(config.STREAM_HEARTBEAT_PORT)
+
+
 async def try_connect_to_server(server_ip, server_port, max_retries=5, retry_delay=3):
     """Attempts to connect to the server with retries."""
     print(f"Attempting to connect to {server_ip}:{server_port}...")
@@ -17,6 +55,7 @@ async def try_connect_to_server(server_ip, server_port, max_retries=5, retry_del
             return reader, writer
         except (socket.error, ConnectionRefusedError, OSError) as e:
             print(f"Connection attempt {attempt + 1}/{max_retries} failed: {e}")
+            heartbeat.waiting()
             if attempt + 1 < max_retries:
                 await asyncio.sleep(retry_delay)
             else:
@@ -111,6 +150,7 @@ async def send_frames_async(reader, writer, cap, target_fps, display_locally, st
                 writer.write(message_size + data)
                 await writer.drain()
                 frame_count += 1
+                heartbeat.frame_sent()
 
                 if frame_count % (int(actual_camera_fps) or 30) == 0:  
                     elapsed = time.monotonic() - start_time
@@ -196,6 +236,7 @@ async def robust_video_stream_async(
                     print("Failed to connect. Retrying in 5 seconds...")
                     if not running:
                         break  
+                    heartbeat.waiting()
                     await asyncio.sleep(5)
                     continue
 
@@ -1,7 +1,11 @@
 from math import sqrt
 
 from dobot_control import DoBotControl
+from motion_queue import MotionSequence
 from utils.communication import send_message
+from utils.detection_codec import BGR_COLORS
+from utils.detection_feed import DetectionFeed
+from utils.price_schedule import SortingCostModel
 
 class AutomatedSorter(DoBotControl):
     def __init__(self, main_window: object, speed: int = 500) -> None:
@@ -16,46 +20,100 @@ class AutomatedSorter(DoBotControl):
         """
         super().__init__(main_window, speed=speed)
         self.main_window = main_window
+        self.occlusion_radius: float = 40
+        self.detections: DetectionFeed | None = None
+        self.block_wait: float = 1.0
+        self.cost_model = SortingCostModel(reference_speed=speed)
 
-    def get_next_block(self) -> tuple[float, float, str]:
+    def start_detection_feed(self) -> bool:
+        """
+        Subscribe to the detections of the pi, or keep the existing subscription.
+
+        Returns:
+            bool: True if the feed is live, otherwise get_next_block polls the pi.
+        """
+        host, port = self.main_window.tcp_host, self.main_window.tcp_port
+        if self.detections is not None and (self.detections.host, self.detections.port) != (host, port):
+            self.detections.stop()
+            self.detections = None
+        if self.detections is None:
+            self.detections = DetectionFeed(host, port)
+        return self.detections.start()
+
+    def get_next_block(self, timeout: float = 0) -> tuple[float, float, str]:
         """
         Get the next block position and color from the pi.
 
+        With a live detection feed the block is taken from the pushed detections and a
+        block that shows up within the timeout is returned as soon as it is detected.
+        Otherwise the pi is asked once.
+
+        Args:
+            timeout (float, optional): Seconds to wait for a block with a live feed. Default is 0.
+
         Returns:
             tuple[float, float, str]: The x and y position of the block and its color.
         """
+        if self.detections is not None and self.detections.live:
+            block = self.detections.wait_for(self._select_block, timeout)
+            if block is not None or self.detections.live:
+                return block or (0, 0, "none")
         response = send_message(self, {"type": "color"})
         print(response)
-        for object in response["objects"]:
+        return self._select_block(response["objects"]) or (0, 0, "none")
+
+    def count_blocks(self) -> int:
+        """
+        Count the detected blocks within reach, e.g. to estimate how long sorting will take.
+
+        Returns:
+            int: The number of blocks.
+        """
+        if self.detections is not None and self.detections.live:
+            count = self.detections.wait_for(lambda objects: sum(object["robot_pos"]["x"] > 55 for object in objects))
+            if count is not None:
+                return count
+        response = send_message(self, {"type": "color"})
+        if response is None:
+            return 0
+        return sum(object["robot_pos"]["x"] > 55 for object in response["objects"])
+
+    def _select_block(self, objects: list[dict]) -> tuple[float, float, str] | None:
+        """
+        Pick the first detected object that is within reach.
+
+        Args:
+            objects (list[dict]): The detected objects with "robot_pos" and either "color" (binary encoding) or "bgr" (JSON).
+
+        Returns:
+            tuple[float, float, str] | None: The x and y position of the block and its color, or None.
+        """
+        for object in objects:
             if object["robot_pos"]["x"] > 55:
-                if object["bgr"] == "255,0,0":
-                    color = "blue"
-                elif object["bgr"] == "0,255,0":
-                    color = "green"
-                elif object["bgr"] == "0,0,255":
-                    color = "red"
-                elif object["bgr"] == "0,255,255":
-                    color = "yellow"
-                else:
-                    raise ValueError(f"Unknown color: {object['bgr']}")
+                color = object.get("color") or BGR_COLORS.get(object.get("bgr"))
+                if color is None or color == "unknown":
+                    raise ValueError(f"Unknown color: {object.get('bgr', color)}")
                 return object["robot_pos"]["x"], object["robot_pos"]["y"], color
-        return 0, 0, "none"
+        return None
 
-    def move_block_to_storage(self, block_x: float, block_y: float, color: str) -> None:
+    def plan_block_to_storage(self, block_x: float, block_y: float, color: str) -> tuple[MotionSequence, MotionSequence, int]:
         """
-        Move the robot to the storage position based on the color.
+        Plan the pick-and-place of a block as two motion sequences.
+
+        The first sequence picks the block and carries it above its storage, the second one
+        puts it down and returns home. Splitting at the storage lets the caller do other
+        work (e.g. look for the next block) while the arm is out of the camera's way.
 
         Args:
             block_x (float): The x position of the block.
             block_y (float): The y position of the block.
             color (str): The color of the block.
+
+        Returns:
+            tuple[MotionSequence, MotionSequence, int]: The carry sequence, the release sequence and the storage index.
         """
         # FIXME: Check if hight is good
         storage_factor: int = 15
-        self.move_to_position(block_x, block_y, storage_factor)
-        self.move_to_position(block_x, block_y, 0)
-        self.bot.suck(True)
-        self.move_to_position(block_x, block_y, storage_factor)
         target_storage = getattr(self, f"{color}_storage")
         storage_x, storage_y = target_storage[0]
         i = -1
@@ -77,11 +135,62 @@ class AutomatedSorter(DoBotControl):
         storage_y: float = storage_y * pow(0.98, storage_level)
         target_x: float = storage_x * scale
         target_y: float = storage_y * scale
-        self.move_to_position(target_x, target_y, storage_z + storage_factor)
-        self.move_to_position(storage_x, storage_y, storage_z + storage_factor)
-        self.move_to_position(storage_x, storage_y, storage_z)
-        self.bot.suck(False)
-        self.move_to_position(storage_x, storage_y, storage_z + storage_factor)
+        carry = (
+            MotionSequence()
+            .move(block_x, block_y, storage_factor)
+            .move(block_x, block_y, 0)
+            .suck(True)
+            .move(block_x, block_y, storage_factor)
+            .move(target_x, target_y, storage_z + storage_factor)
+            .move(storage_x, storage_y, storage_z + storage_factor)
+        )
+        release = (
+            MotionSequence()
+            .move(storage_x, storage_y, storage_z)
+            .suck(False)
+            .move(storage_x, storage_y, storage_z + storage_factor)
+            .move(target_x, target_y, storage_z + storage_factor)
+            .move(self.homeX, self.homeY, self.homeZ, 0)
+        )
+        return carry, release, i
+
+    def move_block_to_storage(self, block_x: float, block_y: float, color: str) -> None:
+        """
+        Move the robot to the storage position based on the color.
+        The whole pick-and-place is queued at once and only the last command is waited on.
+
+        Args:
+            block_x (float): The x position of the block.
+            block_y (float): The y position of the block.
+            color (str): The color of the block.
+        """
+        carry, release, i = self.plan_block_to_storage(block_x, block_y, color)
+        self.motion.run(carry.extend(release))
         self.main_window.storage_counts[i] += 1
-        self.move_to_position(target_x, target_y, storage_z + storage_factor)
-        self.move_home()
\ No newline at end of file
+
+    def is_occluded(self, block_x: float, block_y: float, arm_x: float, arm_y: float, picked_x: float, picked_y: float) -> bool:
+        """
+        Check if a detection may be hidden or faked by the arm.
+
+        A detection is not trusted if it lies close to the arm between its base and the
+        end effector, or if it is still the block the arm has just picked up.
+
+        Args:
+            block_x (float): The x position of the detected block.
+            block_y (float): The y position of the detected block.
+            arm_x (float): The x position of the end effector when the block was detected.
+            arm_y (float): The y position of the end effector when the block was detected.
+            picked_x (float): The x position of the block that was picked last.
+            picked_y (float): The y position of the block that was picked last.
+
+        Returns:
+            bool: True if the detection should be requested again once the arm is home.
+        """
+        if sqrt(pow(block_x - picked_x, 2) + pow(block_y - picked_y, 2)) < self.occlusion_radius:
+            return True
+        arm_length_sq: float = pow(arm_x, 2) + pow(arm_y, 2)
+        if arm_length_sq == 0:
+            return sqrt(pow(block_x, 2) + pow(block_y, 2)) < self.occlusion_radius
+        t: float = max(0.0, min(1.0, (block_x * arm_x + block_y * arm_y) / arm_length_sq))
+        distance: float = sqrt(pow(block_x - t * arm_x, 2) + pow(block_y - t * arm_y, 2))
+        return distance < self.occlusion_radius
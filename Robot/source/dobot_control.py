@@ -1,10 +1,14 @@
 import asyncio
-from asyncio import create_task
+import struct
+from asyncio import create_task, wrap_future
+from concurrent.futures import Future
 from math import sqrt, pow, atan2, cos, sin
+from time import sleep
 
 from pydobot import Dobot
 from pydobot.enums import PTPMode
 
+from motion_queue import MotionQueue, MotionSequence
 from utils.config import read_config
 from utils.function import increase_storage
 
@@ -34,6 +38,47 @@ class CustomDobot(Dobot):
         """
         self._set_ptp_cmd(x, y, z, r, mode = mode, wait = wait)
 
+    def queue_move_to(self, x, y, z, r, mode = PTPMode.MOVJ_XYZ) -> int:
+        """
+        Put a move into the Dobot command queue without waiting for it.
+
+        Args:
+            x (float): The x-coordinate.
+            y (float): The y-coordinate.
+            z (float): The z-coordinate.
+            r (float): The rotation angle.
+            mode (int, optional): The movement mode. Defaults to PTPMode.MOVJ_XYZ.
+
+        Returns:
+            int: The queued command index of the move.
+        """
+        response = self._set_ptp_cmd(x, y, z, r, mode = mode, wait = False)
+        return struct.unpack_from("L", response.params, 0)[0]
+
+    def queue_suck(self, enable: bool) -> int:
+        """
+        Put a suction cup command into the Dobot command queue without waiting for it.
+
+        Args:
+            enable (bool): Whether the suction cup should be enabled.
+
+        Returns:
+            int: The queued command index of the command.
+        """
+        response = self._set_end_effector_suction_cup(enable)
+        return struct.unpack_from("L", response.params, 0)[0]
+
+    def wait_for_index(self, index: int, poll_interval: float = 0.05) -> None:
+        """
+        Block until the Dobot has executed the queued command with the given index.
+
+        Args:
+            index (int): The queued command index to wait for.
+            poll_interval (float, optional): Seconds between index polls. Defaults to 0.05.
+        """
+        while self._get_queued_cmd_current_index() < index:
+            sleep(poll_interval)
+
 
 class DoBotControl():
     def __init__(self, main_window: object, homeX: float = 300, homeY: float = 0, homeZ: float = 0, speed: int = 500) -> None:
@@ -52,6 +97,7 @@ class DoBotControl():
         self.homeY: float = homeY
         self.homeZ: float = homeZ
         self.bot = None
+        self.motion = MotionQueue()
         self.connected: bool = False
         self.speed: int = speed
         self.color_list: list[str] = ["blue", "green", "red", "yellow"]
@@ -67,31 +113,51 @@ class DoBotControl():
     async def dobot_connect(self) -> None:
         """Attempts to connect to the Dobot device."""
         try:
-            self.bot = CustomDobot(port = read_config(self.main_window)["robot"]["com_port"])
+            port = read_config(self.main_window)["robot"]["com_port"]
+            self.bot = await wrap_future(self.motion.call(self._open_bot, port))
             self.connected = True
             self.set_speed(self.speed)
-            self.move_home()
+            await self.motion.run_async(self.home_sequence())
         except Exception as e:
             self.bot = None
+            self.motion.call(self.motion.reset, None)
             self.connected = False
         return self.connected
 
+    def _open_bot(self, port: str) -> CustomDobot:
+        """
+        Open the serial connection to the Dobot. Runs on the serial thread of the motion queue.
+
+        Args:
+            port (str): The port to connect to the Dobot device.
+
+        Returns:
+            CustomDobot: The connected Dobot.
+        """
+        bot = CustomDobot(port = port)
+        self.motion.reset(bot)
+        return bot
+
     async def dobot_disconnect(self) -> None:
         try:
             if not self.bot is None:
-                self.move_home()
-                self.bot.close()
+                await self.motion.run_async(self.home_sequence())
+                await wrap_future(self.motion.call(self.bot.close))
+                self.motion.call(self.motion.reset, None)
             self.connected = False
         except:
             pass
         return self.connected
 
-    def set_speed(self, speed: int) -> None:
+    def set_speed(self, speed: int) -> Future:
         """
-        Set the speed of the robot.
+        Set the speed of the robot. The command is queued behind all pending moves.
 
         Args:
             speed (int): The speed to set for the robot.
+
+        Returns:
+            Future: The future of the queued speed command.
         """
         # FIXME: Wieder wert auf 2000 setzen
         if speed > 1000:
@@ -99,21 +165,30 @@ class DoBotControl():
         elif speed < 100:
             speed = 100
         self.speed: int = speed
-        self.bot.speed(speed, speed)
+        return self.motion.call(self.bot.speed, speed, speed)
+
+    def home_sequence(self) -> MotionSequence:
+        """
+        Build the motion sequence to the home position.
+
+        Returns:
+            MotionSequence: The sequence moving the robot home.
+        """
+        return MotionSequence().move(self.homeX, self.homeY, self.homeZ, 0)
 
     def move_home(self) -> None:
         """Move the robot to the home position."""
-        self.move_to_position(self.homeX, self.homeY, self.homeZ, 0)
+        self.motion.run(self.home_sequence())
 
     def get_current_robot_pos(self) -> tuple[float, float, float, float]:
         """
-        Get the current position of the robot.
+        Get the current position of the robot. Served from the last commanded pose,
+        the robot is only queried if that pose is unknown.
 
         Returns:
             tuple[float, float, float, float]: The current position (x, y, z, r) of the robot.
         """
-        pos = self.bot.pose()
-        return pos[0], pos[1], pos[2], pos[3]
+        return self.motion.call(self.motion.current_pose).result()
 
     def move_to_position(self, x: float, y: float, z: float | None = None, r: float | None = None) -> None:
         """
@@ -125,12 +200,7 @@ class DoBotControl():
             z (float | None, optional): The Z coordinate of the target position.
             r (float | None, optional): The rotation angle of the head.
         """
-        _, _, current_z, current_r = self.get_current_robot_pos()
-        if z is None:
-            z = current_z
-        if r is None:
-            r = current_r
-        self.bot.move_to(x, y, z, r)
+        self.motion.run(MotionSequence().move(x, y, z, r))
 
     def move_block_to_storage_manual_mode(self, color: str) -> None:
         """
@@ -151,14 +221,17 @@ class DoBotControl():
         storage_y: float = storage_y * pow(0.98, storage_level)
         target_x: float = storage_x * scale
         target_y: float = storage_y * scale
-        self.move_to_position(target_x, target_y, storage_z + storage_factor)
-        self.move_to_position(storage_x, storage_y, storage_z + storage_factor)
-        self.move_to_position(storage_x, storage_y, storage_z)
-        self.bot.suck(False)
-        self.move_to_position(storage_x, storage_y, storage_z + storage_factor)
+        self.motion.run(
+            MotionSequence()
+            .move(target_x, target_y, storage_z + storage_factor)
+            .move(storage_x, storage_y, storage_z + storage_factor)
+            .move(storage_x, storage_y, storage_z)
+            .suck(False)
+            .move(storage_x, storage_y, storage_z + storage_factor)
+            .move(target_x, target_y, storage_z + storage_factor)
+            .move(self.homeX, self.homeY, self.homeZ, 0)
+        )
         increase_storage(self.main_window, self.color_list.index(color))
-        self.move_to_position(target_x, target_y, storage_z + storage_factor)
-        self.move_home()
 
 
 if __name__ == "__main__":
@@ -181,8 +254,8 @@ if __name__ == "__main__":
         print("        3: Red")
         print("        4: Yellow")
         print("    Esc: Exit the control loop")
-        add_hotkey("+", lambda: dobot_control.bot.suck(True))
-        add_hotkey("-", lambda: dobot_control.bot.suck(False))
+        add_hotkey("+", lambda: dobot_control.motion.submit(MotionSequence().suck(True)))
+        add_hotkey("-", lambda: dobot_control.motion.submit(MotionSequence().suck(False)))
         add_hotkey("h", lambda: dobot_control.move_home())
         add_hotkey("1", lambda: dobot_control.move_block_to_storage_manual_mode("blue"))
         add_hotkey("2", lambda: dobot_control.move_block_to_storage_manual_mode("green"))
@@ -0,0 +1,198 @@
+import asyncio
+from concurrent.futures import Future
+from queue import Queue
+from threading import Thread
+from typing import Any, Callable
+
+
+class MotionSequence:
+    def __init__(self) -> None:
+        """Initialize an empty motion sequence."""
+        self.steps: list[tuple] = []
+
+    def move(self, x: float, y: float, z: float | None = None, r: float | None = None) -> "MotionSequence":
+        """
+        Append a move to the sequence.
+
+        Args:
+            x (float): The X coordinate of the target position.
+            y (float): The Y coordinate of the target position.
+            z (float | None, optional): The Z coordinate. Keeps the last commanded Z if None.
+            r (float | None, optional): The rotation angle. Keeps the last commanded R if None.
+
+        Returns:
+            MotionSequence: The sequence itself, so calls can be chained.
+        """
+        self.steps.append(("move", x, y, z, r))
+        return self
+
+    def suck(self, enable: bool) -> "MotionSequence":
+        """
+        Append a suction cup command to the sequence.
+
+        Args:
+            enable (bool): Whether the suction cup should be enabled.
+
+        Returns:
+            MotionSequence: The sequence itself, so calls can be chained.
+        """
+        self.steps.append(("suck", enable))
+        return self
+
+    def extend(self, other: "MotionSequence") -> "MotionSequence":
+        """
+        Append all steps of another sequence.
+
+        Args:
+            other (MotionSequence): The sequence to append.
+
+        Returns:
+            MotionSequence: The sequence itself, so calls can be chained.
+        """
+        self.steps.extend(other.steps)
+        return self
+
+
+class MotionQueue:
+    def __init__(self, poll_interval: float = 0.05) -> None:
+        """
+        Initialize the motion queue and start its serial worker thread.
+
+        All serial I/O with the Dobot runs on the worker thread, so neither the Qt thread
+        nor an asyncio loop is blocked while the arm is moving.
+
+        Args:
+            poll_interval (float, optional): Seconds between queued index polls. Default is 0.05.
+        """
+        self.bot = None
+        self.pose: tuple[float, float, float, float] | None = None
+        self.poll_interval: float = poll_interval
+        self._jobs: Queue = Queue()
+        self._thread = Thread(target=self._worker, name="DobotSerial", daemon=True)
+        self._thread.start()
+
+    def _worker(self) -> None:
+        """Execute queued jobs one after another on the serial thread."""
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            function, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(function())
+            except Exception as e:
+                future.set_exception(e)
+
+    def call(self, function: Callable, *args, **kwargs) -> Future:
+        """
+        Run an arbitrary callable on the serial thread.
+
+        Args:
+            function (Callable): The callable to run.
+            *args: Positional arguments for the callable.
+            **kwargs: Keyword arguments for the callable.
+
+        Returns:
+            Future: The future holding the result of the callable.
+        """
+        future = Future()
+        self._jobs.put((lambda: function(*args, **kwargs), future))
+        return future
+
+    def submit(self, sequence: MotionSequence) -> Future:
+        """
+        Enqueue a whole motion sequence.
+
+        Args:
+            sequence (MotionSequence): The sequence to execute.
+
+        Returns:
+            Future: Resolves to the commanded pose once the last command of the sequence has finished.
+        """
+        return self.call(self._execute, list(sequence.steps))
+
+    def run(self, sequence: MotionSequence) -> tuple[float, float, float, float]:
+        """
+        Enqueue a motion sequence and block until it has finished.
+
+        Args:
+            sequence (MotionSequence): The sequence to execute.
+
+        Returns:
+            tuple[float, float, float, float]: The commanded pose after the sequence.
+        """
+        return self.submit(sequence).result()
+
+    async def run_async(self, sequence: MotionSequence) -> tuple[float, float, float, float]:
+        """
+        Enqueue a motion sequence and await it without blocking the event loop.
+
+        Args:
+            sequence (MotionSequence): The sequence to execute.
+
+        Returns:
+            tuple[float, float, float, float]: The commanded pose after the sequence.
+        """
+        return await asyncio.wrap_future(self.submit(sequence))
+
+    def _execute(self, steps: list[tuple]) -> tuple[float, float, float, float]:
+        """
+        Send all steps to the Dobot command queue and wait only for the last one.
+
+        Args:
+            steps (list[tuple]): The steps of a motion sequence.
+
+        Returns:
+            tuple[float, float, float, float]: The commanded pose after the sequence.
+        """
+        if self.bot is None:
+            raise RuntimeError("Dobot is not connected.")
+        last_index: int | None = None
+        try:
+            for step in steps:
+                if step[0] == "move":
+                    _, x, y, z, r = step
+                    _, _, current_z, current_r = self.current_pose()
+                    if z is None:
+                        z = current_z
+                    if r is None:
+                        r = current_r
+                    last_index = self.bot.queue_move_to(x, y, z, r)
+                    self.pose = (x, y, z, r)
+                elif step[0] == "suck":
+                    last_index = self.bot.queue_suck(step[1])
+            if last_index is not None:
+                self.bot.wait_for_index(last_index, self.poll_interval)
+        except Exception:
+            # The arm may have stopped anywhere, the next move has to ask the robot again
+            self.pose = None
+            raise
+        return self.current_pose()
+
+    def current_pose(self) -> tuple[float, float, float, float]:
+        """
+        Get the last commanded pose, querying the robot only if it is unknown.
+
+        Returns:
+            tuple[float, float, float, float]: The pose (x, y, z, r).
+        """
+        if self.pose is None:
+            pos = self.bot.pose()
+            self.pose = (pos[0], pos[1], pos[2], pos[3])
+        return self.pose
+
+    def reset(self, bot: Any = None) -> None:
+        """
+        Attach a (new) Dobot instance and forget the cached pose.
+
+        Args:
+            bot (Any, optional): The connected Dobot, or None after disconnecting.
+        """
+        self.bot = bot
+        self.pose = None
+
+    def stop(self) -> None:
+        """Stop the serial worker thread after all queued jobs have finished."""
+        self._jobs.put(None)
@@ -1,16 +1,18 @@
 import asyncio
 from datetime import datetime
-from time import sleep, perf_counter, time
+from time import perf_counter, time
 
 from PySide6.QtCore import Signal, QThread
 
 import stream.shared_state as shared_state
 from utils.config import read_config
 from utils.gui import remove_warning
+from utils.price_schedule import format_report, plan_immediate, plan_sorting, step_at
 
 class SortingWorker(QThread):
     label = Signal(str)
     button = Signal(str)
+    warning = Signal(str)
 
     def __init__(self, main_window: object) -> None:
         """
@@ -23,6 +25,9 @@ class SortingWorker(QThread):
         self.main_window = main_window
         self._running = True
         self._paused = False
+        self.plan = None
+        self._replan_at = 0.0
+        self._deadline = 0.0
 
     def run(self) -> None:
         """Start the sorting process with its own event loop."""
@@ -49,48 +54,182 @@ class SortingWorker(QThread):
             self.main_window.robot_busy = False
             return
         self.label.emit("Sorting in progress...\nStop the process by pressing the \"Stop\" button.")
+        self._db_queue = asyncio.Queue()
+        db_task = asyncio.create_task(self._db_writer())
+        try:
+            await self._sorting_loop()
+        finally:
+            await self._db_queue.join()
+            db_task.cancel()
+            self.main_window.db.cancel_flush_timer()
+            await self.main_window.db.flush()
+
+    async def _sorting_loop(self) -> None:
+        """
+        Sort blocks with vision and motion overlapped.
+
+        While the arm carries a block to its storage, the next target is already requested from the pi.
+        The prefetched target is only used if the arm could not have hidden or faked it, otherwise it is
+        requested again after the arm is back home. With a live detection feed a block that appears
+        shortly after the last one is picked up as soon as the pi detects it.
+        """
+        sorter = self.main_window.sorter
+        await asyncio.to_thread(sorter.start_detection_feed)
+        base_speed = sorter.speed
+        settings = read_config(self.main_window).get("sorting", {})
+        if settings.get("price_aware") and self.main_window.fetcher.price_index is not None:
+            self._deadline = time() + settings.get("deadline_hours", 12) * 3600
+            await self._make_plan(base_speed)
+        try:
+            await self._sort_blocks(sorter, base_speed)
+        finally:
+            if sorter.speed != base_speed:
+                sorter.set_speed(base_speed)
+
+    async def _sort_blocks(self, sorter: object, base_speed: int) -> None:
+        """
+        Sort blocks until none are left or the process is stopped.
+
+        Args:
+            sorter (object): The automated sorter.
+            base_speed (int): The configured robot speed, used without a plan.
+        """
+        block_x, block_y, color = await asyncio.to_thread(sorter.get_next_block, sorter.block_wait)
         while True:
             while self._paused:
                 if self._running is False:
-                    self.label.emit("Sorting process was stopped.")
-                    self.button.emit("Start")
-                    self.main_window.robot_busy = False
+                    self._finish("Sorting process was stopped.")
                     return
-                sleep(0.1)
-            timer = perf_counter()
-            block_x, block_y, color = self.main_window.sorter.get_next_block()
+                await asyncio.sleep(0.1)
+            if self.plan is not None and await self._follow_plan(sorter, base_speed):
+                if self._running is False:
+                    self._finish("Sorting process was stopped.")
+                    return
+                # The blocks may have changed during the pause
+                block_x, block_y, color = await asyncio.to_thread(sorter.get_next_block, sorter.block_wait)
             if color == "none":
-                self.label.emit("No more blocks to sort.")
-                self.button.emit("Start")
-                self.main_window.robot_busy = False
-                break
+                self._finish("No more blocks to sort.")
+                return
             self.label.emit(f"Moving block at ({block_x}, {block_y}) with color {color} to storage.")
-            self.main_window.sorter.move_block_to_storage(block_x, block_y, color)
+            timer = perf_counter()
+            started = time()
+            carry, release, storage_index = sorter.plan_block_to_storage(block_x, block_y, color)
+            try:
+                # Only queue the release once the carry succeeded, a failed carry must not put anything down
+                arm_x, arm_y, _, _ = await asyncio.wrap_future(sorter.motion.submit(carry))
+                release_future = sorter.motion.submit(release)
+                try:
+                    next_block = await asyncio.to_thread(sorter.get_next_block)
+                except Exception as e:
+                    # The block is still stored, the next one is looked up again once the arm is home
+                    print(f"Looking up the next block failed: {e}")
+                    next_block = (None, None, "none")
+                await asyncio.wrap_future(release_future)
+            except Exception as e:
+                print(f"Sorting block at ({block_x}, {block_y}) failed: {e}")
+                self._finish(f"Sorting block at ({block_x}, {block_y}) failed: {e}")
+                return
+            self.main_window.storage_counts[storage_index] += 1
             elapsed_time = perf_counter() - timer
-            await self.main_window.db.generate_robot_struct(
-                color = color,
-                temperature = shared_state.temperature,
-                humidity = shared_state.humidity,
-                timestamp = str(datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
-                energy_consume = elapsed_time / 3600 * 60 * 0.000001,
-                energy_cost = self._get_energy_cost()
-            )
+            sorter.cost_model.observe(sorter.speed, elapsed_time)
+            sensors = shared_state.sensor_history.aggregate(since=started)
+            self._db_queue.put_nowait({
+                "color": color,
+                "temperature": sensors["temperature"]["mean"] if sensors else shared_state.temperature,
+                "humidity": sensors["humidity"]["mean"] if sensors else shared_state.humidity,
+                "timestamp": str(datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+                "energy_consume": elapsed_time / 3600 * 60 * 0.000001,
+                "energy_cost": self._get_energy_cost()
+            })
             if self._running is False:
-                self.label.emit("Sorting process was stopped.")
-                self.button.emit("Start")
-                self.main_window.robot_busy = False
+                self._finish("Sorting process was stopped.")
+                return
+            next_x, next_y, next_color = next_block
+            if next_color != "none" and not sorter.is_occluded(next_x, next_y, arm_x, arm_y, block_x, block_y):
+                block_x, block_y, color = next_block
+            else:
+                block_x, block_y, color = await asyncio.to_thread(sorter.get_next_block, sorter.block_wait)
+
+    async def _make_plan(self, base_speed: int) -> None:
+        """
+        Plan when to sort, pause or throttle for the detected blocks until the deadline and report the simulated cost.
+
+        Args:
+            base_speed (int): The configured robot speed, the plan is compared with sorting right away at it.
+        """
+        sorter = self.main_window.sorter
+        prices = self.main_window.fetcher.price_index
+        blocks = await asyncio.to_thread(sorter.count_blocks)
+        now = time()
+        self.plan = plan_sorting(prices, max(blocks, 1), now, max(self._deadline, now), sorter.cost_model)
+        step = step_at(self.plan, now)
+        self._replan_at = step.end if step is not None else float("inf")
+        baseline = plan_immediate(prices, max(blocks, 1), now, sorter.cost_model, base_speed)
+        report = format_report(self.plan, baseline, max(blocks, 1), self._deadline)
+        print(report)
+        self.label.emit("\n".join(report.splitlines()[-3:]))
+
+    async def _follow_plan(self, sorter: object, base_speed: int) -> bool:
+        """
+        Wait out a planned pause and set the planned speed before the next block.
+        The plan is made again at every step boundary with the blocks still detected and the measured block times.
+
+        Args:
+            sorter (object): The automated sorter.
+            base_speed (int): The speed after the plan ended.
+
+        Returns:
+            bool: True if the worker paused.
+        """
+        paused = False
+        speed = base_speed
+        while self._running:
+            now = time()
+            if now >= self._replan_at:
+                await self._make_plan(base_speed)
+            step = step_at(self.plan, now)
+            if step is None:
+                break
+            if step.speed is not None:
+                speed = step.speed
                 break
+            paused = True
+            self.label.emit(f"Sorting paused until {datetime.fromtimestamp(step.end).strftime('%H:%M')}, energy is cheaper later.")
+            while self._running and time() < step.end:
+                await asyncio.sleep(min(1.0, max(step.end - time(), 0.0)))
+        if paused and self._running:
+            self.label.emit("Sorting in progress...\nStop the process by pressing the \"Stop\" button.")
+        if speed != sorter.speed:
+            sorter.set_speed(speed)
+        return paused
+
+    async def _db_writer(self) -> None:
+        """Write the robot data of sorted blocks to the database in the background."""
+        while True:
+            record = await self._db_queue.get()
+            try:
+                await self.main_window.db.buffer_robot_struct(**record)
+            except Exception as e:
+                print(f"Robot data of a sorted {record['color']} block could not be written: {e}")
+                self.warning.emit(f"Robot data could not be written to the database: {e}")
+            finally:
+                self._db_queue.task_done()
+
+    def _finish(self, text: str) -> None:
+        """
+        Report the end of the sorting process and release the robot.
+
+        Args:
+            text (str): The text to show in the sorting label.
+        """
+        self.label.emit(text)
+        self.button.emit("Start")
+        self.main_window.robot_busy = False
 
     def _get_energy_cost(self) -> float:
-        """Get the energy cost for the current sorting operation."""
-        return 187
-        # FIXME:
-        with open(self.main_window.fetcher.json_file_path, 'r', encoding='utf-8') as f:
-            energy_data = shared_state.energy_data
-        now = int(time() * 1000)
-        for entry in energy_data["api_response"]["data"]:
-            if entry["start_timestamp"] <= now <= entry["end_timestamp"]:
-                return entry["marketprice"]
+        """Get the energy price for the current sorting operation, 0.0 if no price is known for now."""
+        price = self.main_window.fetcher.get_price()
+        return price if price is not None else 0.0
 
     def stop(self) -> None:
         """Stop the sorting process."""
@@ -130,6 +269,7 @@ def start_sorting_worker(self) -> None:
         self.sorting_worker = SortingWorker(self)
         self.sorting_worker.label.connect(lambda text: update_sorting_label(self, text))
         self.sorting_worker.button.connect(lambda text: update_sorting_button(self, text))
+        self.sorting_worker.warning.connect(lambda text: self.show_warning(text))
         self.sorting_worker.start()
     else:
         self.show_warning("Database connection is not established. Please connect to the database first.")
@@ -141,7 +141,7 @@ class ColorSettingsWindow:
 
     def initialize_slider_values(self):
         """Initialize slider values from shared state using the unified slider definitions."""
-        with shared_state.data_lock:
+        with shared_state.filter_lock:
             for slider_def in self.all_sliders:
                 if slider_def["type"] not in ["color", "global"]:
                     continue
@@ -420,7 +420,7 @@ class ColorSettingsWindow:
             parts = slider_id.split("_")
             if len(parts) == 4:
                 color_key, range_idx, bound_idx, comp_idx = parts
-                with shared_state.data_lock:
+                with shared_state.filter_lock:
                     return shared_state.COLOR_FILTER[color_key][int(range_idx)][int(bound_idx)][int(comp_idx)]
         return 0
 
@@ -430,7 +430,7 @@ class ColorSettingsWindow:
         slider_def = next((s for s in self.all_sliders if s["id"] == slider_id), None)
         if not slider_def:
             return
-        with shared_state.data_lock:
+        with shared_state.filter_lock:
             if slider_def["type"] == "color":
                 color_key = slider_def["color_key"]
                 range_idx = slider_def["range_idx"]
@@ -517,7 +517,7 @@ class ColorSettingsWindow:
         img = self.sample_images[self.current_sample_index].copy()
         hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
         final_mask = np.zeros((img.shape[0], img.shape[1]), dtype=np.uint8)
-        with shared_state.data_lock:
+        with shared_state.filter_lock:
             for color_key, ranges in shared_state.COLOR_FILTER.items():
                 color_mask = np.zeros_like(final_mask)
                 for lower, upper in ranges:
@@ -631,7 +631,7 @@ class ColorSettingsWindow:
             "color_filter": {},
             "global_settings": {}
         }
-        with shared_state.data_lock:
+        with shared_state.filter_lock:
             for color_key, ranges_data in shared_state.COLOR_FILTER.items():
                 settings_to_save["color_filter"][color_key] = []
                 for lower_np, upper_np in ranges_data:
@@ -664,7 +664,7 @@ class ColorSettingsWindow:
                 loaded_settings = json.load(f)
         except Exception as e:
             return
-        with shared_state.data_lock:
+        with shared_state.filter_lock:
             loaded_color_filter = loaded_settings.get("color_filter", {})
             for color_key, ranges_data_list in loaded_color_filter.items():
                 if color_key in shared_state.COLOR_FILTER:
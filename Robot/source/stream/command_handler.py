@@ -1,12 +1,87 @@
 import socket
 import json
+import queue
 import threading
 import time
-import math
-from typing import Dict, List, Any, Tuple
+from typing import Dict, List, Any, Mapping, Optional, Sequence, Tuple
 import stream.shared_state as shared_state
+from stream.detection_tracker import DetectionTracker
 from stream.marker_detector import MarkerDetector
 from stream.video_analyzer import VideoAnalyzer
+from utils.command_channel import FRAME_HEADER_SIZE, encode_frame, negotiate_encoding, recv_exact, recv_frame
+
+
+class DetectionSubscriber:
+    """Pushes detection frames to one subscriber from its own thread.
+
+    Frames wait in a bounded queue, so a stalled subscriber never blocks the
+    publisher or the other subscribers; once its queue is full it is dropped.
+    """
+
+    def __init__(self, conn: socket.socket, send_lock: threading.Lock, encoding: str, max_pending: int = 32):
+        """
+        Args:
+            conn: The client connection
+            send_lock: Lock serializing writes to the connection
+            encoding: Encoding negotiated for the connection
+            max_pending: Frames that may wait for the subscriber before it is dropped
+        """
+        self.conn = conn
+        self.send_lock = send_lock
+        self.encoding = encoding
+        self.closed = False
+        self.frames: "queue.Queue[Optional[bytes]]" = queue.Queue(max_pending)
+        self.thread = threading.Thread(target=self._send_loop, daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def push(self, frame: bytes) -> bool:
+        """
+        Queues a frame without blocking.
+
+        Returns:
+            bool: False if the subscriber is closed or too slow to keep up
+        """
+        if self.closed:
+            return False
+        try:
+            self.frames.put_nowait(frame)
+            return True
+        except queue.Full:
+            return False
+
+    def close(self, disconnect: bool = False) -> None:
+        """
+        Stops pushing frames, a frame that is being sent is finished first.
+
+        Args:
+            disconnect: Also shut the connection down, which ends a blocked send
+        """
+        self.closed = True
+        if disconnect:
+            try:
+                self.conn.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+        try:
+            self.frames.put_nowait(None)
+        except queue.Full:
+            pass
+
+    def _send_loop(self) -> None:
+        while True:
+            frame = self.frames.get()
+            if frame is None or self.closed:
+                return
+            try:
+                with self.send_lock:
+                    if self.closed:
+                        return
+                    self.conn.sendall(frame)
+            except socket.error as e:
+                self.close(disconnect=True)
+                return
 
 
 class CommandHandler:
@@ -34,6 +109,12 @@ class CommandHandler:
         self.video_analyzer = video_analyzer
         self.server_running = False
         self.server_thread = None
+        self.publish_thread = None
+        self.tracker = DetectionTracker()
+        self.subscribers: Dict[socket.socket, DetectionSubscriber] = {}
+        self.subscribers_lock = threading.Lock()
+        self.latest_detections = None
+        self.publish_condition = threading.Condition()
 
     def start_server(self) -> bool:
         """
@@ -50,11 +131,15 @@ class CommandHandler:
             target=self._tcp_server_logic, daemon=True
         )
         self.server_thread.start()
+        self.publish_thread = threading.Thread(
+            target=self._publish_loop, daemon=True
+        )
+        self.publish_thread.start()
         return True
 
     def _tcp_server_logic(self) -> None:
         """
-        Listens for TCP connections and processes calibration commands.
+        Listens for TCP connections and serves every client on its own thread.
         Runs in a separate thread.
         """
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
@@ -65,71 +150,247 @@ class CommandHandler:
                 self.server_running = False
                 return
             s.listen()
+            s.settimeout(1.0)
             while self.server_running:
                 try:
                     conn, addr = s.accept()
-                    with conn:
-                        data = conn.recv(1024)
-                        if not data:
-                            continue
-                        response_to_send = None
-                        message_str = data.decode("utf-8")
-                        try:
-                            message = json.loads(message_str)
-                            msg_type = message.get("type")
-                            if msg_type == "calibrate":
-                                response_to_send = self._handle_calibrate_command(
-                                    message, addr
-                                )
-                            elif msg_type == "color":
-                                color_data_payload = self._handle_color_request()
-                                response_to_send = json.dumps(
-                                    color_data_payload
-                                ).encode("utf-8")
-                            elif msg_type == "sensor":
-                                response_payload = self._handle_sensor_request()
-                                response_to_send = json.dumps(
-                                    response_payload
-                                ).encode("utf-8")
-                            else:
-                                response_message = "Invalid message type. Expected 'calibrate' or 'color'."
-                                error_payload = {
-                                    "status": "error",
-                                    "message": response_message,
-                                }
-                                response_to_send = json.dumps(error_payload).encode(
-                                    "utf-8"
-                                )
-                        except json.JSONDecodeError:
-                            error_payload = {
-                                "status": "error",
-                                "message": "Invalid JSON format.",
-                            }
-                            response_to_send = json.dumps(error_payload).encode("utf-8")
-                        except Exception as e:
-                            error_payload = {
-                                "status": "error",
-                                "message": f"Server error: {e}",
-                            }
-                            response_to_send = json.dumps(error_payload).encode("utf-8")
-                        if response_to_send:
-                            conn.sendall(response_to_send)
-                        else:
-                            fallback_error = {
-                                "status": "error",
-                                "message": "Internal server error processing request.",
-                            }
-                            conn.sendall(json.dumps(fallback_error).encode("utf-8"))
+                except socket.timeout:
+                    continue
                 except socket.error as e:
                     if self.server_running:
                         time.sleep(1)
+                    continue
                 except Exception as e:
                     break
+                threading.Thread(
+                    target=self._serve_connection, args=(conn, addr), daemon=True
+                ).start()
             self.server_running = False
 
+    def _serve_connection(self, conn: socket.socket, addr: Tuple[str, int]) -> None:
+        """
+        Serves one client connection until it is closed.
+
+        Clients that send length-prefixed frames keep the connection open and may
+        send any number of requests; each response echoes the request_id. Clients
+        that send a bare JSON message get one response and the connection is closed.
+        Responses are JSON unless the client negotiated a binary encoding first.
+
+        Args:
+            conn: The client connection
+            addr: Client address tuple
+        """
+        send_lock = threading.Lock()
+        encoding = "json"
+        with conn:
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            try:
+                header = recv_exact(conn, FRAME_HEADER_SIZE)
+                if header is None:
+                    return
+                if header.startswith(b"{"):
+                    self._serve_legacy_message(conn, addr, header)
+                    return
+                while self.server_running:
+                    try:
+                        message = recv_frame(conn, header)
+                    except json.JSONDecodeError:
+                        message = {}
+                        response = {
+                            "status": "error",
+                            "message": "Invalid JSON format.",
+                        }
+                    else:
+                        if message is None:
+                            return
+                        if message.get("type") == "negotiate":
+                            # Answered in JSON, the chosen encoding applies from the next response on
+                            response = {
+                                "status": "success",
+                                "encoding": negotiate_encoding(message.get("accept", [])),
+                            }
+                        elif message.get("type") in ("subscribe", "unsubscribe"):
+                            response = None
+                            self._handle_subscription(message, conn, send_lock, encoding)
+                        else:
+                            response = self._dispatch(message, addr)
+                    if response is not None:
+                        if "request_id" in message:
+                            response["request_id"] = message["request_id"]
+                        with send_lock:
+                            conn.sendall(encode_frame(response, encoding))
+                        if message.get("type") == "negotiate":
+                            encoding = response["encoding"]
+                    header = recv_exact(conn, FRAME_HEADER_SIZE)
+                    if header is None:
+                        return
+            except (socket.error, ValueError) as e:
+                return
+            finally:
+                with self.subscribers_lock:
+                    subscriber = self.subscribers.pop(conn, None)
+                if subscriber:
+                    subscriber.close()
+
+    def _handle_subscription(
+        self,
+        message: Dict[str, Any],
+        conn: socket.socket,
+        send_lock: threading.Lock,
+        encoding: str,
+    ) -> None:
+        """
+        Handles the 'subscribe' and 'unsubscribe' command types.
+
+        A new subscriber first gets the response, then a snapshot of all tracked
+        objects and from then on a delta whenever the detections change. Only the
+        registration happens under the subscribers lock, the frames are sent
+        outside of it.
+
+        Args:
+            message: The parsed JSON message
+            conn: The client connection
+            send_lock: Lock serializing writes to the connection
+            encoding: Encoding negotiated for the connection
+        """
+        subscriber = None
+        snapshot = None
+        with self.subscribers_lock:
+            previous = self.subscribers.pop(conn, None)
+            if message.get("type") == "subscribe":
+                response = {"status": "success", "message": "Subscribed to detections."}
+                # Deltas published from now on are queued behind the snapshot
+                snapshot = encode_frame({"type": "detections", **self.tracker.snapshot()}, encoding)
+                subscriber = DetectionSubscriber(conn, send_lock, encoding)
+                self.subscribers[conn] = subscriber
+            else:
+                response = {"status": "success", "message": "Unsubscribed from detections."}
+        if previous:
+            previous.close()
+        if "request_id" in message:
+            response["request_id"] = message["request_id"]
+        with send_lock:
+            conn.sendall(encode_frame(response, encoding))
+            if snapshot is not None:
+                conn.sendall(snapshot)
+        if subscriber:
+            subscriber.start()
+
+    def publish_detections(self, seq: int, objects: List[Dict[str, Any]]) -> None:
+        """
+        Hands the detections of a processed frame to the publisher thread.
+
+        Only the latest frame is kept, so a slow subscriber never holds up frame
+        processing; the next delta then covers all frames it missed.
+
+        Args:
+            seq: Sequence number of the frame
+            objects: Detected color objects as produced by VideoAnalyzer.find_color
+        """
+        with self.publish_condition:
+            self.latest_detections = (seq, objects)
+            self.publish_condition.notify()
+
+    def _publish_loop(self) -> None:
+        """
+        Tracks the published detections and pushes their deltas to all subscribers.
+        Runs in a separate thread.
+        """
+        while self.server_running:
+            with self.publish_condition:
+                if self.latest_detections is None:
+                    self.publish_condition.wait(timeout=1.0)
+                latest, self.latest_detections = self.latest_detections, None
+            if latest is None:
+                continue
+            seq, objects = latest
+            with self.subscribers_lock:
+                dropped = self._track(seq, objects)
+            for subscriber in dropped:
+                # Too slow or gone, it resubscribes and gets a fresh snapshot
+                subscriber.close(disconnect=True)
+
+    def _track(self, seq: int, objects: Sequence[Mapping[str, Any]]) -> List[DetectionSubscriber]:
+        """
+        Tracks the detections of a frame and queues their delta for all subscribers.
+
+        Must be called with subscribers_lock held, which keeps deltas in order with new
+        snapshots. Frames that were already tracked are skipped.
+
+        Args:
+            seq: Sequence number of the frame
+            objects: Detected color objects as produced by VideoAnalyzer.find_color
+
+        Returns:
+            list: Subscribers that could not keep up and were removed, to be closed outside the lock
+        """
+        if seq <= self.tracker.seq:
+            return []
+        delta = self.tracker.update(seq, [self._format_color_object(obj) for obj in objects])
+        dropped = []
+        if delta is None or not self.subscribers:
+            return dropped
+        frames: Dict[str, bytes] = {}
+        for conn, subscriber in list(self.subscribers.items()):
+            if subscriber.encoding not in frames:
+                frames[subscriber.encoding] = encode_frame({"type": "detections", **delta}, subscriber.encoding)
+            if not subscriber.push(frames[subscriber.encoding]):
+                del self.subscribers[conn]
+                dropped.append(subscriber)
+        return dropped
+
+    def _serve_legacy_message(
+        self, conn: socket.socket, addr: Tuple[str, int], head: bytes
+    ) -> None:
+        """
+        Answers a single unframed JSON message, as sent by older clients.
+
+        Args:
+            conn: The client connection
+            addr: Client address tuple
+            head: The bytes already read from the connection
+        """
+        data = head + conn.recv(1024)
+        try:
+            message = json.loads(data.decode("utf-8"))
+            response = self._dispatch(message, addr)
+        except json.JSONDecodeError:
+            response = {"status": "error", "message": "Invalid JSON format."}
+        conn.sendall(json.dumps(response).encode("utf-8"))
+
+    def _dispatch(self, message: Dict[str, Any], addr: Tuple[str, int]) -> Dict[str, Any]:
+        """
+        Processes one command and builds its response.
+
+        Args:
+            message: The parsed JSON message
+            addr: Client address tuple
+
+        Returns:
+            dict: Response to send to the client
+        """
+        try:
+            msg_type = message.get("type")
+            if msg_type == "calibrate":
+                return self._handle_calibrate_command(message, addr)
+            elif msg_type == "color":
+                return self._handle_color_request()
+            elif msg_type == "sensor":
+                return self._handle_sensor_request()
+            else:
+                return {
+                    "status": "error",
+                    "message": "Invalid message type. Expected 'calibrate', 'color', 'sensor' or 'subscribe'.",
+                }
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": f"Server error: {e}",
+            }
+
     def _handle_calibrate_command(
         self, message: Dict[str, Any], addr: Tuple[str, int]
-    ) -> bytes:
+    ) -> Dict[str, Any]:
         """
         Handles the 'calibrate' command type.
 
@@ -138,7 +399,7 @@ class CommandHandler:
             addr: Client address tuple
 
         Returns:
-            bytes: Response to send to client
+            dict: Response to send to client
         """
         payload = message.get("payload")
         response_status = "error"
@@ -189,8 +450,7 @@ class CommandHandler:
         response_payload_dict = {"status": response_status, "message": response_message}
         if processed_id is not None:
             response_payload_dict["id"] = processed_id
-        response_to_send = json.dumps(response_payload_dict).encode("utf-8")
-        return response_to_send
+        return response_payload_dict
 
     def _handle_tcp_command(
         self, calibration_profile_id: int, robot_pos_from_payload: Dict[str, float]
@@ -207,27 +467,25 @@ class CommandHandler:
         Returns:
             tuple: (success, message)
         """
-        with shared_state.data_lock:
-            if (
-                shared_state.PHYSICAL_MARKER_ID_TO_TRACK
-                in shared_state.current_detected_marker_centers
-            ):
-                center_x, center_y = shared_state.current_detected_marker_centers[
+        marker_centers = shared_state.detection_snapshot.marker_centers
+        with shared_state.calibration_lock:
+            if shared_state.PHYSICAL_MARKER_ID_TO_TRACK in marker_centers:
+                center_x, center_y = marker_centers[
                     shared_state.PHYSICAL_MARKER_ID_TO_TRACK
                 ]
-                shared_state.calibrated_marker_origins = (
-                    self.marker_detector.update_marker_origin(
-                        calibration_profile_id,
-                        center_x,
-                        center_y,
-                        robot_pos_from_payload,
-                        shared_state.calibrated_marker_origins,
-                    )
+                # Update a copy, readers may be iterating over the published list
+                calibration_data = self.marker_detector.update_marker_origin(
+                    calibration_profile_id,
+                    center_x,
+                    center_y,
+                    robot_pos_from_payload,
+                    [dict(item) for item in shared_state.calibrated_marker_origins],
                 )
                 self.marker_detector.save_calibration_data(
                     shared_state.CALIBRATION_FILE_PATH,
-                    shared_state.calibrated_marker_origins,
+                    calibration_data,
                 )
+                shared_state.calibrated_marker_origins = calibration_data
                 msg = f"Calibration profile ID {calibration_profile_id} updated using Marker {shared_state.PHYSICAL_MARKER_ID_TO_TRACK}'s position ({center_x}, {center_y}) and robot_pos {robot_pos_from_payload}."
                 return True, msg
             else:
@@ -241,16 +499,11 @@ class CommandHandler:
         Returns:
             tuple: (success, message)
         """
-        current_calibration_data_copy = []
-        with shared_state.data_lock:
-            if not shared_state.calibrated_marker_origins or not isinstance(
-                shared_state.calibrated_marker_origins, list
-            ):
-                msg = "No valid calibration data available to calculate transformation."
-                return False, msg
-            current_calibration_data_copy = [
-                dict(item) for item in shared_state.calibrated_marker_origins
-            ]
+        calibration_data = shared_state.calibrated_marker_origins
+        if not calibration_data or not isinstance(calibration_data, list):
+            msg = "No valid calibration data available to calculate transformation."
+            return False, msg
+        current_calibration_data_copy = [dict(item) for item in calibration_data]
         if not current_calibration_data_copy:
             msg = "No calibration data available (after copy) to calculate transformation."
             return False, msg
@@ -259,42 +512,44 @@ class CommandHandler:
         )
         return success, msg
 
+    @staticmethod
+    def _format_color_object(obj_info: Mapping[str, Any]) -> Dict[str, Any]:
+        """
+        Converts a detected color object into its TCP representation.
+
+        VideoAnalyzer.find_color only reports objects with a BGR tuple and finite
+        robot coordinates, so the fields are not checked again here.
+
+        Args:
+            obj_info: Detected color object as produced by VideoAnalyzer.find_color
+
+        Returns:
+            dict: Object with "bgr", "robot_pos" and "confidence"
+        """
+        robot_pos = obj_info["robot_pos"]
+        return {
+            "bgr": "%d,%d,%d" % tuple(obj_info["bgr_tuple"]),
+            "robot_pos": {"x": float(robot_pos["x"]), "y": float(robot_pos["y"])},
+            "confidence": round(float(obj_info.get("confidence", 1.0)), 3),
+        }
+
     def _handle_color_request(self) -> Dict[str, List[Dict[str, Any]]]:
         """
         Prepares data for detected color objects for TCP response.
 
+        The objects of the latest frame are returned with their tracking IDs, the same
+        IDs the detection deltas of a subscription use.
+
         Returns:
             dict: Color objects data for TCP response
         """
-        response_objects = []
-        with shared_state.data_lock:
-            objects_to_process = list(shared_state.current_detected_color_objects_info)
-        for obj_info in objects_to_process:
-            bgr_tuple = obj_info.get("bgr_tuple")
-            robot_pos = obj_info.get("robot_pos")
-            if (
-                bgr_tuple
-                and isinstance(bgr_tuple, tuple)
-                and len(bgr_tuple) == 3
-                and robot_pos
-                and isinstance(robot_pos, dict)
-                and "x" in robot_pos
-                and "y" in robot_pos
-                and robot_pos["x"] is not None
-                and math.isfinite(robot_pos["x"])
-                and robot_pos["y"] is not None
-                and math.isfinite(robot_pos["y"])
-            ):
-                bgr_string = f"{bgr_tuple[0]},{bgr_tuple[1]},{bgr_tuple[2]}"
-                response_objects.append(
-                    {
-                        "bgr": bgr_string,
-                        "robot_pos": {
-                            "x": float(robot_pos["x"]),
-                            "y": float(robot_pos["y"]),
-                        },
-                    }
-                )
+        snapshot = shared_state.detection_snapshot
+        with self.subscribers_lock:
+            # The publisher thread may not have tracked the latest frame yet
+            dropped = self._track(snapshot.seq, snapshot.color_objects)
+            response_objects = list(self.tracker.objects)
+        for subscriber in dropped:
+            subscriber.close(disconnect=True)
         return {"objects": response_objects}
 
     def _handle_sensor_request(self) -> Dict[str, Any]:
@@ -307,5 +562,14 @@ class CommandHandler:
     def stop_server(self) -> None:
         """Stop the TCP server."""
         self.server_running = False
+        with self.publish_condition:
+            self.publish_condition.notify()
+        with self.subscribers_lock:
+            subscribers = list(self.subscribers.values())
+            self.subscribers.clear()
+        for subscriber in subscribers:
+            subscriber.close(disconnect=True)
         if self.server_thread and self.server_thread.is_alive():
             self.server_thread.join(timeout=1.0)
+        if self.publish_thread and self.publish_thread.is_alive():
+            self.publish_thread.join(timeout=1.0)
@@ -0,0 +1,108 @@
+import numpy as np
+from typing import Dict, List, Any, Optional
+
+
+class DetectionTracker:
+    """Assigns stable tracking IDs to color detections and computes deltas between frames."""
+    def __init__(self, match_radius: float = 15.0, move_threshold: float = 2.0):
+        """
+        Initialize the detection tracker.
+
+        Args:
+            match_radius: Maximum distance in robot coordinates between two frames for a detection to keep its ID
+            move_threshold: Minimum distance a tracked object has to move before it is reported as moved
+        """
+        self.match_radius = match_radius
+        self.move_threshold = move_threshold
+        self.seq = 0
+        self.tracks: Dict[int, Dict[str, Any]] = {}
+        # Detections of the last frame with their tracking IDs, at their exact positions
+        self.objects: List[Dict[str, Any]] = []
+        self._next_id = 1
+
+    def update(self, seq: int, objects: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Matches the detections of a frame to the known tracks.
+
+        Detections are matched greedily by distance to a track of the same color. Unmatched
+        detections become new tracks and unmatched tracks are removed.
+
+        Args:
+            seq: Sequence number of the frame
+            objects: Detections of the frame, each with "bgr" and "robot_pos"
+
+        Returns:
+            dict: Delta with "added", "moved" and "removed", or None if nothing changed
+        """
+        self.seq = seq
+        track_ids = list(self.tracks)
+        matches: Dict[int, int] = {}
+        if track_ids and objects:
+            codes: Dict[str, int] = {}
+            track_pos = np.array(
+                [[self.tracks[i]["robot_pos"]["x"], self.tracks[i]["robot_pos"]["y"]] for i in track_ids]
+            )
+            object_pos = np.array([[obj["robot_pos"]["x"], obj["robot_pos"]["y"]] for obj in objects])
+            track_codes = np.array([codes.setdefault(self.tracks[i]["bgr"], len(codes)) for i in track_ids])
+            object_codes = np.array([codes.setdefault(obj["bgr"], len(codes)) for obj in objects])
+            # Cheap per-axis test first, exact distances only for the few candidate pairs
+            rows, cols = np.nonzero(
+                (np.abs(track_pos[:, 0, None] - object_pos[None, :, 0]) <= self.match_radius)
+                & (track_codes[:, None] == object_codes[None, :])
+            )
+            distances = np.hypot(
+                track_pos[rows, 0] - object_pos[cols, 0], track_pos[rows, 1] - object_pos[cols, 1]
+            )
+            used_tracks = set()
+            for k in np.argsort(distances, kind="stable"):
+                if distances[k] > self.match_radius:
+                    break
+                row, col = int(rows[k]), int(cols[k])
+                if row in used_tracks or col in matches:
+                    continue
+                used_tracks.add(row)
+                matches[col] = track_ids[row]
+        added = []
+        moved = []
+        seen = set()
+        current = []
+        for index, obj in enumerate(objects):
+            track_id = matches.get(index)
+            if track_id is None:
+                track = {**obj, "id": self._next_id, "robot_pos": dict(obj["robot_pos"])}
+                self.tracks[self._next_id] = track
+                self._next_id += 1
+                added.append(dict(track))
+                seen.add(track["id"])
+                current.append({**obj, "id": track["id"]})
+                continue
+            seen.add(track_id)
+            current.append({**obj, "id": track_id})
+            track = self.tracks[track_id]
+            dx = obj["robot_pos"]["x"] - track["robot_pos"]["x"]
+            dy = obj["robot_pos"]["y"] - track["robot_pos"]["y"]
+            if dx * dx + dy * dy >= self.move_threshold * self.move_threshold:
+                track.update(obj, robot_pos=dict(obj["robot_pos"]))
+                moved.append(dict(track))
+        removed = [track_id for track_id in track_ids if track_id not in seen]
+        for track_id in removed:
+            del self.tracks[track_id]
+        self.objects = current
+        if not (added or moved or removed):
+            return None
+        return {"seq": seq, "added": added, "moved": moved, "removed": removed}
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Builds a delta that adds every currently tracked object.
+
+        Returns:
+            dict: Delta with "snapshot" set, so a subscriber replaces its state with it
+        """
+        return {
+            "seq": self.seq,
+            "snapshot": True,
+            "added": [dict(track) for track in self.tracks.values()],
+            "moved": [],
+            "removed": [],
+        }
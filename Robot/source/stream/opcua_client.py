@@ -1,19 +1,73 @@
 import asyncio
-from asyncua import Client as AsyncuaClient, Node
+from datetime import datetime, timezone
+from asyncua import Client as AsyncuaClient, Node, ua
+from asyncua.common.subscription import Subscription
 import json
 import stream.shared_state as shared_state
 import os
+import time
+
+
+class _SensorDataHandler:
+    """Schreibt Data-Change-Benachrichtigungen der Sensor-Nodes in shared_state und die Sensor-Historie."""
+
+    def __init__(self, fields: dict[ua.NodeId, str], on_value=None):
+        self.fields = fields
+        self.on_value = on_value
+        self.status: ua.StatusCode | None = None
+
+    def datachange_notification(self, node: Node, val, data) -> None:
+        field = self.fields.get(node.nodeid)
+        if field is not None and val is not None:
+            shared_state.record_sensor_values(**{field: float(val)})
+            if self.on_value:
+                self.on_value()
+
+    def status_change_notification(self, status) -> None:
+        self.status = status.Status
 
 
 class AsyncOPCUAClient:
-    def __init__(self, server_url: str):
+    def __init__(
+        self,
+        server_url: str,
+        use_subscription: bool = shared_state.OPC_USE_SUBSCRIPTION,
+        sampling_interval: float = shared_state.OPC_SAMPLING_INTERVAL,
+        deadband: float = shared_state.OPC_DEADBAND,
+        use_security: bool = True,
+        namespace: str = shared_state.OPC_NAMESPACE,
+        node_cache_path: str = shared_state.OPC_NODE_CACHE_PATH,
+    ):
+        """
+        Args:
+            server_url: URL des OPC UA Servers
+            use_subscription: Sensorwerte per Subscription statt per Polling beziehen
+            sampling_interval: Abtast- und Publishing-Intervall der Subscription in ms
+            deadband: Absolute Änderung, ab der ein Sensorwert gemeldet wird (0 meldet jede Änderung)
+            use_security: Basic256Sha256 mit den Zertifikaten verwenden, für lokale Tests abschaltbar
+            namespace: Namespace-URI der Device-Nodes auf dem Server
+            node_cache_path: Datei, in der aufgelöste NodeIDs je Server und Namespace gespeichert werden
+        """
         self.server_url = server_url
+        self.use_subscription = use_subscription
+        self.sampling_interval = sampling_interval
+        self.deadband = deadband
+        self.use_security = use_security
+        self.namespace = namespace
+        self.node_cache_path = node_cache_path
         self.client = AsyncuaClient(url=self.server_url)
         self.node_ids = {}
         self.temperature_node: Node = None
         self.humidity_node: Node = None
         self.fan_speed_node: Node = None
         self.set_fan_speed_node: Node = None
+        self.subscription: Subscription = None
+        self.subscription_handler: _SensorDataHandler = None
+        self.subscriptions_supported = True
+        self.time_to_first_value: float | None = None
+        self._connect_started: float | None = None
+        self._reuse_client = True
+        self._last_history_dump = time.monotonic()
         self.running = True
         self._fetch_task: asyncio.Task = None
         self.client_cert_path = os.path.join(os.path.dirname(__file__), "certs", "server_cert.pem")
@@ -22,31 +76,176 @@ class AsyncOPCUAClient:
 
     async def connect(self):
         """Verbindet sich mit dem Server und initialisiert die Nodes."""
-        if not os.path.exists(self.client_cert_path):
-            raise RuntimeError(f"Client certificate not found: {self.client_cert_path}")
-        if not os.path.exists(self.client_key_path):
-            raise RuntimeError(f"Client key not found: {self.client_key_path}")
-        if not os.path.exists(self.server_cert_path):
-            raise RuntimeError(f"Server certificate not found: {self.server_cert_path}")
-        try:
-            await self.client.set_security_string(
-                f"Basic256Sha256,SignAndEncrypt,{self.client_cert_path},{self.client_key_path},{self.server_cert_path}"
-            )
-        except Exception as e:
-            raise RuntimeError(f"Error setting OPC UA Security Policy: {e}")
+        self._connect_started = time.perf_counter()
+        if self.use_security:
+            if not os.path.exists(self.client_cert_path):
+                raise RuntimeError(f"Client certificate not found: {self.client_cert_path}")
+            if not os.path.exists(self.client_key_path):
+                raise RuntimeError(f"Client key not found: {self.client_key_path}")
+            if not os.path.exists(self.server_cert_path):
+                raise RuntimeError(f"Server certificate not found: {self.server_cert_path}")
+            try:
+                await self.client.set_security_string(
+                    f"Basic256Sha256,SignAndEncrypt,{self.client_cert_path},{self.client_key_path},{self.server_cert_path}"
+                )
+            except Exception as e:
+                raise RuntimeError(f"Error setting OPC UA Security Policy: {e}")
         await self.client.connect()
-        node_ids_ua_node = await self._find_node_by_displayname("NodeIDs", path=["Objects", "Device"])
-        if node_ids_ua_node:
-            node_ids_json = await node_ids_ua_node.read_value()
-            self.node_ids = json.loads(node_ids_json)
-            self.temperature_node = self.client.get_node(self.node_ids["Temperature"])
-            self.humidity_node = self.client.get_node(self.node_ids["Humidity"])
-            self.fan_speed_node = self.client.get_node(self.node_ids["FanSpeed"])
-            self.set_fan_speed_node = self.client.get_node(self.node_ids["SetFanSpeed"])
-        else:
+        if not await self._init_nodes():
             await self.client.disconnect()
             raise RuntimeError("Node initialization failed, 'NodeIDs' not found.")
 
+    async def _init_nodes(self) -> bool:
+        """
+        Initialisiert die Sensor-Nodes.
+
+        Bekannte NodeIDs (von der letzten Verbindung oder aus dem Cache) werden mit einer einzigen
+        Read-Anfrage geprüft. Nur wenn das fehlschlägt, wird der Adressraum durchsucht. Werte, die
+        seit dem letzten Eintrag der Sensor-Historie angefallen sind, werden vom Server nachgeladen.
+        """
+        node_ids = self.node_ids or self._load_node_cache().get(self._node_cache_key())
+        values = await self._validate_node_ids(node_ids) if node_ids else None
+        if values is None:
+            node_ids = await self._browse_node_ids()
+            if node_ids is None:
+                return False
+            self._set_nodes(node_ids)
+            self._store_node_cache(node_ids)
+        await self.backfill_history()
+        if values is not None:
+            self._store_sensor_values(*values)
+        return True
+
+    async def _validate_node_ids(self, node_ids: dict[str, str]) -> tuple | None:
+        """
+        Prüft NodeIDs mit einer Read-Anfrage auf Namespace-Array und Sensor-Nodes.
+
+        Gibt die dabei gelesenen Werte von Temperature, Humidity und FanSpeed zurück, None wenn die NodeIDs ungültig sind.
+        """
+        try:
+            nodes = [self.client.get_node(node_ids[name]) for name in ("Temperature", "Humidity", "FanSpeed", "SetFanSpeed")]
+        except (KeyError, ValueError):
+            return None
+        results = await self.client.read_attributes([self.client.nodes.namespace_array, *nodes])
+        if not all(result.StatusCode.is_good() for result in results):
+            return None
+        namespaces = results[0].Value.Value
+        for node in nodes:
+            index = node.nodeid.NamespaceIndex
+            if index >= len(namespaces) or namespaces[index] != self.namespace:
+                return None
+        self._set_nodes(node_ids)
+        return tuple(result.Value.Value for result in results[1:4])
+
+    async def backfill_history(self) -> int:
+        """
+        Lädt die Sensorwerte seit dem letzten Eintrag der Sensor-Historie mit einer HistoryRead-Anfrage nach.
+
+        Die SourceTimestamps des Pi werden um den Uhrenversatz zum Server auf die lokale Uhr verschoben,
+        Einträge, die danach nicht nach dem letzten Eintrag und vor jetzt liegen, werden verworfen,
+        damit die Historie aufsteigend sortiert bleibt.
+        Server ohne Historie werden ignoriert. Gibt die Anzahl der nachgeladenen Einträge zurück.
+        """
+        since = shared_state.sensor_history.last_timestamp
+        if since is None:
+            return 0
+        offset = await self._clock_offset()
+        now = time.time()
+        fields = {
+            self.temperature_node.nodeid: "temperature",
+            self.humidity_node.nodeid: "humidity",
+            self.fan_speed_node.nodeid: "fan_speed",
+        }
+        details = ua.ReadRawModifiedDetails()
+        details.IsReadModified = False
+        details.StartTime = datetime.fromtimestamp(since - offset, timezone.utc)
+        details.EndTime = datetime.fromtimestamp(now - offset, timezone.utc)
+        details.NumValuesPerNode = 0
+        details.ReturnBounds = False
+        params = ua.HistoryReadParameters()
+        params.HistoryReadDetails = details
+        params.TimestampsToReturn = ua.TimestampsToReturn.Source
+        for nodeid in fields:
+            value_id = ua.HistoryReadValueId()
+            value_id.NodeId = nodeid
+            params.NodesToRead.append(value_id)
+        try:
+            results = await self.client.uaclient.history_read(params)
+        except ua.UaError:
+            return 0
+        samples = []
+        for nodeid, result in zip(fields, results):
+            if not result.StatusCode.is_good() or result.HistoryData is None:
+                continue
+            for data_value in result.HistoryData.DataValues or []:
+                timestamp = self._unix_time(data_value.SourceTimestamp) + offset if data_value.SourceTimestamp else None
+                if timestamp is not None and since < timestamp <= now and data_value.Value is not None:
+                    samples.append((timestamp, fields[nodeid], float(data_value.Value.Value)))
+        samples.sort()
+        for timestamp, field, value in samples:
+            shared_state.sensor_history.append(timestamp, **{field: value})
+        return len(samples)
+
+    async def _clock_offset(self) -> float:
+        """Schätzt, wie viele Sekunden die lokale Uhr der Uhr des Servers voraus ist, 0.0 wenn dessen Zeit nicht lesbar ist."""
+        before = time.time()
+        try:
+            server_time = await self.client.get_node(ua.ObjectIds.Server_ServerStatus_CurrentTime).read_value()
+        except ua.UaError:
+            return 0.0
+        after = time.time()
+        return (before + after) / 2 - self._unix_time(server_time)
+
+    @staticmethod
+    def _unix_time(value: datetime) -> float:
+        """Wandelt einen OPC UA Zeitstempel in Unix-Zeit um, asyncua liefert UTC ohne Zeitzone."""
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+
+    async def _browse_node_ids(self) -> dict[str, str] | None:
+        """Liest die NodeIDs aus der 'NodeIDs'-Variable, die über ihren Browse-Pfad aufgelöst wird."""
+        try:
+            idx = await self.client.get_namespace_index(self.namespace)
+            node_ids_ua_node = await self.client.nodes.objects.get_child([f"{idx}:Device", f"{idx}:NodeIDs"])
+        except (ValueError, ua.UaStatusCodeError):
+            node_ids_ua_node = await self._find_node_by_displayname("NodeIDs", path=["Objects", "Device"])
+        if node_ids_ua_node is None:
+            return None
+        return json.loads(await node_ids_ua_node.read_value())
+
+    def _set_nodes(self, node_ids: dict[str, str]) -> None:
+        """Erstellt die Sensor-Nodes aus den NodeIDs."""
+        self.node_ids = node_ids
+        self.temperature_node = self.client.get_node(node_ids["Temperature"])
+        self.humidity_node = self.client.get_node(node_ids["Humidity"])
+        self.fan_speed_node = self.client.get_node(node_ids["FanSpeed"])
+        self.set_fan_speed_node = self.client.get_node(node_ids["SetFanSpeed"])
+
+    def _node_cache_key(self) -> str:
+        return f"{self.server_url} {self.namespace}"
+
+    def _load_node_cache(self) -> dict:
+        """Lädt den NodeID-Cache, ein fehlender oder beschädigter Cache ist leer."""
+        try:
+            with open(self.node_cache_path, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return cache if isinstance(cache, dict) else {}
+
+    def _store_node_cache(self, node_ids: dict[str, str]) -> None:
+        """Speichert die NodeIDs für diesen Server und Namespace im Cache."""
+        cache = self._load_node_cache()
+        cache[self._node_cache_key()] = node_ids
+        temp_path = self.node_cache_path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(cache, f, indent=2)
+            os.replace(temp_path, self.node_cache_path)
+        except OSError as e:
+            pass
+
     async def _find_node_by_displayname(self, display_name_to_find: str, parent_node_ua: Node = None, path: list[str] = None) -> Node:
         """
         Sucht einen Node anhand seines Anzeigenamens, optional innerhalb eines Pfades.
@@ -87,34 +286,130 @@ class AsyncOPCUAClient:
             return await recursive_search(parent_node_ua)
 
     async def reconnect(self):
-        """Versucht, die Verbindung zum OPC UA Server wiederherzustellen."""
+        """
+        Versucht, die Verbindung zum OPC UA Server wiederherzustellen.
+
+        Der Client mit der bereits geladenen Security Policy wird wiederverwendet. Nur wenn ein
+        Versuch nicht an der Erreichbarkeit des Servers scheitert, etwa an einem neuen
+        Serverzertifikat, wird er beim nächsten Versuch neu erstellt.
+        """
         try:
             if self.client and self.client.uaclient and self.client.uaclient.protocol:
                 try:
                     await self.client.disconnect()
                 except Exception:
                     pass
-            self.client = AsyncuaClient(url=self.server_url)
-            await self.client.set_security_string(
-                f"Basic256Sha256,SignAndEncrypt,{self.client_cert_path},{self.client_key_path},{self.server_cert_path}"
-            )
+            self.subscription = None
+            self._connect_started = time.perf_counter()
+            if not self._reuse_client:
+                self.client = AsyncuaClient(url=self.server_url)
+                if self.use_security:
+                    await self.client.set_security_string(
+                        f"Basic256Sha256,SignAndEncrypt,{self.client_cert_path},{self.client_key_path},{self.server_cert_path}"
+                    )
+                self._reuse_client = True
             await self.client.connect()
-            node_ids_ua_node = await self._find_node_by_displayname("NodeIDs", path=["Objects", "Device"])
-            if node_ids_ua_node:
-                node_ids_json = await node_ids_ua_node.read_value()
-                self.node_ids = json.loads(node_ids_json)
-                self.temperature_node = self.client.get_node(self.node_ids["Temperature"])
-                self.humidity_node = self.client.get_node(self.node_ids["Humidity"])
-                self.fan_speed_node = self.client.get_node(self.node_ids["FanSpeed"])
-                self.set_fan_speed_node = self.client.get_node(self.node_ids["SetFanSpeed"])
-                return True
-            else:
-                return False
+            return await self._init_nodes()
+        except (OSError, asyncio.TimeoutError) as e:
+            return False
         except Exception as e:
+            self._reuse_client = False
+            return False
+
+    async def subscribe(self) -> bool:
+        """
+        Abonniert Temperature, Humidity und FanSpeed als Data-Change-Monitored-Items.
+
+        Wird der Deadband-Filter nicht unterstützt, wird ohne Filter abonniert. Unterstützt der
+        Server keine Subscriptions, wird False zurückgegeben und danach gepollt.
+        """
+        nodes = {
+            "temperature": self.temperature_node,
+            "humidity": self.humidity_node,
+            "fan_speed": self.fan_speed_node,
+        }
+        self.subscription_handler = _SensorDataHandler(
+            {node.nodeid: field for field, node in nodes.items()}, self._record_first_value
+        )
+        try:
+            self.subscription = await self.client.create_subscription(self.sampling_interval, self.subscription_handler)
+        except ua.UaStatusCodeError:
+            self.subscription = None
+            self.subscriptions_supported = False
             return False
+        filters = [self._deadband_filter(), None] if self.deadband > 0 else [None]
+        for mfilter in filters:
+            requests = [
+                self._monitored_item_request(node, client_handle, mfilter)
+                for client_handle, node in enumerate(nodes.values(), start=1)
+            ]
+            results = await self.subscription.create_monitored_items(requests)
+            if not any(isinstance(result, ua.StatusCode) for result in results):
+                return True
+            handles = [result for result in results if not isinstance(result, ua.StatusCode)]
+            if handles:
+                await self.subscription.unsubscribe(handles)
+        await self.subscription.delete()
+        self.subscription = None
+        self.subscriptions_supported = False
+        return False
+
+    def _deadband_filter(self) -> ua.DataChangeFilter:
+        """Erstellt einen absoluten Deadband-Filter für Wertänderungen."""
+        mfilter = ua.DataChangeFilter()
+        mfilter.Trigger = ua.DataChangeTrigger.StatusValue
+        mfilter.DeadbandType = ua.DeadbandType.Absolute
+        mfilter.DeadbandValue = float(self.deadband)
+        return mfilter
+
+    def _monitored_item_request(
+        self, node: Node, client_handle: int, mfilter: ua.DataChangeFilter | None
+    ) -> ua.MonitoredItemCreateRequest:
+        """Erstellt die Anfrage für ein Monitored Item mit eigenem Abtastintervall."""
+        item = ua.ReadValueId()
+        item.NodeId = node.nodeid
+        item.AttributeId = ua.AttributeIds.Value
+        params = ua.MonitoringParameters()
+        params.ClientHandle = client_handle
+        params.SamplingInterval = self.sampling_interval
+        params.QueueSize = 1
+        params.DiscardOldest = True
+        if mfilter is not None:
+            params.Filter = mfilter
+        request = ua.MonitoredItemCreateRequest()
+        request.ItemToMonitor = item
+        request.MonitoringMode = ua.MonitoringMode.Reporting
+        request.RequestedParameters = params
+        return request
+
+    async def read_sensor_values(self) -> None:
+        """Liest alle Sensorwerte mit einer einzigen Read-Anfrage und speichert sie in shared_state."""
+        temp_val, hum_val, fan_val = await self.client.read_values(
+            [self.temperature_node, self.humidity_node, self.fan_speed_node]
+        )
+        self._store_sensor_values(temp_val, hum_val, fan_val)
+
+    def _store_sensor_values(self, temp_val, hum_val, fan_val) -> None:
+        shared_state.record_sensor_values(
+            temperature=float(temp_val), humidity=float(hum_val), fan_speed=float(fan_val)
+        )
+        self._record_first_value()
+
+    def _record_first_value(self) -> None:
+        """Misst die Zeit vom Verbindungsaufbau bis zum ersten Sensorwert."""
+        if self._connect_started is None:
+            return
+        self.time_to_first_value = time.perf_counter() - self._connect_started
+        self._connect_started = None
+        print(f"OPC UA: first sensor value {self.time_to_first_value * 1000:.0f} ms after connecting")
 
     async def fetch_data_periodically(self):
-        """Ruft periodisch Daten vom Server ab und speichert sie in shared_state."""
+        """
+        Hält die Sensorwerte in shared_state aktuell.
+
+        Mit Subscription liefert der Server Änderungen selbst, die Schleife prüft dann nur die
+        Verbindung. Ohne Subscription werden die Werte alle OPC_FETCH_INTERVAL Sekunden gelesen.
+        """
         reconnect_delay = shared_state.OPC_FETCH_INTERVAL
         max_reconnect_delay = shared_state.OPC_RECONNECT_TIMEOUT
         while self.running:
@@ -122,15 +417,22 @@ class AsyncOPCUAClient:
                 if not (self.temperature_node and self.humidity_node and self.fan_speed_node):
                     await asyncio.sleep(shared_state.OPC_FETCH_INTERVAL)
                     continue
-                temp_val = await self.temperature_node.read_value()
-                hum_val = await self.humidity_node.read_value()
-                fan_val = await self.fan_speed_node.read_value()
-                shared_state.temperature = float(temp_val)
-                shared_state.humidity = float(hum_val)
-                shared_state.fan_speed = float(fan_val)
+                if self.use_subscription and self.subscriptions_supported and self.subscription is None:
+                    if await self.subscribe():
+                        # Der Server sendet die aktuellen Werte als erste Benachrichtigung
+                        reconnect_delay = shared_state.OPC_FETCH_INTERVAL
+                        continue
+                if self.subscription is not None:
+                    try:
+                        await self.client.check_connection()
+                    except Exception as e:
+                        raise ConnectionError(f"Connection is closed: {e}")
+                else:
+                    await self.read_sensor_values()
                 reconnect_delay = shared_state.OPC_FETCH_INTERVAL
             except Exception as e:
                 if "Connection is closed" in str(e):
+                    self.subscription = None
                     await asyncio.sleep(reconnect_delay)
                     if await self.reconnect():
                         reconnect_delay = shared_state.OPC_FETCH_INTERVAL
@@ -138,8 +440,19 @@ class AsyncOPCUAClient:
                         reconnect_delay = min(reconnect_delay * 1.5, max_reconnect_delay)
             if not self.running:
                 break
+            await self._dump_history()
             await asyncio.sleep(shared_state.OPC_FETCH_INTERVAL)
 
+    async def _dump_history(self, force: bool = False) -> None:
+        """Schreibt die Sensor-Historie auf die Festplatte, höchstens alle OPC_HISTORY_DUMP_INTERVAL Sekunden."""
+        if not force and time.monotonic() - self._last_history_dump < shared_state.OPC_HISTORY_DUMP_INTERVAL:
+            return
+        self._last_history_dump = time.monotonic()
+        try:
+            await asyncio.to_thread(shared_state.sensor_history.dump, shared_state.OPC_HISTORY_PATH)
+        except OSError as e:
+            pass
+
     async def set_fan_speed(self, value: float):
         """Setzt die Lüftergeschwindigkeit auf dem Server."""
         if not self.set_fan_speed_node:
@@ -168,6 +481,7 @@ class AsyncOPCUAClient:
                 await self._fetch_task
             except asyncio.CancelledError:
                 pass
+        await self._dump_history(force=True)
         if self.client and self.client.uaclient and self.client.uaclient.protocol:
             try:
                 await self.client.disconnect()
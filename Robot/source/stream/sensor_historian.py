@@ -0,0 +1,192 @@
+import os
+import threading
+import time
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+
+class SensorHistorian:
+    """Fixed-size ring buffer of timestamped sensor values with windowed aggregates."""
+    def __init__(self, capacity: int = 65536, fields: Sequence[str] = ("temperature", "humidity", "fan_speed")):
+        """
+        Initialize the historian.
+
+        Args:
+            capacity: Number of samples kept, older samples are overwritten
+            fields: Names of the recorded sensor values
+        """
+        self.capacity = capacity
+        self.fields = tuple(fields)
+        self.dtype = np.dtype([("timestamp", "<f8")] + [(field, "<f4") for field in self.fields])
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        # One row per field, so aggregates reduce over contiguous memory
+        self.values = np.full((len(self.fields), capacity), np.nan, dtype=np.float32)
+        self._columns = {field: column for column, field in enumerate(self.fields)}
+        self._last = np.full(len(self.fields), np.nan, dtype=np.float32)
+        self._head = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def last_timestamp(self) -> Optional[float]:
+        """Timestamp of the newest sample, None if there is none."""
+        with self._lock:
+            if self._count == 0:
+                return None
+            return float(self.timestamps[self._head - 1])
+
+    def append(self, timestamp: Optional[float] = None, **values: float) -> None:
+        """
+        Records a sample in constant time.
+
+        Fields that are not given keep their last value, so notifications that only
+        carry one changed value still produce complete samples.
+
+        Args:
+            timestamp: Unix time of the sample, defaults to now
+            **values: New sensor values by field name
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        with self._lock:
+            for field, value in values.items():
+                self._last[self._columns[field]] = value
+            self.timestamps[self._head] = timestamp
+            self.values[:, self._head] = self._last
+            self._head = (self._head + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def _segments(self):
+        """Returns the slices of the buffer in chronological order."""
+        if self._count < self.capacity:
+            return (slice(0, self._count),)
+        return slice(self._head, self.capacity), slice(0, self._head)
+
+    def window(self, since: float, until: Optional[float] = None, carry_in: bool = False):
+        """
+        Copies the samples taken in [since, until].
+
+        Args:
+            since: Start of the window as Unix time
+            until: End of the window as Unix time, defaults to now
+            carry_in: Also return the last sample before since, whose value still holds at since
+
+        Returns:
+            tuple: Timestamps and values of shape (fields, samples)
+        """
+        if until is None:
+            until = time.time()
+        timestamps = []
+        values = []
+        with self._lock:
+            segments = self._segments()
+            previous = None
+            for segment in segments:
+                segment_timestamps = self.timestamps[segment]
+                start = np.searchsorted(segment_timestamps, since, side="left")
+                end = np.searchsorted(segment_timestamps, until, side="right")
+                if start > 0:
+                    previous = (segment, start - 1)
+                if end > start:
+                    timestamps.append(segment_timestamps[start:end].copy())
+                    values.append(self.values[:, segment][:, start:end].copy())
+            if carry_in and previous is not None:
+                segment, index = previous
+                timestamps.insert(0, self.timestamps[segment][index:index + 1].copy())
+                values.insert(0, self.values[:, segment][:, index:index + 1].copy())
+        if not timestamps:
+            return np.empty(0, dtype=np.float64), np.empty((len(self.fields), 0), dtype=np.float32)
+        return np.concatenate(timestamps), np.concatenate(values, axis=1)
+
+    def aggregate(self, seconds: Optional[float] = None, since: Optional[float] = None, until: Optional[float] = None) -> Dict[str, Dict[str, float]]:
+        """
+        Computes mean, min and max of every field over a time window.
+
+        Samples are only taken when a value changes, so the mean is weighted by how
+        long each value held inside the window. The value that held at the start of
+        the window counts as well.
+
+        Args:
+            seconds: Length of a window that ends now, alternative to since
+            since: Start of the window as Unix time
+            until: End of the window as Unix time, defaults to now
+
+        Returns:
+            dict: "mean", "min" and "max" per field, empty if there is no sample in or before the window
+        """
+        if until is None:
+            until = time.time()
+        if since is None:
+            since = until - (seconds or 0.0)
+        timestamps, values = self.window(since, until, carry_in=True)
+        if len(timestamps) == 0:
+            return {}
+        edges = np.append(np.clip(timestamps, since, until), until)
+        weights = np.diff(edges)
+        valid = ~np.isnan(values)
+        total = valid @ weights
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(total > 0, np.where(valid, values, 0.0) @ weights / total, values[:, -1])
+        # fmin/fmax skip NaN, fields that were never received stay NaN
+        minimum = np.fmin.reduce(values, axis=1)
+        maximum = np.fmax.reduce(values, axis=1)
+        return {
+            field: {"mean": float(mean[column]), "min": float(minimum[column]), "max": float(maximum[column])}
+            for column, field in enumerate(self.fields)
+        }
+
+    def to_array(self) -> np.ndarray:
+        """Returns all samples in chronological order as a structured array."""
+        with self._lock:
+            segments = self._segments()
+            array = np.empty(self._count, dtype=self.dtype)
+            array["timestamp"] = np.concatenate([self.timestamps[segment] for segment in segments])
+            ordered = np.concatenate([self.values[:, segment] for segment in segments], axis=1)
+        for column, field in enumerate(self.fields):
+            array[field] = ordered[column]
+        return array
+
+    def dump(self, path: str) -> None:
+        """
+        Writes all samples to a binary .npy file, replacing it atomically.
+
+        Args:
+            path: Target file
+        """
+        array = self.to_array()
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            np.save(f, array, allow_pickle=False)
+        os.replace(temp_path, path)
+
+    def load(self, path: str) -> bool:
+        """
+        Replaces the samples with those of a file written by dump, e.g. after a restart.
+
+        Args:
+            path: File written by dump
+
+        Returns:
+            bool: True if the file could be read
+        """
+        try:
+            array = np.load(path, allow_pickle=False)
+        except (OSError, ValueError):
+            return False
+        if array.dtype.names is None or "timestamp" not in array.dtype.names:
+            return False
+        array = array[-self.capacity:]
+        count = len(array)
+        with self._lock:
+            self.timestamps[:count] = array["timestamp"]
+            for column, field in enumerate(self.fields):
+                self.values[column, :count] = array[field] if field in array.dtype.names else np.nan
+            if count:
+                self._last = self.values[:, count - 1].copy()
+            self._head = count % self.capacity
+            self._count = count
+        return True
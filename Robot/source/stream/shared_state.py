@@ -1,7 +1,13 @@
 ''' Shared state for the ArUco marker and color detection system. Also for the UiWindow. '''
 
+import dataclasses
 import numpy as np
 import threading
+import time
+from types import MappingProxyType
+from typing import Any, Mapping, Optional, Tuple
+
+from stream.sensor_historian import SensorHistorian
 
 
 # For ArUco Marker and Calibration
@@ -73,13 +79,76 @@ V_WHITE_MIN = 253
 OPC_SERVER_URL = "opc.tcp://192.168.1.103:4840/freeopcua/server/"
 OPC_RECONNECT_TIMEOUT = 800
 OPC_FETCH_INTERVAL = 10
+OPC_NAMESPACE = "http://example.org"
+# Resolved NodeIDs per server and namespace, so reconnects skip browsing the address space
+OPC_NODE_CACHE_PATH = "stream/opcua_node_cache.json"
+# Subscriptions push sensor changes instead of polling every OPC_FETCH_INTERVAL seconds
+OPC_USE_SUBSCRIPTION = True
+OPC_SAMPLING_INTERVAL = 500
+OPC_DEADBAND = 0.1
+# Sensor history, dumped to disk every OPC_HISTORY_DUMP_INTERVAL seconds and reloaded on start
+OPC_HISTORY_CAPACITY = 65536
+OPC_HISTORY_PATH = "stream/sensor_history.npy"
+OPC_HISTORY_DUMP_INTERVAL = 300
+
+# Detection results, published as one immutable snapshot per frame
+@dataclasses.dataclass(frozen=True)
+class DetectionSnapshot:
+    """Detection results of one frame. Never modified after it has been published."""
+    seq: int = 0
+    timestamp: float = 0.0
+    color_objects: Tuple[Mapping[str, Any], ...] = ()
+    marker_centers: Mapping[int, Tuple[int, int]] = dataclasses.field(
+        default_factory=lambda: MappingProxyType({})
+    )
+    transformation_matrix: Optional[np.ndarray] = None
+
+
+detection_snapshot = DetectionSnapshot()
+# Only serializes writers, readers just take the current reference
+_publish_lock = threading.Lock()
+
+
+def publish_detections(**changes: Any) -> DetectionSnapshot:
+    """
+    Publishes a new detection snapshot by swapping the module-level reference.
+
+    Fields that are not given are taken over from the current snapshot. Readers
+    either see the old or the new snapshot as a whole and never have to lock.
+
+    Args:
+        **changes: New values for fields of DetectionSnapshot
+
+    Returns:
+        DetectionSnapshot: The published snapshot
+    """
+    global detection_snapshot
+    if "color_objects" in changes:
+        changes["color_objects"] = tuple(
+            MappingProxyType(dict(obj)) for obj in changes["color_objects"]
+        )
+    if "marker_centers" in changes:
+        changes["marker_centers"] = MappingProxyType(dict(changes["marker_centers"]))
+    if changes.get("transformation_matrix") is not None:
+        matrix = np.array(changes["transformation_matrix"])
+        matrix.setflags(write=False)
+        changes["transformation_matrix"] = matrix
+    if "seq" in changes:
+        changes.setdefault("timestamp", time.time())
+    with _publish_lock:
+        detection_snapshot = dataclasses.replace(detection_snapshot, **changes)
+        return detection_snapshot
+
 
 # calibration data and marker origins
+# The list is replaced, never modified in place, so it can be read without the lock
 calibrated_marker_origins = []
-current_detected_marker_centers = {}
-current_detected_color_objects_info = []
-data_lock = threading.RLock()
-global_transformation_matrix = None
+calibration_lock = threading.Lock()
+
+# Per-field locks for the remaining UI and filter state
+roi_lock = threading.Lock()
+zoom_lock = threading.RLock()
+filter_lock = threading.Lock()
 
 # For UI
 g_zoom_scale = 1.0
@@ -102,4 +171,18 @@ temperature = 0.0
 humidity = 0.0
 
 # Fan Speed
-fan_speed = 0.0
\ No newline at end of file
+fan_speed = 0.0
+
+# Every received sensor value with its timestamp, for averages over a time window
+sensor_history = SensorHistorian(OPC_HISTORY_CAPACITY)
+
+
+def record_sensor_values(**values: float) -> None:
+    """
+    Sets the latest sensor values and appends them to the sensor history.
+
+    Args:
+        **values: New values for temperature, humidity and fan_speed
+    """
+    globals().update(values)
+    sensor_history.append(**values)
\ No newline at end of file
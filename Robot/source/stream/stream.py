@@ -8,7 +8,7 @@ import stream.shared_state as shared_state
 from stream.stream_handler import StreamHandler
 from stream.ui_window import UIWindow
 from stream.video_analyzer import VideoAnalyzer
-from utils.config import read_config
+from utils.config import get_config_service, read_config
 
 
 class Stream:
@@ -30,6 +30,7 @@ class Stream:
         """
         self.opcua_event_loop = asyncio.new_event_loop()
         asyncio.set_event_loop(self.opcua_event_loop)
+        shared_state.sensor_history.load(shared_state.OPC_HISTORY_PATH)
         try:
             self.opcua_event_loop.run_until_complete(client.connect())
             if client.client and client.client.uaclient and client.client.uaclient.protocol:
@@ -54,6 +55,13 @@ class Stream:
         )
         if not stream_handler.open():
             return
+
+        def on_stream_config_changed(old, new):
+            if (old.get("host"), old.get("port")) != (new["host"], new["port"]):
+                stream_handler.rebind(new["host"], new["port"])
+
+        config_service = get_config_service(self.main_window.config_path)
+        config_service.subscribe("stream", on_stream_config_changed)
         marker_detector = MarkerDetector()
         video_analyzer = VideoAnalyzer()
         opcua_server_url = shared_state.OPC_SERVER_URL
@@ -72,21 +80,22 @@ class Stream:
         )
         command_handler.start_server()
         if not stream_handler.wait_for_first_frame(timeout=60):
+            config_service.unsubscribe("stream", on_stream_config_changed)
             command_handler.stop_server()
             stream_handler.close()
             return
-        with shared_state.data_lock:
+        with shared_state.calibration_lock:
             shared_state.calibrated_marker_origins = marker_detector.load_calibration_data(
                 shared_state.CALIBRATION_FILE_PATH
             )
-            if shared_state.calibrated_marker_origins:
-                video_analyzer.calculate_and_store_transformation(
-                    shared_state.calibrated_marker_origins
-                )
+            calibration_data = shared_state.calibrated_marker_origins
+        if calibration_data:
+            video_analyzer.calculate_and_store_transformation(calibration_data)
         ui_window = UIWindow(
             stream_handler=stream_handler,
             marker_detector=marker_detector,
             video_analyzer=video_analyzer,
+            detection_listener=command_handler.publish_detections,
         )
         ui_window.setup_window()
         try:
@@ -105,6 +114,7 @@ class Stream:
                     self.opcua_event_loop.call_soon_threadsafe(self.opcua_event_loop.stop)
             if opcua_thread and opcua_thread.is_alive():
                 opcua_thread.join(timeout=5)
+            config_service.unsubscribe("stream", on_stream_config_changed)
             command_handler.stop_server()
             stream_handler.close()
 
@@ -435,6 +435,22 @@ class StreamHandler:
             self.forward_thread.join(timeout=1.0)
         self.is_connected = False
 
+    def rebind(self, host: str, port: int) -> bool:
+        """
+        Restart the server on a new address. The client has to connect again.
+
+        Args:
+            host: New host address to bind the server to
+            port: New port number to listen on
+
+        Returns:
+            bool: True if the server was started on the new address, False otherwise
+        """
+        self.close()
+        self.host = host
+        self.port = port
+        return self.open()
+
     def wait_for_first_frame(self, timeout=None):
         """
         Wait until the first frame is received from a client.
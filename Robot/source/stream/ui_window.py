@@ -1,6 +1,6 @@
 import cv2
 import numpy as np
-from typing import Dict, Any
+from typing import Callable, Dict, Any, List, Optional
 import stream.shared_state as shared_state
 from stream.stream_handler import StreamHandler
 from stream.marker_detector import MarkerDetector
@@ -29,6 +29,7 @@ class UIWindow(QObject if PYSIDE6_AVAILABLE else object):
         stream_handler: StreamHandler,
         marker_detector: MarkerDetector,
         video_analyzer: VideoAnalyzer,
+        detection_listener: Optional[Callable[[int, List[Dict[str, Any]]], None]] = None,
     ):
         """
         Initialize the UI window.
@@ -37,6 +38,7 @@ class UIWindow(QObject if PYSIDE6_AVAILABLE else object):
             stream_handler: Instance of StreamHandler
             marker_detector: Instance of MarkerDetector
             video_analyzer: Instance of VideoAnalyzer
+            detection_listener: Optional callback that gets the frame sequence number and the detected color objects of every processed frame
         """
         if PYSIDE6_AVAILABLE:
             super().__init__()
@@ -44,6 +46,8 @@ class UIWindow(QObject if PYSIDE6_AVAILABLE else object):
         self.stream_handler = stream_handler
         self.marker_detector = marker_detector
         self.video_analyzer = video_analyzer
+        self.detection_listener = detection_listener
+        self.frame_seq = 0
         self.color_settings_window = None
         self.running = False
         self.initial_frame_width, self.initial_frame_height = (
@@ -74,7 +78,7 @@ class UIWindow(QObject if PYSIDE6_AVAILABLE else object):
             flags: Event flags
             param: Additional parameters
         """
-        with shared_state.data_lock:
+        with shared_state.zoom_lock, shared_state.roi_lock:
             if shared_state.g_zoom_scale == 1.0:
                 if event == cv2.EVENT_LBUTTONDOWN and not shared_state.g_roi_confirmed:
                     shared_state.g_roi_selection_active = True
@@ -191,7 +195,7 @@ class UIWindow(QObject if PYSIDE6_AVAILABLE else object):
 
     def _reset_zoom(self) -> None:
         """Reset zoom settings to default."""
-        with shared_state.data_lock:
+        with shared_state.zoom_lock:
             shared_state.g_zoom_scale = 1.0
             shared_state.g_zoom_center_original_x = None
             shared_state.g_zoom_center_original_y = None
@@ -230,16 +234,17 @@ class UIWindow(QObject if PYSIDE6_AVAILABLE else object):
         if key == 27:
             return False
         elif key == ord("l"):
-            with shared_state.data_lock:
+            with shared_state.calibration_lock:
                 shared_state.calibrated_marker_origins = (
                     self.marker_detector.load_calibration_data(
                         shared_state.CALIBRATION_FILE_PATH
                     )
                 )
-                if shared_state.calibrated_marker_origins:
-                    self.video_analyzer.calculate_and_store_transformation(
-                        shared_state.calibrated_marker_origins
-                    )
+                calibration_data = shared_state.calibrated_marker_origins
+            if calibration_data:
+                self.video_analyzer.calculate_and_store_transformation(
+                    calibration_data
+                )
         elif key == ord("f"):
             self.toggle_fullscreen()
         elif key == ord("r"):
@@ -257,23 +262,23 @@ class UIWindow(QObject if PYSIDE6_AVAILABLE else object):
         elif key == ord("x"):
             new_sharpness = self.stream_handler.decrease_sharpness()
         elif key == 13:
-            with shared_state.data_lock:
+            with shared_state.roi_lock:
                 if shared_state.g_roi_selection_start and shared_state.g_roi_selection_end:
                     shared_state.g_roi_confirmed = True
         elif key == ord("c"):
-            with shared_state.data_lock:
+            with shared_state.roi_lock:
                 shared_state.g_roi_selection_start = None
                 shared_state.g_roi_selection_end = None
                 shared_state.g_roi_confirmed = False
                 shared_state.g_roi_rotation_angle = 0
         elif key == ord("v"):
-            with shared_state.data_lock:
+            with shared_state.roi_lock:
                 if shared_state.g_roi_confirmed:
                     shared_state.g_roi_rotation_angle = (
                         shared_state.g_roi_rotation_angle - 5
                     ) % 360
         elif key == ord("b"):
-            with shared_state.data_lock:
+            with shared_state.roi_lock:
                 if shared_state.g_roi_confirmed:
                     shared_state.g_roi_rotation_angle = (
                         shared_state.g_roi_rotation_angle + 5
@@ -297,7 +302,7 @@ class UIWindow(QObject if PYSIDE6_AVAILABLE else object):
             pre_color_filtered_base = color_filter_module.apply_color_filter(frame.copy(), shared_state.MIN_AREA_COLOR_FILTER)
             processed_frame_for_color_analysis = pre_color_filtered_base.copy()
             processed_current_display_frame = original_frame_copy.copy()
-            with shared_state.data_lock:
+            with shared_state.roi_lock:
                 roi_confirmed_local = shared_state.g_roi_confirmed
                 roi_selection_start_local = shared_state.g_roi_selection_start
                 if roi_selection_start_local: roi_selection_start_local = tuple(roi_selection_start_local)
@@ -340,8 +345,6 @@ class UIWindow(QObject if PYSIDE6_AVAILABLE else object):
             else:
                 marker_output_frame, detected_centers_this_frame = self.marker_detector.process_frame(original_frame_copy.copy())
                 processed_current_display_frame = marker_output_frame
-            with shared_state.data_lock:
-                shared_state.current_detected_marker_centers = detected_centers_this_frame.copy()
             _, color_data_for_this_frame = self.video_analyzer.find_color(
                 processed_frame_for_color_analysis.copy()
             )
@@ -349,8 +352,14 @@ class UIWindow(QObject if PYSIDE6_AVAILABLE else object):
                 processed_frame_for_color_analysis.copy(),
                 display_frame=processed_current_display_frame
             )
-            with shared_state.data_lock:
-                shared_state.current_detected_color_objects_info = color_data_for_this_frame.copy()
+            self.frame_seq += 1
+            snapshot = shared_state.publish_detections(
+                seq=self.frame_seq,
+                color_objects=color_data_for_this_frame,
+                marker_centers=detected_centers_this_frame,
+            )
+            if self.detection_listener:
+                self.detection_listener(snapshot.seq, list(snapshot.color_objects))
             self.marker_detector.draw_calibrated_origins(
                 processed_current_display_frame, shared_state.calibrated_marker_origins
             )
@@ -383,7 +392,7 @@ class UIWindow(QObject if PYSIDE6_AVAILABLE else object):
                     if self.latest_color_analysis_frame is not None:
                         color_analysis_frame_to_show = self.latest_color_analysis_frame.copy()
             if display_frame_to_show is not None:
-                with shared_state.data_lock:
+                with shared_state.roi_lock:
                     roi_selection_active_local = shared_state.g_roi_selection_active
                     roi_selection_start_local = shared_state.g_roi_selection_start
                     roi_selection_end_local = shared_state.g_roi_selection_end
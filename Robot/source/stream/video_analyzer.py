@@ -79,10 +79,14 @@ class VideoAnalyzer:
                         and math.isfinite(robot_x)
                         and math.isfinite(robot_y)
                     ):
+                        (_, _), (rect_w, rect_h), _ = cv2.minAreaRect(contour)
+                        rect_area = rect_w * rect_h
                         detected_color_objects_list.append(
                             {
                                 "bgr_tuple": draw_bgr_color_tuple,
                                 "robot_pos": {"x": robot_x, "y": robot_y},
+                                # How well the contour fills its bounding rectangle
+                                "confidence": min(1.0, cv2.contourArea(contour) / rect_area) if rect_area > 0 else 0.0,
                             }
                         )
                     cv2.drawContours(
@@ -168,15 +172,13 @@ class VideoAnalyzer:
         if len(camera_points) < 4:
             msg = f"Insufficient points for homography. Need at least 4, found {len(camera_points)}."
             print(msg)
-            with shared_state.data_lock:
-                shared_state.global_transformation_matrix = None
+            shared_state.publish_detections(transformation_matrix=None)
             return False, msg, None
         src_pts = np.array(camera_points, dtype=np.float32)
         dst_pts = np.array(robot_points, dtype=np.float32)
         homography_matrix, mask = cv2.findHomography(src_pts, dst_pts, method=cv2.RANSAC)
         if homography_matrix is not None:
-            with shared_state.data_lock:
-                shared_state.global_transformation_matrix = homography_matrix
+            shared_state.publish_detections(transformation_matrix=homography_matrix)
             num_inliers = int(np.sum(mask)) if mask is not None else 0
             msg = f"Homography computed with {num_inliers}/{len(src_pts)} inliers."
             print(msg)
@@ -184,8 +186,7 @@ class VideoAnalyzer:
         else:
             msg = "Homography computation failed."
             print(msg)
-            with shared_state.data_lock:
-                shared_state.global_transformation_matrix = None
+            shared_state.publish_detections(transformation_matrix=None)
             return False, msg, None
 
     def convert_camera_to_robot(
@@ -202,8 +203,7 @@ class VideoAnalyzer:
         Returns:
             tuple: (robot_x, robot_y) or (None, None) if transformation matrix is not available.
         """
-        with shared_state.data_lock:
-            matrix = shared_state.global_transformation_matrix
+        matrix = shared_state.detection_snapshot.transformation_matrix
         if matrix is None:
             return None, None
         cam_point = np.array([[[camera_x, camera_y]]], dtype=np.float32)
@@ -0,0 +1,182 @@
+import asyncio
+import math
+from itertools import islice
+from time import perf_counter
+
+from utils.connection_pool import ConnectionPool
+
+
+class LatencyCounts:
+    """Bounded latency histogram with buckets about 2 % wide.
+
+    Memory depends on the range of the latencies, not on how many were recorded,
+    so percentiles of any number of acknowledgements can be kept.
+    """
+
+    _BASE = math.log(1.02)
+
+    def __init__(self):
+        self.counts = {}
+        self.total = 0
+        self.max = None
+
+    def record(self, seconds):
+        bucket = int(math.log(max(seconds * 1e6, 1.0)) / self._BASE)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.total += 1
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def percentile_ms(self, percentile):
+        """Returns the upper edge of the bucket holding the percentile in milliseconds, None if empty."""
+        if not self.total:
+            return None
+        target = max(1, math.ceil(percentile / 100 * self.total))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= target:
+                return min(math.exp((bucket + 1) * self._BASE) / 1000, self.max * 1000)
+        return self.max * 1000
+
+
+class _IngestRun:
+    """Running counters of one ingest call."""
+
+    def __init__(self, acked_batches=None):
+        self.acked_batches = acked_batches
+        self.rows = 0
+        self.rows_acked = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.last_error = None
+        self.latency = LatencyCounts()
+        # Leading batches that were all acknowledged, later ones wait in done until the gap closes
+        self.rows_in_order = 0
+        self.next_in_order = 0
+        self.in_order_broken = False
+        self.done = {}
+
+    def finish(self, index, rows, acked):
+        if acked:
+            self.rows_acked += rows
+            if self.acked_batches is not None:
+                self.acked_batches.append(index)
+        else:
+            self.failed_batches += 1
+        if self.in_order_broken:
+            return
+        if not acked:
+            self.in_order_broken = True
+            self.done.clear()
+            return
+        self.done[index] = rows
+        while self.next_in_order in self.done:
+            self.rows_in_order += self.done.pop(self.next_in_order)
+            self.next_in_order += 1
+
+
+class BulkIngestClient(ConnectionPool):
+    """Connection pool that writes large record sets as pipelined batches.
+
+    Records are split into messages of batch_size records, and up to max_in_flight
+    messages per connection are on the wire at once, so the sender never waits a
+    full round trip per message. Responses are matched by request ID on the
+    newline-framed connections of the pool. The datacenter server takes at most
+    25 records per message, so throughput comes from pipelining and parallel
+    connections rather than larger messages. Everything else behaves like the
+    ConnectionPool, so it can serve as the DatabaseImp transport.
+    """
+
+    def __init__(self, host, port, password, size=4, batch_size=25, max_in_flight=4, retries=1, **pool_options):
+        super().__init__(host, port, password, size=size, **pool_options)
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.retries = retries
+
+    async def ingest(self, records, message_type="robotdata", timeout=30.0, acked_batches=None, ordered=False):
+        """Sends records as pipelined batches and waits for all acknowledgements.
+
+        Args:
+            records: Iterable of records, consumed lazily batch by batch
+            message_type: Message type of the batches, e.g. robotdata or energydata
+            timeout: Seconds to wait for the acknowledgement of one batch
+            acked_batches: List the indices of the acknowledged batches are appended to,
+                e.g. to remove exactly the acknowledged records from a spool
+            ordered: Send all batches pipelined on one connection, so the server receives
+                them in order, instead of spreading them over the pool
+
+        Returns:
+            A report with the row and batch counts, rows_in_order (rows of the leading
+            batches that were all acknowledged, which can be dropped from a spool),
+            rows/s, bytes/s and the acknowledgement latency percentiles in milliseconds.
+        """
+        return await self._on_loop(self._ingest(records, message_type, timeout, acked_batches, ordered))
+
+    async def _ingest(self, records, message_type, timeout, acked_batches, ordered):
+        slot = None
+        if ordered:
+            await asyncio.wait_for(self._available.wait(), timeout)
+            slot = self._pick_slot()
+        window = asyncio.Semaphore(self.max_in_flight * (1 if ordered else self.size))
+        run = _IngestRun(acked_batches)
+        pending = set()
+        bytes_before = self.bytes_sent
+        start = perf_counter()
+        iterator = iter(records)
+        while True:
+            batch = list(islice(iterator, self.batch_size))
+            if not batch:
+                break
+            await window.acquire()
+            task = asyncio.create_task(
+                self._send_batch(window, run, run.batches, {"type": message_type, "data": batch}, timeout, slot)
+            )
+            # Finished batches are only counted, so memory stays flat however many rows are sent
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+            run.rows += len(batch)
+            run.batches += 1
+        if pending:
+            await asyncio.gather(*pending)
+        return self._report(run, perf_counter() - start, self.bytes_sent - bytes_before)
+
+    async def _send_batch(self, window, run, index, message, timeout, slot):
+        """Sends one batch, retrying it on a lost connection, and records the outcome."""
+        acked = False
+        try:
+            for attempt in range(self.retries + 1):
+                start = perf_counter()
+                try:
+                    response = await self._request(message, timeout, slot)
+                except Exception as e:
+                    run.last_error = str(e) or type(e).__name__
+                    continue
+                run.latency.record(perf_counter() - start)
+                if isinstance(response, dict) and response.get("status") == "success":
+                    acked = True
+                else:
+                    run.last_error = response.get("message") if isinstance(response, dict) else "Invalid response"
+                return
+        finally:
+            run.finish(index, len(message["data"]), acked)
+            window.release()
+
+    def _report(self, run, seconds, bytes_sent):
+        return {
+            "rows": run.rows,
+            "rows_acked": run.rows_acked,
+            "rows_in_order": run.rows_in_order,
+            "batches": run.batches,
+            "failed_batches": run.failed_batches,
+            "last_error": run.last_error,
+            "seconds": seconds,
+            "bytes_sent": bytes_sent,
+            "rows_per_second": run.rows_acked / seconds if seconds else None,
+            "bytes_per_second": bytes_sent / seconds if seconds else None,
+            "ack_latency_ms": {
+                "p50": run.latency.percentile_ms(50),
+                "p90": run.latency.percentile_ms(90),
+                "p99": run.latency.percentile_ms(99),
+                "max": run.latency.max * 1000 if run.latency.max is not None else None,
+            },
+        }
@@ -0,0 +1,287 @@
+from concurrent.futures import Future
+from json import dumps, loads
+from socket import socket, AF_INET, SOCK_STREAM, IPPROTO_TCP, TCP_NODELAY
+from struct import pack, unpack
+from threading import Lock, Thread
+from typing import Callable
+from uuid import uuid4
+
+from utils.detection_codec import BINARY_ENCODING, decode_message, encode_message
+
+
+# Every frame is a 4 byte big-endian length followed by that many bytes of UTF-8 JSON.
+# A legacy message starts with "{" instead, which no length below 2 GiB can start with.
+# If the highest bit of the length is set, the payload is a 2 byte header length, a JSON
+# header and a binary body (see utils.detection_codec), which is only sent when negotiated.
+FRAME_HEADER_SIZE: int = 4
+MAX_FRAME_SIZE: int = 64 * 1024 * 1024
+BINARY_FLAG: int = 0x80000000
+ENCODINGS: tuple[str, ...] = (BINARY_ENCODING, "json")
+
+
+def encode_frame(message: dict, encoding: str = "json") -> bytes:
+    """
+    Encode a message as a length-prefixed frame.
+
+    Args:
+        message (dict): The message to encode.
+        encoding (str, optional): The encoding negotiated for the connection. Default is "json".
+
+    Returns:
+        bytes: The frame.
+    """
+    body = None
+    if encoding == BINARY_ENCODING:
+        message, body = encode_message(message)
+    payload = dumps(message, separators=(",", ":")).encode("utf-8")
+    if body is None:
+        return pack("!I", len(payload)) + payload
+    return pack("!IH", (2 + len(payload) + len(body)) | BINARY_FLAG, len(payload)) + payload + body
+
+
+def negotiate_encoding(accept: list[str]) -> str:
+    """
+    Pick the first encoding a client accepts that is supported here.
+
+    Args:
+        accept (list[str]): The encodings accepted by the client, preferred first.
+
+    Returns:
+        str: The chosen encoding, "json" if there is no common one.
+    """
+    return next((encoding for encoding in accept if encoding in ENCODINGS), "json")
+
+
+def recv_exact(sock: socket, size: int) -> bytes | None:
+    """
+    Receive exactly size bytes from a socket.
+
+    Args:
+        sock (socket): The socket to read from.
+        size (int): The number of bytes to read.
+
+    Returns:
+        bytes | None: The bytes read, or None if the connection was closed.
+    """
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(min(size, 65536))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_frame(sock: socket, header: bytes | None = None) -> dict | None:
+    """
+    Receive one length-prefixed frame from a socket.
+
+    Args:
+        sock (socket): The socket to read from.
+        header (bytes | None, optional): The header if it was already read.
+
+    Returns:
+        dict | None: The decoded message, or None if the connection was closed.
+    """
+    if header is None:
+        header = recv_exact(sock, FRAME_HEADER_SIZE)
+        if header is None:
+            return None
+    size = unpack("!I", header)[0]
+    binary = bool(size & BINARY_FLAG)
+    size &= ~BINARY_FLAG
+    if size > MAX_FRAME_SIZE:
+        raise ValueError(f"Frame of {size} bytes exceeds the limit of {MAX_FRAME_SIZE} bytes.")
+    payload = recv_exact(sock, size)
+    if payload is None:
+        return None
+    if not binary:
+        return loads(payload.decode("utf-8"))
+    header_size = unpack("!H", payload[:2])[0]
+    return decode_message(loads(payload[2:2 + header_size].decode("utf-8")), payload[2 + header_size:])
+
+
+class CommandChannel:
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        timeout: float = 10.0,
+        accept: tuple[str, ...] = ENCODINGS,
+        on_push: Callable[[dict], None] | None = None,
+        on_disconnect: Callable[[], None] | None = None,
+    ) -> None:
+        """
+        Initialize a persistent command channel to the command handler.
+
+        The connection is opened lazily and shared by all threads. Requests carry a
+        request_id, so several of them can be in flight at the same time.
+
+        Args:
+            host (str): The host of the command handler.
+            port (int): The port of the command handler.
+            timeout (float, optional): Seconds to wait for a response. Default is 10.0.
+            accept (tuple[str, ...], optional): Encodings to offer the command handler, preferred first. Default is binary, then JSON.
+            on_push (Callable[[dict], None] | None, optional): Called on the reader thread for messages that answer no request.
+            on_disconnect (Callable[[], None] | None, optional): Called on the reader thread when the connection is lost.
+        """
+        self.host: str = host
+        self.port: int = port
+        self.timeout: float = timeout
+        self.accept: tuple[str, ...] = accept
+        self.encoding: str = "json"
+        self.on_push = on_push
+        self.on_disconnect = on_disconnect
+        self._sock: socket | None = None
+        self._pending: dict[str, Future] = {}
+        self._lock = Lock()
+
+    def _connect(self) -> socket:
+        """
+        Open the connection, negotiate the encoding and start the response reader.
+        Must be called with the lock held.
+
+        Returns:
+            socket: The connected socket.
+        """
+        sock = socket(AF_INET, SOCK_STREAM)
+        sock.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
+        sock.connect((self.host, self.port))
+        self.encoding = "json"
+        if self.accept != ("json",):
+            try:
+                sock.settimeout(self.timeout)
+                sock.sendall(encode_frame({"type": "negotiate", "accept": list(self.accept)}))
+                response = recv_frame(sock)
+                sock.settimeout(None)
+            except OSError:
+                sock.close()
+                raise
+            if response is None:
+                sock.close()
+                raise ConnectionError("Connection to the command handler was closed.")
+            # Older command handlers answer with an error and only speak JSON
+            if response.get("encoding") in self.accept:
+                self.encoding = response["encoding"]
+        self._sock = sock
+        Thread(target=self._read_responses, args=(sock,), name="CommandChannelReader", daemon=True).start()
+        return sock
+
+    def _read_responses(self, sock: socket) -> None:
+        """
+        Route incoming responses to the requests waiting for them.
+
+        Args:
+            sock (socket): The socket to read from.
+        """
+        error: Exception = ConnectionError("Connection to the command handler was closed.")
+        try:
+            while True:
+                response = recv_frame(sock)
+                if response is None:
+                    break
+                with self._lock:
+                    future = self._pending.pop(response.pop("request_id", None), None)
+                if future is None:
+                    if self.on_push is not None:
+                        self.on_push(response)
+                elif not future.done():
+                    future.set_result(response)
+        except Exception as e:
+            error = e
+        finally:
+            with self._lock:
+                if self._sock is sock:
+                    self._sock = None
+                pending, self._pending = self._pending, {}
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            try:
+                sock.close()
+            except:
+                pass
+            if self.on_disconnect is not None:
+                self.on_disconnect()
+
+    def request(self, message: dict) -> dict:
+        """
+        Send a message and wait for its response.
+
+        A broken connection is reopened once before giving up.
+
+        Args:
+            message (dict): The message to send.
+
+        Returns:
+            dict: The response.
+        """
+        for attempt in range(2):
+            request_id = uuid4().hex
+            future = Future()
+            try:
+                with self._lock:
+                    sock = self._sock or self._connect()
+                    self._pending[request_id] = future
+                    sock.sendall(encode_frame({**message, "request_id": request_id}))
+            except OSError as e:
+                with self._lock:
+                    self._pending.pop(request_id, None)
+                    self._sock = None
+                if attempt == 1 or isinstance(e, ConnectionRefusedError):
+                    raise
+                continue
+            try:
+                return future.result(timeout=self.timeout)
+            except ConnectionError:
+                if attempt == 1:
+                    raise
+            finally:
+                with self._lock:
+                    self._pending.pop(request_id, None)
+
+    def close(self) -> None:
+        """Close the connection. Pending requests fail with a ConnectionError."""
+        with self._lock:
+            sock, self._sock = self._sock, None
+        if sock is not None:
+            try:
+                sock.close()
+            except:
+                pass
+
+
+_channels: dict[tuple[str, int], CommandChannel] = {}
+_channels_lock = Lock()
+
+
+def get_channel(host: str, port: int) -> CommandChannel:
+    """
+    Get the shared command channel for a host and port.
+
+    Args:
+        host (str): The host of the command handler.
+        port (int): The port of the command handler.
+
+    Returns:
+        CommandChannel: The shared channel.
+    """
+    with _channels_lock:
+        if (host, port) not in _channels:
+            _channels[(host, port)] = CommandChannel(host, port)
+        return _channels[(host, port)]
+
+
+def close_channel(host: str, port: int) -> None:
+    """
+    Close the shared command channel for a host and port and remove it from the cache.
+
+    Args:
+        host (str): The host of the command handler.
+        port (int): The port of the command handler.
+    """
+    with _channels_lock:
+        channel = _channels.pop((host, port), None)
+    if channel is not None:
+        channel.close()
@@ -1,8 +1,8 @@
 import asyncio
-from json import dumps, loads
-from socket import socket, AF_INET, SOCK_STREAM
 from threading import Thread
 
+from utils.command_channel import get_channel
+
 
 def start_fetching(self) -> None:
     """
@@ -23,31 +23,27 @@ def start_fetching(self) -> None:
     self.post_main_widget()
 
 
-def send_message(self, message_to_send: dict) -> str | None:
+def send_message(self, message_to_send: dict) -> dict | None:
     """
     Send a command to the rasberry pi, which controls the camera.
+    The command is sent over a persistent, length-framed channel that is shared by all callers.
 
     Args:
         self: The main window object.
         message_to_send (dict): The message to send.
 
     Returns:
-        str | None: The response from the server, or None if an error occurred.
+        dict | None: The response from the server, or None if an error occurred.
     """
-    print("Send message")
     try:
-        with socket(AF_INET, SOCK_STREAM) as s:
-            try:
-                s.connect((self.tcp_host, self.tcp_port))
-            except:
-                s.connect((self.main_window.tcp_host, self.main_window.tcp_port))
-            s.sendall(dumps(message_to_send).encode("utf-8"))
-            response_data = s.recv(1024)
-            response = loads(response_data.decode("utf-8"))
-            return response
+        try:
+            host, port = self.tcp_host, self.tcp_port
+        except AttributeError:
+            host, port = self.main_window.tcp_host, self.main_window.tcp_port
+        return get_channel(host, port).request(message_to_send)
     except ConnectionRefusedError:
         print("Connection refused. Please check if the server is running.")
         self.main_window.show_warning("Connection refused. Please check if the server is running.")
     except Exception as e:
         print(e)
-        self.main_window.show_warning(f"An error occurred: {e}")
\ No newline at end of file
+        self.main_window.show_warning(f"An error occurred: {e}")
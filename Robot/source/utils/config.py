@@ -1,23 +1,290 @@
-from json import load, dumps
+import os
+import threading
+from json import JSONDecodeError, dumps, load
+from typing import Any, Callable, NamedTuple
+
+
+class Setting(NamedTuple):
+    """Type, default and allowed range of a configuration value."""
+    type: type
+    default: Any
+    minimum: float | None = None
+    maximum: float | None = None
+    # Values out of range are clamped to the range if True, otherwise replaced by the default
+    clamp: bool = False
+
+
+SCHEMA: dict[str, dict[str, Setting]] = {
+    "ui": {
+        "dark_mode": Setting(bool, True),
+    },
+    "robot": {
+        "com_port": Setting(str, "COM6"),
+        "speed": Setting(int, 500, 100, 2000, clamp=True),
+    },
+    "tcp": {
+        "host": Setting(str, "localhost"),
+        "port": Setting(int, 65432, 0, 65535),
+    },
+    "stream": {
+        "host": Setting(str, "localhost"),
+        "port": Setting(int, 9999, 0, 65535),
+    },
+    "db": {
+        "host": Setting(str, "localhost"),
+        "port": Setting(int, 12345, 0, 65535),
+    },
+    "sorting": {
+        "price_aware": Setting(bool, False),
+        "deadline_hours": Setting(float, 12, 0, 168, clamp=True),
+    },
+}
+
+
+def validate_value(setting: Setting, value: Any) -> tuple[Any, str | None]:
+    """
+    Checks a value against its setting.
+
+    Args:
+        setting: Type and range of the value
+        value: The value to check
+
+    Returns:
+        tuple: The valid value and the problem that was fixed, None if there was none
+    """
+    # bool is a subclass of int, but True is no valid port
+    if isinstance(value, bool) and setting.type is not bool:
+        return setting.default, f"{value!r} is not a {setting.type.__name__}"
+    if setting.type is float and isinstance(value, int):
+        pass
+    elif not isinstance(value, setting.type):
+        return setting.default, f"{value!r} is not a {setting.type.__name__}"
+    if setting.minimum is not None and value < setting.minimum:
+        return (setting.minimum if setting.clamp else setting.default), f"{value!r} is below {setting.minimum}"
+    if setting.maximum is not None and value > setting.maximum:
+        return (setting.maximum if setting.clamp else setting.default), f"{value!r} is above {setting.maximum}"
+    return value, None
+
+
+def validate(config: dict[str, Any]) -> tuple[dict[str, dict[str, Any]], list[str]]:
+    """
+    Validates a configuration against SCHEMA.
+
+    Missing and invalid values are replaced by their defaults, values out of range are clamped
+    or replaced by their defaults. Sections and keys that are not in the schema are kept as they are.
+
+    Args:
+        config: The configuration to validate, it is not modified
+
+    Returns:
+        tuple: The valid configuration and a description of every fixed problem
+    """
+    problems = []
+    validated = {}
+    for name, section in config.items():
+        if isinstance(section, dict):
+            validated[name] = dict(section)
+        elif name in SCHEMA:
+            problems.append(f"{name}: {section!r} is not a section")
+        else:
+            validated[name] = section
+    for name, settings in SCHEMA.items():
+        section = validated.setdefault(name, {})
+        for key, setting in settings.items():
+            if key not in section:
+                section[key] = setting.default
+                continue
+            section[key], problem = validate_value(setting, section[key])
+            if problem:
+                problems.append(f"{name}.{key}: {problem}")
+    return validated, problems
+
+
+class ConfigService:
+    """
+    Keeps the configuration file in memory.
+
+    The file is read and validated once, reads are served from memory and updates are
+    validated, written atomically and then announced to the subscribers of the changed
+    sections. Every update swaps in a new configuration, so a configuration returned by
+    get never changes and must not be modified.
+    """
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Path of the JSON configuration file
+        """
+        self.path = path
+        self._config: dict[str, dict[str, Any]] = {}
+        self._file_state = None
+        self._subscribers: dict[str, list[Callable[[dict[str, Any], dict[str, Any]], None]]] = {}
+        self._lock = threading.RLock()
+        self._watch_thread = None
+        self._watch_stop = threading.Event()
+        self._config = self._load()
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self) -> dict[str, dict[str, Any]]:
+        """Reads and validates the file, the current configuration is kept if it cannot be read."""
+        state = self._stat()
+        try:
+            with open(self.path, "r") as config_file:
+                config = load(config_file)
+        except (OSError, JSONDecodeError) as e:
+            print(f"Could not read {self.path}: {e}")
+            config = self._config
+        if not isinstance(config, dict):
+            print(f"Could not read {self.path}: not a JSON object")
+            config = self._config
+        self._file_state = state
+        validated, problems = validate(config)
+        for problem in problems:
+            print(f"Invalid value in {self.path}, {problem}")
+        return validated
+
+    def _write(self, config: dict[str, Any]) -> None:
+        """Writes the configuration to a temporary file and renames it over the file."""
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as config_file:
+            config_file.write(dumps(config, indent=4))
+            config_file.flush()
+            os.fsync(config_file.fileno())
+        os.replace(temp_path, self.path)
+        self._file_state = self._stat()
+
+    def get(self) -> dict[str, dict[str, Any]]:
+        """Returns the current configuration."""
+        return self._config
+
+    def section(self, name: str) -> dict[str, Any]:
+        """Returns a section of the current configuration, empty if there is none."""
+        return self._config.get(name, {})
+
+    def update(self, changes: dict[str, dict[str, Any]]) -> dict[str, dict[str, Any]]:
+        """
+        Validates and saves changed values.
+
+        Args:
+            changes: New values by section and key
+
+        Returns:
+            dict: The new configuration
+        """
+        with self._lock:
+            old = self._config
+            config = {name: dict(section) if isinstance(section, dict) else section for name, section in old.items()}
+            for name, values in changes.items():
+                config.setdefault(name, {}).update(values)
+            config, problems = validate(config)
+            for problem in problems:
+                print(f"Invalid value for {self.path}, {problem}")
+            if config == old:
+                return old
+            self._write(config)
+            self._config = config
+        self._notify(old, config)
+        return config
+
+    def reload(self) -> bool:
+        """
+        Reads the file again if it was changed by another program.
+
+        Returns:
+            bool: True if the configuration changed
+        """
+        with self._lock:
+            if self._stat() == self._file_state:
+                return False
+            old = self._config
+            config = self._load()
+            if config == old:
+                return False
+            self._config = config
+        self._notify(old, config)
+        return True
+
+    def subscribe(self, section: str, callback: Callable[[dict[str, Any], dict[str, Any]], None]) -> None:
+        """
+        Calls callback(old, new) with the old and new section whenever the section changes.
+
+        Callbacks run on the thread that changed the configuration, the watch thread for
+        changes made by other programs.
+        """
+        with self._lock:
+            self._subscribers.setdefault(section, []).append(callback)
+
+    def unsubscribe(self, section: str, callback: Callable[[dict[str, Any], dict[str, Any]], None]) -> None:
+        with self._lock:
+            if callback in self._subscribers.get(section, []):
+                self._subscribers[section].remove(callback)
+
+    def _notify(self, old: dict[str, Any], new: dict[str, Any]) -> None:
+        with self._lock:
+            subscribers = {section: list(callbacks) for section, callbacks in self._subscribers.items()}
+        for section, callbacks in subscribers.items():
+            if old.get(section) == new.get(section):
+                continue
+            for callback in callbacks:
+                try:
+                    callback(old.get(section, {}), new.get(section, {}))
+                except Exception as e:
+                    print(f"Config subscriber for {section} failed: {e!r}")
+
+    def start_watching(self, interval: float = 2.0) -> None:
+        """Checks the file for changes by other programs every interval seconds on a background thread."""
+        if self._watch_thread is not None:
+            return
+        self._watch_stop.clear()
+
+        def watch():
+            while not self._watch_stop.wait(interval):
+                self.reload()
+
+        self._watch_thread = threading.Thread(target=watch, name="ConfigWatch", daemon=True)
+        self._watch_thread.start()
+
+    def stop_watching(self) -> None:
+        if self._watch_thread is not None:
+            self._watch_stop.set()
+            self._watch_thread.join()
+            self._watch_thread = None
+
+
+_services: dict[str, ConfigService] = {}
+_services_lock = threading.Lock()
+
+
+def get_config_service(path: str) -> ConfigService:
+    """Returns the configuration service of a file, it is created on first use."""
+    key = os.path.abspath(path)
+    service = _services.get(key)
+    if service is None:
+        with _services_lock:
+            service = _services.get(key)
+            if service is None:
+                service = _services[key] = ConfigService(path)
+    return service
 
 
 def read_config(self) -> dict:
     """
-    Reads the configuration file and returns the configuration as a dictionary.
+    Returns the configuration. It is read from the file once and then served from memory.
 
     Args:
         self: The main window object.
 
     Returns:
-        dict: The configuration dictionary.
+        dict: The configuration dictionary, it must not be modified.
     """
-    with open(self.config_path, "r") as config_file:
-        config = load(config_file)
-    return config
+    return get_config_service(self.config_path).get()
 
 
-# FIXME: Hier muss ich wahrscheinlich noch die Verbindungen neu aufbauen, wenn ich den Host und den Port ändere
-    # Alternativ kann ich auch die Verbindung nur über die Toggle neu aufbauen
 def save_config(
         self,
         dark_mode: bool = None,
@@ -31,7 +298,8 @@ def save_config(
         db_port: int = None
     ) -> None:
     """
-    Toggle the dark mode style sheet for the main window.
+    Saves the given settings. Invalid values are replaced as described in SCHEMA and the
+    subscribers of the changed sections are notified, so connections can be rebuilt.
 
     Args:
         self: The main window object.
@@ -45,34 +313,19 @@ def save_config(
         db_host (str, optional): The IP address for the database connection. Defaults to None.
         db_port (int, optional): The port number for the database connection. Defaults to None.
     """
-    with open(self.config_path, "r") as config_file:
-        config = load(config_file)
-    if dark_mode is not None:
-        config["ui"]["dark_mode"] = dark_mode
-    if com_port is not None:
-        config["robot"]["com_port"] = com_port
-    if speed is not None:
-        if speed > 2000:
-            speed = 2000
-        elif speed < 100:
-            speed = 100
-        config["robot"]["speed"] = speed
-    if tcp_host is not None:
-        config["tcp"]["host"] = tcp_host
-    if tcp_port is not None:
-        if tcp_port < 0 or tcp_port > 65535:
-            tcp_port = 65432
-        config["tcp"]["port"] = tcp_port
-    if stream_host is not None:
-        config["stream"]["host"] = stream_host
-    if stream_port is not None:
-        if stream_port < 0 or stream_port > 65535:
-            stream_port = 9999
-    if db_host is not None:
-        config["db"]["host"] = db_host
-    if db_port is not None:
-        if db_port < 0 or db_port > 65535:
-            db_port = 12345
-        config["stream"]["port"] = stream_port
-    with open(self.config_path, "w") as config_file:
-        config_file.write(dumps(config, indent=4))
\ No newline at end of file
+    values = {
+        ("ui", "dark_mode"): dark_mode,
+        ("robot", "com_port"): com_port,
+        ("robot", "speed"): speed,
+        ("tcp", "host"): tcp_host,
+        ("tcp", "port"): tcp_port,
+        ("stream", "host"): stream_host,
+        ("stream", "port"): stream_port,
+        ("db", "host"): db_host,
+        ("db", "port"): db_port,
+    }
+    changes = {}
+    for (section, key), value in values.items():
+        if value is not None:
+            changes.setdefault(section, {})[key] = value
+    get_config_service(self.config_path).update(changes)
@@ -0,0 +1,218 @@
+import asyncio
+import random
+import threading
+from time import perf_counter, time
+
+from utils.framed_client import FramedClient
+
+
+class ConnectionPool:
+    """Small pool of authenticated database connections.
+
+    The pool runs on its own event loop thread, so the Qt loop, the sorting worker
+    and the energy fetcher can all share it no matter which loop they run on. Every
+    slot keeps its connection alive: dropped connections are reopened with
+    exponential backoff and idle ones are pinged so dead peers are noticed early.
+    """
+
+    def __init__(self, host, port, password, size=2, keepalive_interval=30.0, min_backoff=0.5, max_backoff=30.0, on_connect=None):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.size = size
+        self.keepalive_interval = keepalive_interval
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.on_connect = on_connect
+        self.latency = None
+        self.last_error = None
+        self.reconnects = 0
+        # Traffic of connections that are already closed
+        self._closed_bytes_sent = 0
+        self._closed_bytes_received = 0
+        self.loop = None
+        self._clients = [None] * size
+        self._last_used = [0.0] * size
+        self._in_flight = [0] * size
+        self._tasks = []
+        self._available = None
+        self._thread = None
+        self._closed = False
+
+    def _run_loop(self, ready):
+        """Runs the pool's event loop on the background thread."""
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._available = asyncio.Event()
+        ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    async def _on_loop(self, coroutine):
+        """Runs a coroutine on the pool loop and awaits it from the caller's loop."""
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            return await coroutine
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coroutine, self.loop))
+
+    async def start(self, timeout=5.0):
+        """Starts the pool and waits until the first connection is up.
+
+        Returns:
+            True if at least one connection was established within the timeout.
+        """
+        if self._thread is None:
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run_loop, args=(ready,), name="DatabasePool", daemon=True)
+            self._thread.start()
+            ready.wait()
+        return await self._on_loop(self._start(timeout))
+
+    async def _start(self, timeout):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._maintain(slot)) for slot in range(self.size)]
+        try:
+            await asyncio.wait_for(self._available.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _maintain(self, slot):
+        """Keeps one slot connected, reconnecting with backoff and pinging when idle."""
+        backoff = self.min_backoff
+        while not self._closed:
+            client = FramedClient(self.host, self.port, self.password)
+            if not await client.connect():
+                self.last_error = f"Could not connect to {self.host}:{self.port}"
+                # Jitter keeps the slots from reconnecting in lock-step
+                await asyncio.sleep(backoff * random.uniform(0.8, 1.2))
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+            backoff = self.min_backoff
+            self._clients[slot] = client
+            self._last_used[slot] = time()
+            self._available.set()
+            if self.on_connect:
+                asyncio.create_task(self._notify_connect())
+            try:
+                while client.connected and not self._closed:
+                    if await client.wait_disconnected(self.keepalive_interval):
+                        break
+                    if time() - self._last_used[slot] >= self.keepalive_interval:
+                        await self._ping(slot, client)
+            except Exception as e:
+                self.last_error = str(e)
+            finally:
+                self._clients[slot] = None
+                self._closed_bytes_sent += client.bytes_sent
+                self._closed_bytes_received += client.bytes_received
+                await client.close()
+                if not any(self._clients):
+                    self._available.clear()
+            if not self._closed:
+                self.reconnects += 1
+
+    async def _notify_connect(self):
+        """Calls the on_connect callback, e.g. to replay spooled data."""
+        try:
+            result = self.on_connect()
+            if asyncio.iscoroutine(result):
+                await result
+        except Exception as e:
+            self.last_error = str(e)
+
+    async def _ping(self, slot, client):
+        """Sends a keepalive message and records its round trip time."""
+        start = perf_counter()
+        await client.request({"type": "message", "content": "ping"}, timeout=self.keepalive_interval)
+        self._record_latency(perf_counter() - start)
+        self._last_used[slot] = time()
+
+    def _record_latency(self, seconds):
+        """Updates the exponentially weighted round trip time."""
+        self.latency = seconds if self.latency is None else 0.8 * self.latency + 0.2 * seconds
+
+    async def request(self, message, timeout=10.0):
+        """Sends a message on the least busy healthy connection.
+
+        Waits up to timeout for a connection if none is currently up.
+
+        Returns:
+            The decoded response.
+        """
+        return await self._on_loop(self._request(message, timeout))
+
+    def _pick_slot(self):
+        """Returns the least busy healthy slot."""
+        healthy = [slot for slot, client in enumerate(self._clients) if client and client.connected]
+        if not healthy:
+            raise ConnectionError("No database connection available.")
+        return min(healthy, key=lambda s: self._in_flight[s])
+
+    async def _request(self, message, timeout, slot=None):
+        """Sends a message on the given slot, or on the least busy one if it is None or down."""
+        if self._closed:
+            raise ConnectionError("Connection pool is closed.")
+        await asyncio.wait_for(self._available.wait(), timeout)
+        if slot is None or not (self._clients[slot] and self._clients[slot].connected):
+            slot = self._pick_slot()
+        client = self._clients[slot]
+        self._in_flight[slot] += 1
+        self._last_used[slot] = time()
+        start = perf_counter()
+        try:
+            response = await client.request(message, timeout)
+        except Exception as e:
+            self.last_error = str(e)
+            raise
+        finally:
+            self._in_flight[slot] -= 1
+        self._record_latency(perf_counter() - start)
+        return response
+
+    @property
+    def bytes_sent(self):
+        """Returns the number of bytes sent on all connections since the pool was created."""
+        return self._closed_bytes_sent + sum(client.bytes_sent for client in self._clients if client)
+
+    @property
+    def bytes_received(self):
+        """Returns the number of bytes received on all connections since the pool was created."""
+        return self._closed_bytes_received + sum(client.bytes_received for client in self._clients if client)
+
+    @property
+    def healthy(self):
+        """Returns True if at least one connection is up."""
+        return any(client and client.connected for client in self._clients)
+
+    def get_health(self):
+        """Returns connection count, round trip time and error information."""
+        return {
+            "connections": sum(1 for client in self._clients if client and client.connected),
+            "size": self.size,
+            "latency_ms": self.latency * 1000 if self.latency is not None else None,
+            "in_flight": sum(self._in_flight),
+            "reconnects": self.reconnects,
+            "last_error": self.last_error,
+        }
+
+    async def close(self):
+        """Closes all connections and stops the pool thread."""
+        if self._thread is None:
+            return
+        self._closed = True
+        await self._on_loop(self._close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    async def _close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
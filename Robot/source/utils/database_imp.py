@@ -1,127 +1,275 @@
 import json
 import asyncio
+import os
+import threading
 import uuid
+from concurrent.futures import Future
+from time import time
 
-from utils.config import read_config
+from utils.config import get_config_service, read_config
+from utils.bulk_ingest import BulkIngestClient
 
 class DatabaseImp:
-    def __init__(self, main_window, password="1234"):
+    def __init__(self, main_window, password="1234", spool_path="utils/robotdata_spool.ndjson", batch_size=20, flush_interval=5.0, pool_size=2, ingest_batch_size=25, max_in_flight=4):
         self.main_window = main_window
         self.password = password
-        self.reader = None
-        self.writer = None
-        self.connected = False
-        self.authenticated = False
+        self.pool = None
+        self.pool_size = pool_size
+        self.ingest_batch_size = ingest_batch_size
+        self.max_in_flight = max_in_flight
+        self.spool_path = spool_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.last_flush_latency = None
+        self.last_flush_size = 0
+        self._spool = []
+        self._spool_lock = threading.Lock()
+        self._flushing = None
+        self._flush_task = None
+        self._load_spool()
+        get_config_service(main_window.config_path).subscribe("db", self._on_db_config_changed)
+
+    def _create_pool(self, db_config):
+        return BulkIngestClient(
+            db_config["host"],
+            db_config["port"],
+            self.password,
+            size=self.pool_size,
+            batch_size=self.ingest_batch_size,
+            max_in_flight=self.max_in_flight,
+            on_connect=self.flush
+        )
+
+    def _on_db_config_changed(self, old, new):
+        """Moves a running pool to the new database server once its host or port changed."""
+        if self.pool is None or (old.get("host"), old.get("port")) == (new["host"], new["port"]):
+            return
+        old_pool, self.pool = self.pool, self._create_pool(new)
+        # Closing joins the old pool's thread, so neither pool loop can do it
+        threading.Thread(
+            target=asyncio.run, args=(self._replace_pool(old_pool, self.pool),), name="DatabaseReconnect", daemon=True
+        ).start()
+
+    async def _replace_pool(self, old_pool, new_pool):
+        await old_pool.close()
+        await new_pool.start()
 
     async def connect(self):
-        """Establishes an async TCP connection to the database server."""
-        config = read_config(self.main_window)
-        db_ip = config["db"]["host"]
-        db_port = config["db"]["port"]
-        try:
-            self.reader, self.writer = await asyncio.open_connection(db_ip, db_port)
-            self.connected = True
-            if await self._authenticate():
-                return True
-            else:
-                await self.disconnect()
-                return False
-        except Exception as e:
-            self.reader = None
-            self.writer = None
-            self.connected = False
-            return False
-
-    async def _authenticate(self):
-        """Handles password authentication with the server."""
-        if not self.connected or not self.writer:
-            return False
-        try:
-            prompt_data = await self.reader.read(1024)
-            prompt = prompt_data.decode("utf-8")
-            self.writer.write(self.password.encode("utf-8"))
-            await self.writer.drain()
-            response_data = await self.reader.read(1024)
-            response = response_data.decode("utf-8")
-            if "Access granted" in response:
-                self.authenticated = True
-                return True
-            else:
-                self.authenticated = False
-                return False
-        except Exception as e:
-            return False
+        """Starts the shared connection pool to the database server.
+
+        Connections are authenticated once and kept alive, dropped connections are
+        reopened in the background. Calling this again while the pool is running
+        only waits for it to be healthy.
+        """
+        if self.pool is None:
+            self.pool = self._create_pool(read_config(self.main_window)["db"])
+        return await self.pool.start()
 
     async def disconnect(self):
-        """Closes the database connection."""
-        if self.writer:
+        """Closes all database connections."""
+        if self.pool:
             try:
-                self.writer.close()
-                await self.writer.wait_closed()
+                await self.pool.close()
             finally:
-                self.reader = None
-                self.writer = None
-                self.connected = False
-                self.authenticated = False
+                self.pool = None
+
+    @property
+    def connected(self):
+        """Returns True if at least one database connection is up."""
+        return self.pool is not None and self.pool.healthy
 
     def _is_connected(self):
         """Returns True if connected and authenticated to the database."""
-        return self.connected and self.authenticated and self.writer is not None
+        return self.connected
+
+    def get_health(self):
+        """Returns the health and round trip time of the database connections."""
+        if self.pool is None:
+            return {"connections": 0, "size": self.pool_size, "latency_ms": None, "in_flight": 0, "reconnects": 0, "last_error": None}
+        return self.pool.get_health()
 
     def generate_uuid(self):
         """Generates a UUID for the database."""
         return str(uuid.uuid4())
 
-    async def receive_response(self):
-        """Receives and parses JSON response from server."""
-        if not self.reader:
-            return None
-        try:
-            response_data = await self.reader.read(4096)
-            response_str = response_data.decode("utf-8").strip()
-            if response_str:
-                return json.loads(response_str)
-            return None
-        except json.JSONDecodeError as e:
-            return None
-        except Exception as e:
-            return None
-
     async def send_json(self, data):
-        """Sends a Python dictionary as a JSON string to the server."""
-        if not self.connected or not self.writer:
+        """Sends a Python dictionary as a JSON message and returns the matching response.
+
+        Several calls may be in flight at once, responses are matched by request ID.
+        """
+        if self.pool is None:
             return None
         try:
-            json_data = json.dumps(data)
-            self.writer.write(json_data.encode("utf-8"))
-            await self.writer.drain()
-            response = await self.receive_response()
-            return response
+            return await self.pool.request(data)
         except Exception as e:
             return None
 
+    def _robot_record(self, color, temperature, humidity, timestamp, energy_consume, energy_cost):
+        """Builds a single robotdata record."""
+        return {
+            "uuid": self.generate_uuid(),
+            "color": color,  # blue, red, green, yellow
+            "sensor_data": {
+                "temperature": temperature,  # float
+                "humidity": humidity
+            },
+            "timestamp": timestamp,  # 2025-03-10 15:30:00 format
+            "energy_consume": energy_consume,  # float
+            "energy_cost": energy_cost,  # float
+        }
+
     async def generate_robot_struct(self, color, temperature, humidity, timestamp, energy_consume, energy_cost):
         """Generates a structure for the database and sends it."""
         if not self._is_connected():
             return None
         struct = {
             "type": "robotdata",
-            "data": [
-                {
-                    "uuid": self.generate_uuid(),
-                    "color": color,  # blue, red, green, yellow
-                    "sensor_data": {
-                        "temperature": temperature,  # float
-                        "humidity": humidity
-                    },
-                    "timestamp": timestamp,  # 2025-03-10 15:30:00 format
-                    "energy_consume": energy_consume,  # float
-                    "energy_cost": energy_cost,  # float
-                }
-            ]
+            "data": [self._robot_record(color, temperature, humidity, timestamp, energy_consume, energy_cost)]
         }
         return await self.send_json(struct)
 
+    async def buffer_robot_struct(self, color, temperature, humidity, timestamp, energy_consume, energy_cost):
+        """Buffers a robotdata record and writes it to the spool file.
+
+        The buffer is flushed as one robotdata message once it holds batch_size records
+        or flush_interval seconds after the first record was buffered, whichever comes first.
+        Records stay in the spool until the server acknowledged them, so they survive an
+        outage or restart and are replayed in order on the next connect.
+        """
+        record = self._robot_record(color, temperature, humidity, timestamp, energy_consume, energy_cost)
+        with self._spool_lock:
+            queued_at = time()
+            self._spool.append((queued_at, record))
+            self._append_spool(queued_at, record)
+            depth = len(self._spool)
+        if depth >= self.batch_size:
+            return await self.flush()
+        # A timer left pending on the closed loop of an earlier sorting run never fires
+        if self._flush_task is None or self._flush_task.done() or self._flush_task.get_loop() is not asyncio.get_running_loop():
+            self._flush_task = asyncio.create_task(self._flush_later())
+        return None
+
+    async def _flush_later(self):
+        """Flushes the buffer once the flush interval has passed."""
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+    def cancel_flush_timer(self):
+        """Cancels the pending time-based flush, e.g. before the event loop it runs on is closed."""
+        if self._flush_task is not None and not self._flush_task.done() and not self._flush_task.get_loop().is_closed():
+            self._flush_task.cancel()
+        self._flush_task = None
+
+    async def flush(self):
+        """Sends all spooled robotdata records.
+
+        A spool that grew during an outage is sent as pipelined batches of
+        ingest_batch_size records on one connection, so it is replayed in order.
+        Exactly the records of acknowledged batches are dropped from the spool,
+        the others stay for the next flush. If a flush is already running, it is
+        waited for and the records buffered meanwhile are sent afterwards.
+
+        Returns:
+            The ingest report, or None if nothing was sent.
+        """
+        while True:
+            with self._spool_lock:
+                running = self._flushing
+                if running is None:
+                    if not self._spool:
+                        return None
+                    # A concurrent future, so flushes from other event loops can wait for it too
+                    self._flushing = Future()
+                    batch = [record for _, record in self._spool]
+                    break
+            await asyncio.wrap_future(running)
+        try:
+            if not self._is_connected():
+                return None
+            acked_batches = []
+            report = await self.pool.ingest(batch, acked_batches=acked_batches, ordered=True)
+            if acked_batches:
+                self.last_flush_latency = report["seconds"]
+                self.last_flush_size = report["rows_acked"]
+                size = self.pool.batch_size
+                acked = set()
+                for index in acked_batches:
+                    acked.update(range(index * size, min((index + 1) * size, len(batch))))
+                with self._spool_lock:
+                    # Records buffered during the flush follow the sent ones and are kept
+                    self._spool = [entry for i, entry in enumerate(self._spool) if i not in acked]
+                    self._rewrite_spool()
+            return report
+        finally:
+            with self._spool_lock:
+                done, self._flushing = self._flushing, None
+            done.set_result(None)
+
+    def get_buffer_stats(self):
+        """Returns the spool depth and flush metrics of the write-behind buffer."""
+        with self._spool_lock:
+            depth = len(self._spool)
+            oldest = self._spool[0][0] if self._spool else None
+        return {
+            "spool_depth": depth,
+            "oldest_record_age": time() - oldest if oldest is not None else None,
+            "last_flush_latency": self.last_flush_latency,
+            "last_flush_size": self.last_flush_size,
+        }
+
+    def _load_spool(self):
+        """Loads records that were not acknowledged before the last shutdown."""
+        if not os.path.exists(self.spool_path):
+            return
+        try:
+            with open(self.spool_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn last line from a crash while appending
+                        continue
+                    if isinstance(entry, dict) and "queued_at" in entry and "record" in entry:
+                        self._spool.append((entry["queued_at"], entry["record"]))
+                    else:
+                        # Spool written before the enqueue time was stored
+                        self._spool.append((time(), entry))
+        except OSError as e:
+            return
+
+    def _spool_line(self, queued_at, record):
+        """Returns the spool line of a record, keeping its enqueue time for oldest_record_age after a restart."""
+        return json.dumps({"queued_at": queued_at, "record": record}, separators=(",", ":")) + "\n"
+
+    def _append_spool(self, queued_at, record):
+        """Appends a record to the spool file. Must be called with the spool lock held."""
+        try:
+            with open(self.spool_path, "a", encoding="utf-8") as f:
+                f.write(self._spool_line(queued_at, record))
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            pass
+
+    def _rewrite_spool(self):
+        """Replaces the spool file with the records still pending. Must be called with the spool lock held."""
+        try:
+            if not self._spool:
+                open(self.spool_path, "w", encoding="utf-8").close()
+                return
+            temp_path = self.spool_path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                for queued_at, record in self._spool:
+                    f.write(self._spool_line(queued_at, record))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.spool_path)
+        except OSError as e:
+            pass
+
     async def generate_energydata_struct(self, energy_data_list):
         """Generates a structure for the database and sends it.
 
@@ -0,0 +1,139 @@
+from struct import Struct
+
+import numpy as np
+
+
+# Name under which the binary layout is negotiated on the command channel
+BINARY_ENCODING: str = "binary/v1"
+
+COLOR_NAMES: tuple[str, ...] = ("unknown", "red", "green", "blue", "yellow")
+BGR_COLORS: dict[str, str] = {
+    "0,0,255": "red",
+    "0,255,0": "green",
+    "255,0,0": "blue",
+    "0,255,255": "yellow",
+}
+_COLOR_CODES: dict[str, int] = {name: code for code, name in enumerate(COLOR_NAMES)}
+
+# One detected object: tracking ID (0 if untracked), color enum, confidence in 1/255 steps and robot coordinates
+OBJECT_DTYPE = np.dtype([("id", "<u4"), ("color", "u1"), ("confidence", "u1"), ("x", "<f4"), ("y", "<f4")])
+_DELTA_COUNTS = Struct("<III")
+_SENSOR = Struct("<fff")
+_SENSOR_FIELDS: tuple[str, ...] = ("temperature", "humidity", "fan_speed")
+
+
+def encode_objects(objects: list[dict]) -> bytes:
+    """
+    Pack detected objects into a NumPy structured array.
+
+    Args:
+        objects (list[dict]): Objects with "bgr" or "color", "robot_pos" and optionally "id" and "confidence".
+
+    Returns:
+        bytes: The packed objects.
+    """
+    array = np.empty(len(objects), dtype=OBJECT_DTYPE)
+    array["id"] = [obj.get("id", 0) for obj in objects]
+    array["color"] = [_COLOR_CODES.get(obj.get("color") or BGR_COLORS.get(obj.get("bgr")), 0) for obj in objects]
+    array["confidence"] = [round(obj.get("confidence", 1.0) * 255) for obj in objects]
+    array["x"] = [obj["robot_pos"]["x"] for obj in objects]
+    array["y"] = [obj["robot_pos"]["y"] for obj in objects]
+    return array.tobytes()
+
+
+def decode_objects(body: bytes | memoryview) -> np.ndarray:
+    """
+    Unpack objects packed by encode_objects without copying them.
+
+    Args:
+        body (bytes | memoryview): The packed objects.
+
+    Returns:
+        np.ndarray: A read-only structured array with the fields of OBJECT_DTYPE.
+    """
+    return np.frombuffer(body, dtype=OBJECT_DTYPE)
+
+
+def objects_to_dicts(array: np.ndarray) -> list[dict]:
+    """
+    Convert unpacked objects to the dicts used by the JSON encoding.
+
+    Args:
+        array (np.ndarray): Objects as returned by decode_objects.
+
+    Returns:
+        list[dict]: Objects with "id", "color", "confidence" and "robot_pos".
+    """
+    return [
+        {
+            "id": object_id,
+            "color": COLOR_NAMES[color],
+            "confidence": round(confidence / 255, 3),
+            "robot_pos": {"x": x, "y": y},
+        }
+        for object_id, color, confidence, x, y in array.tolist()
+    ]
+
+
+def encode_message(message: dict) -> tuple[dict, bytes | None]:
+    """
+    Split a message into a JSON header and a binary body, if it has a binary layout.
+
+    Color responses, detection deltas and sensor responses have one. The header
+    names the layout in "body" and keeps all other fields, e.g. the request_id.
+
+    Args:
+        message (dict): The message to encode.
+
+    Returns:
+        tuple[dict, bytes | None]: The header and the body, or the message itself and None.
+    """
+    if isinstance(message.get("objects"), list):
+        header = {key: value for key, value in message.items() if key != "objects"}
+        header["body"] = "objects"
+        return header, encode_objects(message["objects"])
+    if message.get("type") == "detections":
+        header = {key: value for key, value in message.items() if key not in ("added", "moved", "removed")}
+        header["body"] = "delta"
+        added, moved, removed = message["added"], message["moved"], message["removed"]
+        body = (
+            _DELTA_COUNTS.pack(len(added), len(moved), len(removed))
+            + encode_objects(added + moved)
+            + np.asarray(removed, dtype="<u4").tobytes()
+        )
+        return header, body
+    if all(isinstance(message.get(field), (int, float)) for field in _SENSOR_FIELDS):
+        header = {key: value for key, value in message.items() if key not in _SENSOR_FIELDS}
+        header["body"] = "sensor"
+        return header, _SENSOR.pack(*(message[field] for field in _SENSOR_FIELDS))
+    return message, None
+
+
+def decode_message(header: dict, body: bytes) -> dict:
+    """
+    Rebuild a message encoded by encode_message.
+
+    Args:
+        header (dict): The JSON header.
+        body (bytes): The binary body.
+
+    Returns:
+        dict: The message as it would have been sent as JSON, except that objects carry a color name instead of "bgr".
+    """
+    message = dict(header)
+    layout = message.pop("body", None)
+    view = memoryview(body)
+    if layout == "objects":
+        message["objects"] = objects_to_dicts(decode_objects(view))
+    elif layout == "delta":
+        added, moved, removed = _DELTA_COUNTS.unpack_from(view)
+        objects_end = _DELTA_COUNTS.size + (added + moved) * OBJECT_DTYPE.itemsize
+        objects = objects_to_dicts(decode_objects(view[_DELTA_COUNTS.size:objects_end]))
+        message["added"] = objects[:added]
+        message["moved"] = objects[added:]
+        message["removed"] = np.frombuffer(view[objects_end:], dtype="<u4", count=removed).tolist()
+    elif layout == "sensor":
+        message.update(zip(_SENSOR_FIELDS, _SENSOR.unpack_from(view)))
+    else:
+        raise ValueError(f"Unknown binary body: {layout}")
+    return message
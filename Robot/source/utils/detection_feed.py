@@ -0,0 +1,132 @@
+from random import uniform
+from threading import Condition, Event, Thread
+from time import monotonic
+from typing import Callable, TypeVar
+
+from utils.command_channel import CommandChannel
+
+
+T = TypeVar("T")
+
+
+class DetectionFeed:
+    def __init__(self, host: str, port: int, min_backoff: float = 0.5, max_backoff: float = 10.0) -> None:
+        """
+        Initialize a live view of the objects detected by the pi.
+
+        The feed subscribes once and then applies the detection deltas pushed by the
+        command handler, so the current objects are known without asking for them.
+        A lost connection is reopened with exponential backoff and starts over with
+        a fresh snapshot.
+
+        Args:
+            host (str): The host of the command handler.
+            port (int): The port of the command handler.
+            min_backoff (float, optional): Seconds to wait before the first resubscribe attempt. Default is 0.5.
+            max_backoff (float, optional): Upper limit for the resubscribe delay. Default is 10.0.
+        """
+        self.host: str = host
+        self.port: int = port
+        self.min_backoff: float = min_backoff
+        self.max_backoff: float = max_backoff
+        self.objects: dict[int, dict] = {}
+        self.seq: int = 0
+        self.live: bool = False
+        self.last_error: str | None = None
+        self._changed = Condition()
+        self._disconnected = Event()
+        self._stopped = Event()
+        self._channel = CommandChannel(host, port, on_push=self._apply, on_disconnect=self._lost)
+        self._thread: Thread | None = None
+
+    def start(self, timeout: float = 1.0) -> bool:
+        """
+        Start the subscription and wait for the first snapshot.
+
+        Args:
+            timeout (float, optional): Seconds to wait for the snapshot. Default is 1.0.
+
+        Returns:
+            bool: True if the feed is live.
+        """
+        if self._thread is None:
+            self._thread = Thread(target=self._run, name="DetectionFeed", daemon=True)
+            self._thread.start()
+        with self._changed:
+            self._changed.wait_for(lambda: self.live, timeout)
+            return self.live
+
+    def _run(self) -> None:
+        """Subscribe and resubscribe after every lost connection until the feed is stopped."""
+        backoff = self.min_backoff
+        while not self._stopped.is_set():
+            self._disconnected.clear()
+            try:
+                response = self._channel.request({"type": "subscribe"})
+                if response.get("status") != "success":
+                    raise ConnectionError(response.get("message"))
+                backoff = self.min_backoff
+                self._disconnected.wait()
+            except Exception as e:
+                self.last_error = str(e)
+                self._stopped.wait(backoff * uniform(0.8, 1.2))
+                backoff = min(backoff * 2, self.max_backoff)
+
+    def _apply(self, message: dict) -> None:
+        """
+        Apply a snapshot or delta pushed by the command handler.
+
+        Args:
+            message (dict): The pushed message.
+        """
+        if message.get("type") != "detections":
+            return
+        with self._changed:
+            if message.get("snapshot"):
+                self.objects = {}
+                self.live = True
+            for obj in message.get("added", []) + message.get("moved", []):
+                self.objects[obj["id"]] = obj
+            for object_id in message.get("removed", []):
+                self.objects.pop(object_id, None)
+            self.seq = message.get("seq", self.seq)
+            self._changed.notify_all()
+
+    def _lost(self) -> None:
+        """Mark the feed as stale once its connection is gone."""
+        with self._changed:
+            self.live = False
+            self._changed.notify_all()
+        self._disconnected.set()
+
+    def wait_for(self, select: Callable[[list[dict]], T | None], timeout: float = 0) -> T | None:
+        """
+        Wait until select finds something in the current objects.
+
+        select is called with the objects ordered by their tracking ID, i.e. oldest first,
+        and again whenever a delta arrives, so new objects are seen within one frame.
+
+        Args:
+            select (Callable[[list[dict]], T | None]): Returns a result, or None to keep waiting.
+            timeout (float, optional): Seconds to wait. Default is 0, which checks only once.
+
+        Returns:
+            T | None: The result of select, or None if nothing was found in time or the feed is not live.
+        """
+        deadline = monotonic() + timeout
+        with self._changed:
+            while self.live:
+                result = select([self.objects[key] for key in sorted(self.objects)])
+                if result is not None:
+                    return result
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    return None
+                self._changed.wait(remaining)
+        return None
+
+    def stop(self) -> None:
+        """Stop resubscribing and close the connection."""
+        self._stopped.set()
+        self._channel.close()
+        self._disconnected.set()
@@ -2,22 +2,98 @@ import asyncio
 import aiohttp
 import json
 import os
+import threading
+import time
+from bisect import bisect_right
 from datetime import datetime, timedelta
-from utils.database_imp import DatabaseImp
+
+import numpy as np
+
+
+class EnergyPriceIndex:
+    """Read-only lookup table of market prices, sorted by the start of their interval [start, end)."""
+    def __init__(self, starts, ends, prices):
+        """
+        Args:
+            starts: Interval starts in milliseconds
+            ends: Interval ends in milliseconds
+            prices: Market price of each interval
+        """
+        starts = np.asarray(starts, dtype=np.int64)
+        order = np.argsort(starts, kind="stable")
+        self.starts = starts[order]
+        self.ends = np.asarray(ends, dtype=np.int64)[order]
+        self.prices = np.asarray(prices, dtype=np.float64)[order]
+        for array in (self.starts, self.ends, self.prices):
+            array.flags.writeable = False
+        # Lists are faster than NumPy arrays for single lookups
+        self._start_list = self.starts.tolist()
+        self._end_list = self.ends.tolist()
+        self._price_list = self.prices.tolist()
+
+    @classmethod
+    def from_entries(cls, entries):
+        """Builds the index from the 'data' entries of an aWATTar API response."""
+        return cls(
+            [entry['start_timestamp'] for entry in entries],
+            [entry['end_timestamp'] for entry in entries],
+            [entry['marketprice'] for entry in entries],
+        )
+
+    def __len__(self):
+        return len(self.starts)
+
+    def merged(self, newer):
+        """Returns a new index with the intervals of both, where newer wins for intervals with the same start."""
+        starts = np.concatenate([newer.starts, self.starts])
+        _, first = np.unique(starts, return_index=True)
+        return EnergyPriceIndex(
+            starts[first],
+            np.concatenate([newer.ends, self.ends])[first],
+            np.concatenate([newer.prices, self.prices])[first],
+        )
+
+    def price_at(self, timestamp_ms):
+        """Returns the price of the interval containing the timestamp in milliseconds, None if there is none."""
+        i = bisect_right(self._start_list, timestamp_ms) - 1
+        if i < 0 or timestamp_ms >= self._end_list[i]:
+            return None
+        return self._price_list[i]
+
+    def prices_at(self, timestamps_ms):
+        """Looks up the prices of many timestamps in milliseconds at once, NaN where no interval contains them."""
+        timestamps_ms = np.asarray(timestamps_ms, dtype=np.int64)
+        if len(self.starts) == 0:
+            return np.full(timestamps_ms.shape, np.nan)
+        i = np.searchsorted(self.starts, timestamps_ms, side="right") - 1
+        clipped = np.maximum(i, 0)
+        found = (i >= 0) & (timestamps_ms < self.ends[clipped])
+        return np.where(found, self.prices[clipped], np.nan)
 
 
 class EnergyPriceFetcher:
-    def __init__(self, parent, json_file_path="utils/energy_data.json"):
+    def __init__(self, parent, cache_path="utils/energy_data.ndjson", api_url="https://api.awattar.de/v1/marketdata", fetch_interval=3600):
         self.parent = parent
-        self.json_file_path = json_file_path
-        self.api_url = "https://api.awattar.de/v1/marketdata"
+        self.cache_path = cache_path
+        self.api_url = api_url
+        self.fetch_interval = fetch_interval
+        # start_timestamp -> (end_timestamp, marketprice) of the intervals sent to the database
+        self.stored = None
+        self.high_water_mark = None
+        self.price_index = None
+        self._index_lock = threading.Lock()
 
     def get_timestamps(self):
-        """Generate start (now) and end (48 hours later) timestamps in milliseconds."""
-        now = datetime.now()
-        end_time = now + timedelta(hours=48)
-        start_timestamp = int(now.timestamp() * 1000)
-        end_timestamp = int(end_time.timestamp() * 1000)
+        """
+        Generate start and end timestamps in milliseconds of the intervals that are still missing.
+        Start is right after the newest stored interval, but not before the current hour, and end is 48 hours after the current hour.
+        """
+        # The API only returns intervals starting at or after start
+        hour = datetime.now().replace(minute=0, second=0, microsecond=0)
+        start_timestamp = int(hour.timestamp() * 1000)
+        if self.high_water_mark is not None:
+            start_timestamp = max(start_timestamp, self.high_water_mark + 1)
+        end_timestamp = int((hour + timedelta(hours=48)).timestamp() * 1000)
         return start_timestamp, end_timestamp
 
     def timestamp_to_datetime_string(self, timestamp_ms):
@@ -39,28 +115,82 @@ class EnergyPriceFetcher:
         return processed_data
 
     def should_fetch_data(self):
-        """Check if data should be fetched based on last fetch time."""
-        if not os.path.exists(self.json_file_path):
+        """
+        Check if prices are missing. Prices are published a day ahead,
+        so fetch until the stored prices reach the last hour of tomorrow.
+        """
+        if self.high_water_mark is None:
             return True
+        midnight = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        last_hour = midnight + timedelta(days=2) - timedelta(hours=1)
+        return self.high_water_mark < int(last_hour.timestamp() * 1000)
+
+    def load_cache(self):
+        """
+        Load the stored intervals from the cache file, where later lines replace earlier ones with the same start.
+        The file is rewritten without the replaced and damaged lines once they make up half of it.
+        """
+        stored = {}
+        lines = 0
+        damaged = False
         try:
-            with open(self.json_file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            last_fetch = data.get('last_fetch_timestamp')
-            if not last_fetch:
-                return True
-            # Convert to seconds for comparison
-            last_fetch_time = datetime.fromtimestamp(last_fetch / 1000)
-            current_time = datetime.now()
-            time_diff = current_time - last_fetch_time
-            if time_diff.total_seconds() > 24 * 3600:  # 24 hours in seconds
-                return True
-            else:
-                return False
-        except (json.JSONDecodeError, KeyError, ValueError) as e:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        entry = json.loads(line)
+                        stored[entry['start_timestamp']] = (entry['end_timestamp'], entry['marketprice'])
+                    except (json.JSONDecodeError, KeyError, TypeError) as e:
+                        # A line cut off by a crash, appending after it would damage the next line as well
+                        damaged = True
+        except OSError as e:
+            pass
+        self.stored = stored
+        self.high_water_mark = max(stored) if stored else None
+        if damaged or lines > 2 * len(stored):
+            self.rewrite_cache()
+        self.update_price_index(self.stored_entries())
+
+    def stored_entries(self):
+        """Return the stored intervals in the format of the API."""
+        return [
+            {'start_timestamp': start, 'end_timestamp': end, 'marketprice': price}
+            for start, (end, price) in sorted(self.stored.items())
+        ]
+
+    def _write_entries(self, f, entries):
+        for entry in entries:
+            f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+    def append_to_cache(self, entries):
+        """Append intervals to the cache file, one compact JSON object per line."""
+        try:
+            with open(self.cache_path, 'a', encoding='utf-8') as f:
+                self._write_entries(f, entries)
+            return True
+        except OSError as e:
+            return False
+
+    def rewrite_cache(self):
+        """Replace the cache file with one line per stored interval."""
+        temp_path = self.cache_path + ".tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                self._write_entries(f, self.stored_entries())
+            os.replace(temp_path, self.cache_path)
             return True
+        except OSError as e:
+            return False
+
+    def new_or_changed(self, entries):
+        """Return the fetched intervals that are not stored yet or whose end or price changed."""
+        return [
+            entry for entry in entries
+            if self.stored.get(entry['start_timestamp']) != (entry['end_timestamp'], entry['marketprice'])
+        ]
 
     async def fetch_energy_data(self):
-        """Fetch energy data from the API."""
+        """Fetch the missing intervals from the API."""
         start_timestamp, end_timestamp = self.get_timestamps()
         params = {
             'start': start_timestamp,
@@ -70,45 +200,47 @@ class EnergyPriceFetcher:
             async with aiohttp.ClientSession() as session:
                 async with session.get(self.api_url, params=params) as response:
                     if response.status == 200:
-                        data = await response.json()
-                        # Add metadata
-                        result = {
-                            'last_fetch_timestamp': int(datetime.now().timestamp() * 1000),
-                            'fetch_params': {
-                                'start': start_timestamp,
-                                'end': end_timestamp
-                            },
-                            'api_response': data
-                        }
-                        return result
+                        return await response.json()
                     else:
                         return None
         except Exception as e:
             return None
 
-    def save_data(self, data):
-        """Save data to JSON file."""
+    def update_price_index(self, entries):
+        """
+        Builds a price index from intervals in the format of the API and swaps it in,
+        so lookups never see a partial index. Prices already in the index are kept.
+        """
         try:
-            with open(self.json_file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            return True
-        except Exception as e:
+            index = EnergyPriceIndex.from_entries(entries)
+        except (KeyError, TypeError, ValueError) as e:
             return False
+        with self._index_lock:
+            if self.price_index is not None:
+                index = self.price_index.merged(index)
+            self.price_index = index
+        return True
 
-    def load_data(self):
-        """Load data from JSON file."""
-        if not os.path.exists(self.json_file_path):
-            return None
-        try:
-            with open(self.json_file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
+    def get_price(self, timestamp_ms=None):
+        """Return the market price at a timestamp in milliseconds (default now), None if it is unknown."""
+        index = self.price_index
+        if index is None:
             return None
+        if timestamp_ms is None:
+            timestamp_ms = int(time.time() * 1000)
+        return index.price_at(timestamp_ms)
+
+    def get_prices(self, timestamps_ms):
+        """Return the market prices at many timestamps in milliseconds, NaN where they are unknown."""
+        index = self.price_index
+        if index is None:
+            return np.full(np.shape(timestamps_ms), np.nan)
+        return index.prices_at(timestamps_ms)
 
     async def send_to_database(self, processed_data):
-        """Send processed energy data to database."""
+        """Send processed energy data to database over the shared connection pool."""
         try:
-            if await self.parent.db.connect():
+            if self.parent.db.connected or await self.parent.db.connect():
                 response = await self.parent.db.generate_energydata_struct(processed_data)
                 if response and response.get('status') == 'success':
                     return True
@@ -120,26 +252,39 @@ class EnergyPriceFetcher:
             return False
 
     async def run_daily_fetch(self):
-        """Main method to run the daily fetch process."""
-        if self.should_fetch_data():
-            data = await self.fetch_energy_data()
-            if data:
-                if self.save_data(data):
-                    processed_data = self.process_api_data_for_database(data['api_response'])
-                    if processed_data:
-                        await self.send_to_database(processed_data)
-                        return True
-                    else:
-                        return False
-                else:
-                    return False
-            else:
-                return False
-        else:
+        """
+        Fetch the missing intervals and send the new or changed ones to the database in one batch.
+        Intervals are only recorded as stored once the database accepted them, otherwise they are sent again next time.
+        Returns False only if the fetch failed and no price for now is known,
+        prices of a day ahead that are not published yet do not count as missing.
+        """
+        if self.stored is None:
+            self.load_cache()
+        if not self.should_fetch_data():
+            return True
+        data = await self.fetch_energy_data()
+        if not data or 'data' not in data:
+            return self.get_price() is not None
+        changed = self.new_or_changed(data['data'])
+        if not changed:
             return True
+        self.update_price_index(changed)
+        if await self.send_to_database(self.process_api_data_for_database({'data': changed})):
+            changed = [
+                {'start_timestamp': entry['start_timestamp'], 'end_timestamp': entry['end_timestamp'], 'marketprice': entry['marketprice']}
+                for entry in changed
+            ]
+            self.append_to_cache(changed)
+            # Swapped in as a whole, the sorting worker and the scheduler run in different threads
+            stored = dict(self.stored)
+            for entry in changed:
+                stored[entry['start_timestamp']] = (entry['end_timestamp'], entry['marketprice'])
+            self.stored = stored
+            self.high_water_mark = max(stored)
+        return True
 
     async def start_scheduler(self):
-        """Start the scheduler that runs once per day."""
+        """Start the scheduler that checks for missing prices every fetch_interval seconds."""
         while True:
             await self.run_daily_fetch()
-            await asyncio.sleep(24 * 3600)
\ No newline at end of file
+            await asyncio.sleep(self.fetch_interval)
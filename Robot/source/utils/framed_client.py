@@ -0,0 +1,229 @@
+import asyncio
+import json
+import re
+import uuid
+
+
+class JsonStreamDecoder:
+    """Incrementally decodes a stream of JSON objects or arrays.
+
+    Values may be newline-delimited or simply concatenated and may be split over any
+    number of chunks. Only the structural characters are scanned, so large values are
+    decoded once they are complete instead of being re-parsed on every chunk.
+    """
+
+    _STRUCTURAL = re.compile(rb'["\\{}\[\]]')
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._pos = 0
+        self._start = None
+        self._depth = 0
+        self._in_string = False
+
+    def feed(self, data):
+        """Feeds a chunk of bytes and returns all values completed by it."""
+        self._buffer.extend(data)
+        values = []
+        while True:
+            if self._start is None:
+                while self._pos < len(self._buffer) and self._buffer[self._pos] in b" \t\r\n":
+                    self._pos += 1
+                if self._pos >= len(self._buffer):
+                    break
+                if self._buffer[self._pos] not in b"{[":
+                    raise ValueError(f"Unexpected byte {bytes(self._buffer[self._pos:self._pos + 1])!r} outside of a JSON value")
+                self._start = self._pos
+            end = self._scan()
+            if end is None:
+                break
+            values.append(json.loads(self._buffer[self._start:end]))
+            self._start = None
+            self._pos = end
+        self._compact()
+        return values
+
+    def _scan(self):
+        """Advances the scanner and returns the end offset of the current value, if complete."""
+        buffer = self._buffer
+        while True:
+            match = self._STRUCTURAL.search(buffer, self._pos)
+            if match is None:
+                self._pos = len(buffer)
+                return None
+            pos = match.start()
+            char = buffer[pos]
+            if self._in_string:
+                if char == 0x5C:  # backslash escapes the next byte
+                    if pos + 1 >= len(buffer):
+                        self._pos = pos
+                        return None
+                    self._pos = pos + 2
+                    continue
+                if char == 0x22:
+                    self._in_string = False
+                self._pos = pos + 1
+                continue
+            self._pos = pos + 1
+            if char == 0x22:
+                self._in_string = True
+            elif char in b"{[":
+                self._depth += 1
+            elif char in b"}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    return pos + 1
+
+    def _compact(self):
+        """Drops consumed bytes from the buffer."""
+        keep = self._start if self._start is not None else self._pos
+        if keep:
+            del self._buffer[:keep]
+            self._pos -= keep
+            if self._start is not None:
+                self._start = 0
+
+    @property
+    def buffered(self):
+        """Returns the number of bytes waiting for the rest of their value."""
+        return len(self._buffer)
+
+
+class FramedClient:
+    """Newline-framed JSON client with request IDs for pipelined requests.
+
+    Every request carries a request_id that the server echoes back, so several
+    requests can be in flight on one connection. Responses without a request_id
+    (older servers) are matched to the oldest pending request, which is correct
+    for servers that answer in order.
+    """
+
+    def __init__(self, host, port, password):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.reader = None
+        self.writer = None
+        self.loop = None
+        self.connected = False
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self._pending = {}
+        self._read_task = None
+
+    async def connect(self, timeout=5.0):
+        """Opens the connection and authenticates with the password.
+
+        Returns:
+            True if the server granted access, False otherwise.
+        """
+        try:
+            self.reader, self.writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), timeout)
+            await asyncio.wait_for(self.reader.read(1024), timeout)
+            self.writer.write(self.password.encode("utf-8"))
+            await self.writer.drain()
+            response = await asyncio.wait_for(self.reader.readline(), timeout)
+            if "Access granted" not in response.decode("utf-8"):
+                await self.close()
+                return False
+        except Exception as e:
+            await self.close()
+            return False
+        self.loop = asyncio.get_running_loop()
+        self.connected = True
+        self._read_task = asyncio.create_task(self._read_loop())
+        return True
+
+    async def _read_loop(self):
+        """Decodes responses and resolves the matching pending requests."""
+        decoder = JsonStreamDecoder()
+        try:
+            while True:
+                data = await self.reader.read(64 * 1024)
+                if not data:
+                    break
+                self.bytes_received += len(data)
+                for response in decoder.feed(data):
+                    self._resolve(response)
+        except Exception as e:
+            pass
+        finally:
+            self.connected = False
+            self._fail_pending(ConnectionError("Connection to the server was lost."))
+
+    def _resolve(self, response):
+        """Hands a response to the request it belongs to."""
+        request_id = response.get("request_id") if isinstance(response, dict) else None
+        if request_id in self._pending:
+            future = self._pending.pop(request_id)
+        elif self._pending:
+            future = self._pending.pop(next(iter(self._pending)))
+        else:
+            return
+        if not future.done():
+            future.set_result(response)
+
+    def _fail_pending(self, error):
+        """Fails all requests still waiting for a response."""
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    async def request(self, message, timeout=10.0):
+        """Sends a message and waits for its response.
+
+        Can be awaited from any event loop; the I/O always runs on the loop the
+        connection was opened on.
+
+        Returns:
+            The decoded response.
+        """
+        if not self.connected:
+            raise ConnectionError("Not connected to the server.")
+        if asyncio.get_running_loop() is not self.loop:
+            future = asyncio.run_coroutine_threadsafe(self._request(message, timeout), self.loop)
+            return await asyncio.wrap_future(future)
+        return await self._request(message, timeout)
+
+    async def _request(self, message, timeout):
+        """Sends a message on the connection's own loop."""
+        request_id = str(uuid.uuid4())
+        future = self.loop.create_future()
+        self._pending[request_id] = future
+        try:
+            payload = dict(message, request_id=request_id)
+            data = json.dumps(payload, separators=(",", ":")).encode("utf-8") + b"\n"
+            self.bytes_sent += len(data)
+            self.writer.write(data)
+            await self.writer.drain()
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def wait_disconnected(self, timeout=None):
+        """Waits until the connection is lost.
+
+        Returns:
+            True if the connection is gone, False if it is still up after the timeout.
+        """
+        if self._read_task is None:
+            return True
+        done, _ = await asyncio.wait([self._read_task], timeout=timeout)
+        return bool(done)
+
+    async def close(self):
+        """Closes the connection and fails all pending requests."""
+        self.connected = False
+        if self._read_task and self._read_task is not asyncio.current_task():
+            self._read_task.cancel()
+        self._read_task = None
+        if self.writer:
+            try:
+                self.writer.close()
+                await self.writer.wait_closed()
+            except Exception as e:
+                pass
+        self.reader = None
+        self.writer = None
+        self._fail_pending(ConnectionError("Connection was closed."))
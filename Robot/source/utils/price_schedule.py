@@ -0,0 +1,319 @@
+import dataclasses
+from datetime import datetime
+
+import numpy as np
+
+from utils.energy_price_fetch import EnergyPriceIndex
+
+
+@dataclasses.dataclass(frozen=True)
+class PlanStep:
+    """A period of the sorting plan in which the robot runs at one speed or pauses."""
+    start: float
+    end: float
+    speed: int | None
+    price: float
+    blocks: float
+    energy: float
+    cost: float
+
+
+class SortingCostModel:
+    def __init__(
+            self,
+            seconds_per_block: float = 8.0,
+            reference_speed: int = 500,
+            overhead_share: float = 0.25,
+            idle_watts: float = 20.0,
+            max_watts: float = 60.0,
+            max_speed: int = 1000,
+            smoothing: float = 0.2
+        ) -> None:
+        """
+        Initialize the model of how long sorting a block takes and how much power the robot draws at a speed.
+
+        Only the motion part of a block scales with the speed, the rest (detection, suction) does not.
+        The power grows from idle_watts with the square of the speed up to max_watts at max_speed,
+        so the energy per block is lowest at a medium speed.
+
+        Args:
+            seconds_per_block (float, optional): Seconds per block at the reference speed. Default is 8.0.
+            reference_speed (int, optional): The speed seconds_per_block refers to. Default is 500.
+            overhead_share (float, optional): Share of seconds_per_block that does not depend on the speed. Default is 0.25.
+            idle_watts (float, optional): Power while running at the lowest speed. Default is 20.0.
+            max_watts (float, optional): Power while running at max_speed. Default is 60.0.
+            max_speed (int, optional): The highest speed of the robot. Default is 1000.
+            smoothing (float, optional): Weight of a new measurement in the seconds per block. Default is 0.2.
+        """
+        self.seconds_per_block: float = seconds_per_block
+        self.reference_speed: int = reference_speed
+        self.overhead_share: float = overhead_share
+        self.idle_watts: float = idle_watts
+        self.max_watts: float = max_watts
+        self.max_speed: int = max_speed
+        self.smoothing: float = smoothing
+        self.observations: int = 0
+
+    def _speed_factor(self, speed: np.ndarray | float) -> np.ndarray | float:
+        return self.overhead_share + (1 - self.overhead_share) * self.reference_speed / speed
+
+    def block_seconds(self, speed: np.ndarray | float) -> np.ndarray | float:
+        """
+        Seconds to sort one block at a speed.
+
+        Args:
+            speed (np.ndarray | float): The robot speed, or an array of speeds.
+
+        Returns:
+            np.ndarray | float: The seconds per block.
+        """
+        return self.seconds_per_block * self._speed_factor(speed)
+
+    def watts(self, speed: np.ndarray | float) -> np.ndarray | float:
+        """
+        Power drawn while sorting at a speed.
+
+        Args:
+            speed (np.ndarray | float): The robot speed, or an array of speeds.
+
+        Returns:
+            np.ndarray | float: The power in watts.
+        """
+        return self.idle_watts + (self.max_watts - self.idle_watts) * (np.asarray(speed) / self.max_speed) ** 2
+
+    def observe(self, speed: int, seconds: float) -> None:
+        """
+        Update the seconds per block with a measured block.
+
+        Args:
+            speed (int): The speed the block was sorted at.
+            seconds (float): The measured seconds of the block.
+        """
+        measured = seconds / self._speed_factor(speed)
+        if self.observations == 0:
+            self.seconds_per_block = measured
+        else:
+            self.seconds_per_block += self.smoothing * (measured - self.seconds_per_block)
+        self.observations += 1
+
+
+def _price_slots(prices: EnergyPriceIndex, start: float, deadline: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Split [start, deadline] in seconds at the price interval boundaries. Unknown prices count as the highest known one."""
+    bounds = np.concatenate([prices.starts, prices.ends]) / 1000
+    edges = np.unique(np.concatenate([[start, deadline], bounds[(bounds > start) & (bounds < deadline)]]))
+    slot_prices = prices.prices_at(((edges[:-1] + edges[1:]) / 2 * 1000).astype(np.int64))
+    fallback = np.nanmax(prices.prices) if len(prices) else 0.0
+    return edges[:-1], edges[1:], np.where(np.isnan(slot_prices), fallback, slot_prices)
+
+
+def _lower_hull(points: list[tuple[float, float, int | None]]) -> list[tuple[float, float, int | None]]:
+    """Lower convex hull of (blocks, cost, speed) points sorted by blocks."""
+    hull = []
+    for point in points:
+        while len(hull) >= 2:
+            (x1, y1, _), (x2, y2, _) = hull[-2], hull[-1]
+            if (x2 - x1) * (point[1] - y1) - (y2 - y1) * (point[0] - x1) > 0:
+                break
+            hull.pop()
+        hull.append(point)
+    return hull
+
+
+def plan_sorting(
+        prices: EnergyPriceIndex,
+        blocks: int,
+        start: float,
+        deadline: float,
+        model: SortingCostModel,
+        speeds: tuple[int, ...] = (250, 500, 750, 1000)
+    ) -> list[PlanStep]:
+    """
+    Plan when to sort, pause or throttle, so that the blocks are sorted before the deadline at the lowest energy cost.
+
+    Every price interval until the deadline can be spent pausing or sorting at one of the speeds.
+    Per interval the speeds that are worth it lie on the lower convex hull of blocks against cost,
+    and going from one hull point to the next sorts more blocks at a rising cost per block.
+    Taking these steps from all intervals cheapest first until enough blocks are sorted is optimal,
+    the last step is only taken partly by switching speeds within its interval.
+    If the blocks cannot be sorted in time, the plan runs at the highest speed until the deadline.
+
+    Args:
+        prices (EnergyPriceIndex): The price curve in Eur/MWh.
+        blocks (int): The number of blocks to sort.
+        start (float): Start of the plan as Unix time.
+        deadline (float): Time by which all blocks should be sorted as Unix time.
+        model (SortingCostModel): Seconds per block and power per speed.
+        speeds (tuple[int, ...], optional): The speeds to choose from.
+
+    Returns:
+        list[PlanStep]: The steps in chronological order.
+    """
+    starts, ends, slot_prices = _price_slots(prices, start, deadline)
+    speeds_array = np.array(sorted(speeds), dtype=np.float64)
+    block_seconds = model.block_seconds(speeds_array)
+    # Eur per second for a price of 1 Eur/MWh
+    energy_per_second = model.watts(speeds_array) / 3.6e9
+    increments = []
+    hulls = []
+    for slot, (duration, price) in enumerate(zip(ends - starts, slot_prices)):
+        points = [(0.0, 0.0, None)] + [
+            (duration / seconds, duration * energy * price, int(speed))
+            for speed, seconds, energy in zip(speeds_array, block_seconds, energy_per_second)
+        ]
+        hull = _lower_hull(points)
+        hulls.append(hull)
+        for vertex in range(1, len(hull)):
+            gained = hull[vertex][0] - hull[vertex - 1][0]
+            slope = (hull[vertex][1] - hull[vertex - 1][1]) / gained
+            increments.append((slope, slot, vertex, gained))
+    increments.sort(key=lambda increment: (increment[0], increment[2]))
+    # Hull vertex per slot, and the share of the interval spent on the next vertex
+    reached = [0] * len(hulls)
+    partial = {}
+    remaining = float(blocks)
+    for slope, slot, vertex, gained in increments:
+        if remaining <= 1e-9:
+            break
+        if gained <= remaining:
+            reached[slot] = vertex
+            remaining -= gained
+        else:
+            partial[slot] = remaining / gained
+            remaining = 0.0
+    steps = []
+    for slot, hull in enumerate(hulls):
+        base = hull[reached[slot]]
+        runs = [(1.0, base)]
+        if slot in partial:
+            share = partial[slot]
+            runs = [(share, hull[reached[slot] + 1]), (1 - share, base)]
+        begin = starts[slot]
+        for share, (slot_blocks, slot_cost, speed) in runs:
+            end = begin + share * (ends[slot] - starts[slot])
+            if end > begin:
+                energy = 0.0 if speed is None else float(model.watts(speed)) * (end - begin) / 3.6e6
+                steps.append(PlanStep(
+                    float(begin), float(end), speed, float(slot_prices[slot]),
+                    share * slot_blocks, energy, share * slot_cost
+                ))
+            begin = end
+    return _merge_steps(steps)
+
+
+def plan_immediate(prices: EnergyPriceIndex, blocks: int, start: float, model: SortingCostModel, speed: int) -> list[PlanStep]:
+    """
+    Plan sorting at one speed without pausing, as the sorting worker does without price-aware scheduling.
+
+    Args:
+        prices (EnergyPriceIndex): The price curve in Eur/MWh.
+        blocks (int): The number of blocks to sort.
+        start (float): Start of the plan as Unix time.
+        model (SortingCostModel): Seconds per block and power per speed.
+        speed (int): The speed to sort at.
+
+    Returns:
+        list[PlanStep]: The steps in chronological order.
+    """
+    finish = start + blocks * float(model.block_seconds(speed))
+    starts, ends, slot_prices = _price_slots(prices, start, finish)
+    watts = float(model.watts(speed))
+    steps = [
+        PlanStep(
+            float(begin), float(end), speed, float(price), (end - begin) / float(model.block_seconds(speed)),
+            watts * (end - begin) / 3.6e6, watts * (end - begin) / 3.6e9 * price
+        )
+        for begin, end, price in zip(starts, ends, slot_prices)
+    ]
+    return _merge_steps(steps)
+
+
+def _merge_steps(steps: list[PlanStep]) -> list[PlanStep]:
+    """Join consecutive steps with the same speed."""
+    merged = []
+    for step in steps:
+        if merged and merged[-1].speed == step.speed and merged[-1].end == step.start:
+            last = merged[-1]
+            duration = step.end - last.start
+            merged[-1] = PlanStep(
+                last.start, step.end, step.speed,
+                (last.price * (last.end - last.start) + step.price * (step.end - step.start)) / duration,
+                last.blocks + step.blocks, last.energy + step.energy, last.cost + step.cost
+            )
+        else:
+            merged.append(step)
+    return merged
+
+
+def step_at(plan: list[PlanStep], timestamp: float) -> PlanStep | None:
+    """
+    Find the step of a plan that contains a timestamp.
+
+    Args:
+        plan (list[PlanStep]): The plan.
+        timestamp (float): Unix time.
+
+    Returns:
+        PlanStep | None: The step, or None if the plan does not cover the timestamp.
+    """
+    for step in plan:
+        if step.start <= timestamp < step.end:
+            return step
+    return None
+
+
+def summarize(plan: list[PlanStep]) -> dict:
+    """
+    Simulate a plan and total its throughput and cost.
+
+    Args:
+        plan (list[PlanStep]): The plan.
+
+    Returns:
+        dict: "blocks", "energy" in kWh, "cost" in Eur, "sorting_hours", "finish" as Unix time of the last sorted block
+        and "blocks_per_hour" while sorting.
+    """
+    blocks = sum(step.blocks for step in plan)
+    sorting = [step for step in plan if step.speed is not None and step.blocks > 0]
+    sorting_seconds = sum(step.end - step.start for step in sorting)
+    return {
+        "blocks": blocks,
+        "energy": sum(step.energy for step in plan),
+        "cost": sum(step.cost for step in plan),
+        "sorting_hours": sorting_seconds / 3600,
+        "finish": sorting[-1].end if sorting else None,
+        "blocks_per_hour": blocks / sorting_seconds * 3600 if sorting_seconds else 0.0,
+    }
+
+
+def format_report(plan: list[PlanStep], baseline: list[PlanStep], blocks: int, deadline: float | None = None) -> str:
+    """
+    Describe a plan and compare its simulated cost and throughput with sorting right away.
+
+    Args:
+        plan (list[PlanStep]): The price-aware plan.
+        baseline (list[PlanStep]): The plan without scheduling, see plan_immediate.
+        blocks (int): The number of blocks to sort.
+        deadline (float | None, optional): The deadline as Unix time, finishing later is marked.
+
+    Returns:
+        str: The report, one line per step and the totals.
+    """
+    lines = []
+    for step in plan:
+        action = "pause" if step.speed is None else f"speed {step.speed}"
+        lines.append(
+            f"{datetime.fromtimestamp(step.start):%a %H:%M}-{datetime.fromtimestamp(step.end):%H:%M}  {action:<10}"
+            f"  {step.price:7.2f} Eur/MWh  {step.blocks:6.1f} blocks  {step.energy * 1000:7.2f} Wh  {step.cost * 100:8.4f} ct"
+        )
+    planned, immediate = summarize(plan), summarize(baseline)
+    for name, summary in (("Planned", planned), ("Right away", immediate)):
+        finish = f"{datetime.fromtimestamp(summary['finish']):%a %H:%M}" if summary["finish"] else "-"
+        if deadline is not None and summary["finish"] and summary["finish"] > deadline + 1:
+            finish += " (after the deadline)"
+        lines.append(
+            f"{name}: {summary['blocks']:.0f}/{blocks} blocks until {finish}, {summary['blocks_per_hour']:.0f} blocks/h, "
+            f"{summary['energy'] * 1000:.2f} Wh, {summary['cost'] * 100:.4f} ct"
+        )
+    if immediate["cost"] > 0:
+        lines.append(f"Saving: {(1 - planned['cost'] / immediate['cost']) * 100:.1f} %")
+    return "\n".join(lines)
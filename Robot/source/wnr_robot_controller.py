@@ -9,8 +9,9 @@ from qasync import QEventLoop
 from automated_sorter import AutomatedSorter
 from gui import reset_slogan, post_calibrate_camera, post_start_sorting, post_storage_display, post_camera_display, post_color_analysis, post_color_settings, post_manual_controls, post_settings, post_fast_calibrate
 from stream.stream import Stream
+from utils.command_channel import close_channel
 from utils.communication import start_fetching
-from utils.config import read_config
+from utils.config import get_config_service, read_config
 from utils.custom_elements import CustomSidebar, GlobalEventListener
 from utils.database_imp import DatabaseImp
 from utils.energy_price_fetch import EnergyPriceFetcher
@@ -37,6 +38,9 @@ class MainWindow(QMainWindow):
         config = read_config(self)
         self.tcp_host = config["tcp"]["host"]
         self.tcp_port = config["tcp"]["port"]
+        config_service = get_config_service(self.config_path)
+        config_service.subscribe("tcp", self._on_tcp_config_changed)
+        config_service.start_watching()
         self.camera_display = QLabel("Sorry, the camera is not available yet.")
         self.color_analysis = QLabel("Sorry, the camera is not available yet.")
         self.sorter = AutomatedSorter(self)
@@ -122,6 +126,21 @@ class MainWindow(QMainWindow):
         except: pass
         self.submenu_mode = True
 
+    def _on_tcp_config_changed(self, old: dict, new: dict) -> None:
+        """
+        Uses the new TCP host and port for the next connection to the robot.
+
+        The cached command channel to the old address is closed, so its connection does not stay open.
+
+        Args:
+            old (dict): The previous tcp section of the configuration.
+            new (dict): The new tcp section of the configuration.
+        """
+        if (new["host"], new["port"]) != (self.tcp_host, self.tcp_port):
+            close_channel(self.tcp_host, self.tcp_port)
+        self.tcp_host = new["host"]
+        self.tcp_port = new["port"]
+
 
     def show_warning(self, message: str, interactable: bool = False, insert_place: int = 2) -> None:
         """
@@ -185,6 +204,7 @@ class MainWindow(QMainWindow):
     def close(self) -> None:
         """Overrides the close method to handle the closing of the main window."""
         # FIXME: Hier muss ich noch die Connections killen
+        get_config_service(self.config_path).stop_watching()
         super().close()
 
 
@@ -0,0 +1,105 @@
+"""Local stand-in for the aWATTar market data API.
+
+Serves GET /v1/marketdata?start=&end= like api.awattar.de: hourly intervals that
+start at or after start and before end, as {"object": "list", "data": [...]} with
+prices in Eur/MWh. Prices are a deterministic function of the hour and can be
+overridden with set_price. Only intervals before published_until are returned,
+like the day-ahead prices that are published around 14:00 for the next day.
+Useful to exercise EnergyPriceFetcher without the internet.
+
+Run from Robot/source and point EnergyPriceFetcher's api_url at it:
+    python ../test/awattar_stand_in_server.py --port 8090 --published-hours 34
+"""
+
+import argparse
+import asyncio
+import math
+import time
+
+from aiohttp import web
+
+HOUR_MS = 3600 * 1000
+
+
+def hour_start(timestamp_ms):
+    return timestamp_ms - timestamp_ms % HOUR_MS
+
+
+class StandInAwattarServer:
+    def __init__(self, host="127.0.0.1", port=8090, published_until=None):
+        """
+        Args:
+            published_until: Intervals ending after this timestamp in milliseconds are not published yet, default is in 34 hours
+        """
+        self.host = host
+        self.port = port
+        if published_until is None:
+            published_until = hour_start(int(time.time() * 1000)) + 34 * HOUR_MS
+        self.published_until = published_until
+        self.prices = {}
+        self.requests = []
+        self._runner = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/v1/marketdata"
+
+    def price(self, start):
+        if start in self.prices:
+            return self.prices[start]
+        hour = start // HOUR_MS
+        return round(80 + 60 * math.sin(hour / 24 * 2 * math.pi), 2)
+
+    def set_price(self, start, price):
+        self.prices[start] = price
+
+    async def _marketdata(self, request):
+        now = int(time.time() * 1000)
+        start = int(request.query.get("start", now))
+        end = int(request.query.get("end", start + 24 * HOUR_MS))
+        self.requests.append((start, end))
+        first = start if start % HOUR_MS == 0 else hour_start(start) + HOUR_MS
+        data = [
+            {
+                "start_timestamp": interval,
+                "end_timestamp": interval + HOUR_MS,
+                "marketprice": self.price(interval),
+                "unit": "Eur/MWh",
+            }
+            for interval in range(first, min(end, self.published_until), HOUR_MS)
+            if interval + HOUR_MS <= self.published_until
+        ]
+        return web.json_response({"object": "list", "data": data, "url": "/de/v1/marketdata"})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/v1/marketdata", self._marketdata)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+        return self
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the aWATTar market data API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--published-hours", type=int, default=34, help="Hours from now for which prices are published")
+    args = parser.parse_args()
+    published_until = hour_start(int(time.time() * 1000)) + args.published_hours * HOUR_MS
+    server = await StandInAwattarServer(args.host, args.port, published_until).start()
+    print(f"aWATTar stand-in listening on {server.url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
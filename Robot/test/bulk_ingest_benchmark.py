@@ -0,0 +1,80 @@
+"""Measures robotdata ingest throughput of BulkIngestClient.
+
+Sends the same seeded robotdata workload from workload_generator.py once per
+combination of batch size, in-flight batches per connection and number of
+connections, and reports rows/s, bytes/s and the acknowledgement latency percentiles.
+Without --port a stand-in server is started, --delay then simulates the time the
+server needs per message. With --port the records go to that server, e.g. the Rust
+datacenter endpoint.
+
+Run from Robot/source:
+    python ../test/bulk_ingest_benchmark.py --rows 20000 --batch-sizes 1 25 --in-flight 1 8
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "source"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from db_stand_in_server import StandInDatabaseServer
+from utils.bulk_ingest import BulkIngestClient
+from workload_generator import WorkloadGenerator
+
+
+async def run(host, port, password, rows, seed, batch_size, in_flight, connections):
+    client = BulkIngestClient(host, port, password, size=connections, batch_size=batch_size, max_in_flight=in_flight)
+    if not await client.start():
+        raise ConnectionError(f"Could not connect to {host}:{port}")
+    try:
+        # Let every slot connect so the run uses all connections
+        while client.get_health()["connections"] < connections:
+            await asyncio.sleep(0.01)
+        return await client.ingest(WorkloadGenerator(seed).robotdata(rows=rows))
+    finally:
+        await client.close()
+
+
+def format_ms(value):
+    return f"{value:.1f}" if value is not None else "-"
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark pipelined robotdata ingest")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="Server to ingest into, a stand-in server is started if not given")
+    parser.add_argument("--password", default="1234")
+    parser.add_argument("--delay", type=float, default=0.002, help="Seconds the stand-in server needs per message")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the workload, keep it to compare runs")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 25], help="Records per message, the datacenter server takes at most 25")
+    parser.add_argument("--in-flight", type=int, nargs="+", default=[1, 8], help="Batches in flight per connection")
+    parser.add_argument("--connections", type=int, nargs="+", default=[1, 4])
+    args = parser.parse_args()
+
+    server = None
+    port = args.port
+    if port is None:
+        server = await StandInDatabaseServer(args.host, 0, args.password, args.delay).start()
+        port = server.port
+    try:
+        print(f"{'batch':>6} {'in flight':>9} {'conns':>5} {'rows/s':>10} {'MB/s':>7} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'failed':>6}")
+        for batch_size in args.batch_sizes:
+            for in_flight in args.in_flight:
+                for connections in args.connections:
+                    report = await run(args.host, port, args.password, args.rows, args.seed, batch_size, in_flight, connections)
+                    latency = report["ack_latency_ms"]
+                    print(
+                        f"{batch_size:>6} {in_flight:>9} {connections:>5} {report['rows_per_second']:>10.0f} "
+                        f"{report['bytes_per_second'] / 1e6:>7.2f} {format_ms(latency['p50']):>8} "
+                        f"{format_ms(latency['p99']):>8} {format_ms(latency['max']):>8} {report['failed_batches']:>6}"
+                    )
+    finally:
+        if server:
+            await server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,112 @@
+"""Local stand-in for the datacenter TCP endpoint.
+
+Speaks the same protocol as datacenter/src/main.rs: a password prompt, then JSON
+messages that may be newline-delimited or concatenated. Every message is answered
+with a newline-terminated {"status": ..., "message": ...} that echoes the
+request_id. Useful to exercise DatabaseImp without Neo4j and the Rust server.
+
+Run from Robot/source so the config.json host/port can be pointed at it:
+    python ../test/db_stand_in_server.py --port 12345
+"""
+
+import argparse
+import asyncio
+import json
+
+
+class StandInDatabaseServer:
+    def __init__(self, host="127.0.0.1", port=12345, password="1234", delay=0.0, echo_request_id=True):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.delay = delay
+        self.echo_request_id = echo_request_id
+        self.received = []
+        self.connections = 0
+        self._server = None
+        self._writers = set()
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            for writer in list(self._writers):
+                writer.close()
+            await self._server.wait_closed()
+
+    async def _handle_client(self, reader, writer):
+        self.connections += 1
+        self._writers.add(writer)
+        writer.write(b"Enter password: ")
+        await writer.drain()
+        password = (await reader.read(1024)).decode("utf-8").strip()
+        if password != self.password:
+            writer.write(b"Access denied.\n")
+            await writer.drain()
+            writer.close()
+            return
+        writer.write(b"Access granted. You can now send JSON messages.\n")
+        await writer.drain()
+        decoder = json.JSONDecoder()
+        buffer = ""
+        try:
+            while True:
+                data = await reader.read(64 * 1024)
+                if not data:
+                    break
+                buffer += data.decode("utf-8")
+                while True:
+                    buffer = buffer.lstrip()
+                    if not buffer:
+                        break
+                    try:
+                        message, end = decoder.raw_decode(buffer)
+                    except json.JSONDecodeError:
+                        break
+                    buffer = buffer[end:]
+                    writer.write(json.dumps(await self._respond(message)).encode("utf-8") + b"\n")
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _respond(self, message):
+        self.received.append(message)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        message_type = message.get("type")
+        if message_type in ("robotdata", "energydata", "sensordata"):
+            response = {"status": "success", "message": f"Stored {len(message.get('data', []))} {message_type} entries"}
+        elif message_type == "message":
+            response = {"status": "success", "message": f"Message processed: {message.get('content')}"}
+        else:
+            response = {"status": "error", "message": f"Unknown message type: {message_type}"}
+        if self.echo_request_id and "request_id" in message:
+            response["request_id"] = message["request_id"]
+        return response
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the datacenter TCP endpoint")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=12345)
+    parser.add_argument("--password", default="1234")
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds to wait before answering each message")
+    parser.add_argument("--no-request-id", action="store_true", help="Do not echo request IDs, like the old server")
+    args = parser.parse_args()
+    server = await StandInDatabaseServer(args.host, args.port, args.password, args.delay, not args.no_request_id).start()
+    print(f"Stand-in database server listening on {server.host}:{server.port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,76 @@
+"""Compares the JSON and the binary encoding of color responses on the command channel.
+
+Measures payload size and encode/decode time of a whole frame for 1, 50 and 500
+detected objects. "decode (array)" only unpacks the binary body into a NumPy
+structured array, without building the dicts the JSON path produces.
+
+Run from Robot/source:
+    python ../test/detection_codec_benchmark.py
+"""
+
+import argparse
+import io
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "source"))
+
+from utils.command_channel import BINARY_FLAG, FRAME_HEADER_SIZE, encode_frame, recv_frame
+from utils.detection_codec import BINARY_ENCODING, BGR_COLORS, decode_objects
+
+
+class BytesSocket:
+    """Minimal socket stand-in that serves recv from a byte string."""
+
+    def __init__(self, data):
+        self._buffer = io.BytesIO(data)
+
+    def recv(self, size):
+        return self._buffer.read(size)
+
+
+def color_response(count, seed=0):
+    rng = random.Random(seed)
+    return {
+        "request_id": "0123456789abcdef0123456789abcdef",
+        "objects": [
+            {
+                "id": i + 1,
+                "bgr": rng.choice(list(BGR_COLORS)),
+                "robot_pos": {"x": rng.uniform(60, 300), "y": rng.uniform(-200, 200)},
+                "confidence": round(rng.uniform(0.8, 1.0), 3),
+            }
+            for i in range(count)
+        ],
+    }
+
+
+def measure(function, repeat):
+    return min(timeit.repeat(function, number=repeat, repeat=5)) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the command channel encodings")
+    parser.add_argument("--counts", type=int, nargs="+", default=[1, 50, 500])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    print(f"{'objects':>7} {'encoding':>9} {'bytes':>8} {'encode us':>10} {'decode us':>10} {'decode (array) us':>18}")
+    for count in args.counts:
+        response = color_response(count)
+        for encoding in ("json", BINARY_ENCODING):
+            frame = encode_frame(response, encoding)
+            encode_us = measure(lambda: encode_frame(response, encoding), args.repeat)
+            decode_us = measure(lambda: recv_frame(BytesSocket(frame)), args.repeat)
+            array_us = ""
+            if encoding == BINARY_ENCODING:
+                header_size = int.from_bytes(frame[FRAME_HEADER_SIZE:FRAME_HEADER_SIZE + 2], "big")
+                body = memoryview(frame)[FRAME_HEADER_SIZE + 2 + header_size:]
+                assert int.from_bytes(frame[:FRAME_HEADER_SIZE], "big") & BINARY_FLAG
+                array_us = f"{measure(lambda: decode_objects(body), args.repeat):.1f}"
+            print(f"{count:>7} {encoding:>9} {len(frame):>8} {encode_us:>10.1f} {decode_us:>10.1f} {array_us:>18}")
+
+
+if __name__ == "__main__":
+    main()
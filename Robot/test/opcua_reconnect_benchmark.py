@@ -0,0 +1,143 @@
+"""Measures the time from connecting AsyncOPCUAClient to the first sensor value.
+
+Runs against the stand-in server without security and reports, for a cold start
+(no NodeID cache), a warm start (cache file present) and a server restart (the
+Pi rebooting while the client keeps running), the time to the first sensor value
+and the number of OPC UA requests sent on the new connection. --latency puts a
+proxy in front of the server that delays every packet, like the WiFi link to the Pi.
+
+Run from Robot/source:
+    python ../test/opcua_reconnect_benchmark.py --latency 5
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "source"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import stream.shared_state as shared_state
+from opcua_stand_in_server import StandInOPCUAServer
+from stream.opcua_client import AsyncOPCUAClient
+
+
+class DelayProxy:
+    """TCP proxy that forwards each packet after half the round-trip latency."""
+
+    def __init__(self, port, target_port, latency):
+        self.port = port
+        self.target_port = target_port
+        self.delay = latency / 2000
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", self.port)
+        return self
+
+    async def _handle(self, reader, writer):
+        try:
+            target_reader, target_writer = await asyncio.open_connection("127.0.0.1", self.target_port)
+        except OSError:
+            writer.close()
+            return
+        await asyncio.gather(self._pipe(reader, target_writer), self._pipe(target_reader, writer))
+
+    async def _pipe(self, reader, writer):
+        try:
+            while data := await reader.read(65536):
+                await asyncio.sleep(self.delay)
+                writer.write(data)
+                await writer.drain()
+        except (OSError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def stop(self):
+        self.server.close()
+
+
+def request_count(client):
+    return client.client.uaclient.protocol._request_id
+
+
+async def wait_for_value(client, timeout):
+    deadline = time.perf_counter() + timeout
+    while client.time_to_first_value is None and time.perf_counter() < deadline:
+        await asyncio.sleep(0.001)
+    return client.time_to_first_value
+
+
+async def connect_once(url, cache_path, use_subscription):
+    client = AsyncOPCUAClient(url, use_subscription=use_subscription, use_security=False, node_cache_path=cache_path)
+    await client.connect()
+    fetch_task = asyncio.create_task(client.fetch_data_periodically())
+    first_value = await wait_for_value(client, 10)
+    requests = request_count(client)
+    client.running = False
+    fetch_task.cancel()
+    await client.stop()
+    return first_value, requests
+
+
+async def restart(url, server_port, cache_path, use_subscription, downtime, interval):
+    server = await StandInOPCUAServer(port=server_port, interval=interval).start()
+    client = AsyncOPCUAClient(url, use_subscription=use_subscription, use_security=False, node_cache_path=cache_path)
+    await client.connect()
+    fetch_task = asyncio.create_task(client.fetch_data_periodically())
+    await wait_for_value(client, 10)
+    client.time_to_first_value = None
+    await server.stop()
+    await asyncio.sleep(downtime)
+    server = await StandInOPCUAServer(port=server_port, interval=interval).start()
+    started = time.perf_counter()
+    await wait_for_value(client, 120)
+    since_start = time.perf_counter() - started
+    first_value = client.time_to_first_value
+    requests = request_count(client)
+    client.running = False
+    fetch_task.cancel()
+    await client.stop()
+    await server.stop()
+    return since_start, first_value, requests
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark the OPC UA client's time to the first sensor value")
+    parser.add_argument("--port", type=int, default=4850)
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated round-trip latency in ms")
+    parser.add_argument("--downtime", type=float, default=5.0, help="Seconds the server is down during the restart")
+    parser.add_argument("--poll", action="store_true", help="Poll instead of subscribing")
+    parser.add_argument("--fetch-interval", type=float, default=shared_state.OPC_FETCH_INTERVAL)
+    args = parser.parse_args()
+    shared_state.OPC_FETCH_INTERVAL = args.fetch_interval
+    server_port = args.port + 1 if args.latency else args.port
+    url = f"opc.tcp://127.0.0.1:{args.port}/freeopcua/server/"
+    proxy = await DelayProxy(args.port, server_port, args.latency).start() if args.latency else None
+    use_subscription = not args.poll
+    cache_path = os.path.join(tempfile.mkdtemp(), "opcua_node_cache.json")
+    try:
+        server = await StandInOPCUAServer(port=server_port, interval=0.5).start()
+        try:
+            print(f"{'scenario':>10} {'first value ms':>15} {'requests':>9}")
+            for scenario in ("cold", "warm"):
+                first_value, requests = await connect_once(url, cache_path, use_subscription)
+                print(f"{scenario:>10} {first_value * 1000:>15.1f} {requests:>9}")
+        finally:
+            await server.stop()
+        since_start, first_value, requests = await restart(
+            url, server_port, cache_path, use_subscription, args.downtime, 0.5
+        )
+        print(f"{'restart':>10} {first_value * 1000:>15.1f} {requests:>9}")
+        print(f"First value {since_start:.2f} s after the server came back ({args.downtime:.0f} s downtime)")
+    finally:
+        if proxy:
+            await proxy.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+"""Local stand-in for the OPC UA server on the Raspberry Pi.
+
+Builds the same address space as Raspberry/opcua_Rasp.py (Objects/Device with
+Temperature, Humidity, FanSpeed, SetFanSpeed and the NodeIDs JSON) and updates the
+sensor values with random data. It runs without security, so connect the client
+with use_security=False. Useful to exercise AsyncOPCUAClient without the Pi.
+
+Run from Robot/source:
+    python ../test/opcua_stand_in_server.py --port 4840
+"""
+
+import argparse
+import asyncio
+import json
+import random
+
+from asyncua import Server, ua
+
+
+class StandInOPCUAServer:
+    def __init__(self, host="127.0.0.1", port=4840, interval=1.0, subscriptions=True):
+        self.endpoint = f"opc.tcp://{host}:{port}/freeopcua/server/"
+        self.interval = interval
+        self.subscriptions = subscriptions
+        self.server = None
+        self.nodes = {}
+        self._task = None
+
+    async def start(self):
+        self.server = Server()
+        await self.server.init()
+        self.server.set_endpoint(self.endpoint)
+        self.server.set_server_name("SensorDataServer")
+        self.server.set_security_policy([ua.SecurityPolicyType.NoSecurity])
+        idx = await self.server.register_namespace("http://example.org")
+        device = await self.server.nodes.objects.add_object(idx, "Device")
+        for name in ("FanSpeed", "Temperature", "Humidity", "SetFanSpeed"):
+            self.nodes[name] = await device.add_variable(idx, name, 0.0)
+        await self.nodes["SetFanSpeed"].set_writable()
+        node_ids = {name: node.nodeid.to_string() for name, node in self.nodes.items()}
+        self.nodes["NodeIDs"] = await device.add_variable(idx, "NodeIDs", json.dumps(node_ids))
+        if not self.subscriptions:
+            # Behave like a server without the subscription service set
+            async def unsupported(*args, **kwargs):
+                raise ua.UaStatusCodeError(ua.StatusCodes.BadServiceUnsupported)
+            self.server.iserver.subscription_service.create_subscription = unsupported
+        await self.server.start()
+        self._task = asyncio.create_task(self._update_loop())
+        return self
+
+    async def set_values(self, temperature=None, humidity=None, fan_speed=None):
+        for name, value in (("Temperature", temperature), ("Humidity", humidity), ("FanSpeed", fan_speed)):
+            if value is not None:
+                await self.nodes[name].write_value(float(value))
+
+    async def _update_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            set_fan_speed = await self.nodes["SetFanSpeed"].read_value()
+            await self.set_values(
+                temperature=random.uniform(1, 50),
+                humidity=random.uniform(10, 100),
+                fan_speed=set_fan_speed if set_fan_speed != 0 else random.uniform(0, 100),
+            )
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+        if self.server:
+            await self.server.stop()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the OPC UA server on the Raspberry Pi")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4840)
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between sensor value updates")
+    parser.add_argument("--no-subscriptions", action="store_true", help="Reject subscriptions, so clients have to poll")
+    args = parser.parse_args()
+    server = await StandInOPCUAServer(args.host, args.port, args.interval, not args.no_subscriptions).start()
+    print(f"Stand-in OPC UA server listening on {server.endpoint}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,58 @@
+"""Simulates the energy-price-aware sorting plan and compares it with sorting right away.
+
+Plans a backlog of blocks against an hourly price curve, prints when the robot
+would sort, pause or throttle, and the simulated throughput, energy and cost of
+the plan and of sorting right away at the configured speed. Without --prices the
+curve of the aWATTar stand-in is used, --prices replays an energy_data.ndjson
+cache written by EnergyPriceFetcher.
+
+Run from Robot/source:
+    python ../test/price_schedule_report.py --blocks 400 --deadline-hours 12
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "source"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from awattar_stand_in_server import HOUR_MS, StandInAwattarServer, hour_start
+from utils.energy_price_fetch import EnergyPriceIndex
+from utils.price_schedule import SortingCostModel, format_report, plan_immediate, plan_sorting
+
+
+def load_prices(path, start_ms, hours):
+    if path:
+        with open(path, encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        return EnergyPriceIndex.from_entries(entries)
+    stand_in = StandInAwattarServer()
+    starts = [hour_start(start_ms) + hour * HOUR_MS for hour in range(hours + 1)]
+    return EnergyPriceIndex(starts, [start + HOUR_MS for start in starts], [stand_in.price(start) for start in starts])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate the energy-price-aware sorting plan")
+    parser.add_argument("--blocks", type=int, default=400)
+    parser.add_argument("--deadline-hours", type=float, default=12.0)
+    parser.add_argument("--seconds-per-block", type=float, default=8.0, help="Measured seconds per block at --speed")
+    parser.add_argument("--speed", type=int, default=500, help="Configured robot speed")
+    parser.add_argument("--prices", help="energy_data.ndjson to replay instead of the stand-in curve")
+    parser.add_argument("--start", type=float, help="Start as Unix time, default is now or the first replayed price")
+    args = parser.parse_args()
+    prices = load_prices(args.prices, int(time.time() * 1000), int(args.deadline_hours) + 2)
+    start = args.start or (prices.starts[0] / 1000 if args.prices else time.time())
+    model = SortingCostModel(seconds_per_block=args.seconds_per_block, reference_speed=args.speed)
+    planned = time.perf_counter()
+    plan = plan_sorting(prices, args.blocks, start, start + args.deadline_hours * 3600, model)
+    planning_ms = (time.perf_counter() - planned) * 1000
+    baseline = plan_immediate(prices, args.blocks, start, model, args.speed)
+    print(format_report(plan, baseline, args.blocks, start + args.deadline_hours * 3600))
+    print(f"Planned {len(plan)} steps in {planning_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
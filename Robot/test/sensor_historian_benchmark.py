@@ -0,0 +1,48 @@
+"""Measures append, windowed aggregates and dumps of the sensor historian.
+
+Fills a full ring buffer with samples every 0.5 s, like the OPC UA subscription
+at its sampling interval, then aggregates windows of different length ending at
+the newest sample.
+
+Run from Robot/source:
+    python ../test/sensor_historian_benchmark.py
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "source"))
+
+from stream.sensor_historian import SensorHistorian
+
+
+def measure(function, repeat):
+    return min(timeit.repeat(function, number=repeat, repeat=5)) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the sensor historian")
+    parser.add_argument("--capacity", type=int, default=65536)
+    parser.add_argument("--windows", type=float, nargs="+", default=[10, 600, 3600, 30000])
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+    historian = SensorHistorian(args.capacity)
+    for i in range(args.capacity):
+        historian.append(i * 0.5, temperature=20 + i % 10, humidity=40 + i % 7, fan_speed=i % 100)
+    end = (args.capacity - 1) * 0.5
+    append_us = measure(lambda: historian.append(end, temperature=21.0), args.repeat)
+    print(f"append: {append_us:.2f} us")
+    for seconds in args.windows:
+        aggregate_us = measure(lambda: historian.aggregate(seconds, until=end), args.repeat)
+        print(f"aggregate over {seconds:>7.0f} s ({min(int(seconds / 0.5), args.capacity):>6} samples): {aggregate_us:>9.1f} us")
+    path = os.path.join(tempfile.mkdtemp(), "sensor_history.npy")
+    dump_us = measure(lambda: historian.dump(path), 5)
+    load_us = measure(lambda: historian.load(path), 5)
+    print(f"dump: {dump_us / 1000:.1f} ms, load: {load_us / 1000:.1f} ms, {os.path.getsize(path)} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,414 @@
+"""Reproducible synthetic robotdata and energydata workloads.
+
+Every day of the workload is generated from its own seed derived from --seed, the
+day and the robot, so the same seed always yields the same rows, any range of days
+can be generated on its own (e.g. split over several processes) and memory stays
+flat however many rows are generated.
+
+The data follows the shape of the real installation instead of uniform noise:
+  - robotdata comes in sorting sessions, mostly during working hours and fewer on
+    weekends, with one block every few seconds while a session runs
+  - the color mix is skewed and drifts from session to session
+  - temperature follows the season and the time of day, humidity moves against it
+  - energydata are hourly prices in Eur/MWh shaped like aWATTar day-ahead prices,
+    with morning and evening peaks, a solar dip at noon that is deepest in summer
+    and lower prices on weekends; energy_cost of robotdata uses these prices
+
+Workloads are streamed to a server with BulkIngestClient or written for replay as
+NDJSON (optionally gzipped) or as compressed columnar chunks, one .npz
+per day, next to a manifest.json with the parameters. Replaying a file gives the
+exact same rows, which keeps database benchmarks comparable over time even if the
+generator changes.
+
+Run from Robot/source:
+    python ../test/workload_generator.py --seed 42 --days 30 --robots 4 --out ../test/workloads/w42 --format npz
+    python ../test/workload_generator.py --seed 42 --rows 1000000 --port 12345
+    python ../test/workload_generator.py --replay ../test/workloads/w42 --port 12345
+"""
+
+import argparse
+import asyncio
+import glob
+import gzip
+import json
+import math
+import os
+import sys
+from datetime import date, datetime, timedelta
+from itertools import islice
+from time import perf_counter
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "source"))
+
+VERSION = 1
+COLORS = ["red", "blue", "green", "yellow"]
+COLOR_WEIGHTS = [0.45, 0.3, 0.17, 0.08]
+# Streams of the seed sequence, so robotdata and prices of a day never share random numbers
+ROBOT_STREAM = 1
+PRICE_STREAM = 2
+
+
+def _gauss(hours, center, width):
+    return np.exp(-0.5 * ((hours - center) / width) ** 2)
+
+
+def _clock(seconds):
+    """Formats seconds since midnight as HH:MM:SS."""
+    minutes, second = divmod(int(seconds), 60)
+    hour, minute = divmod(minutes, 60)
+    return f"{hour:02d}:{minute:02d}:{second:02d}"
+
+
+class WorkloadGenerator:
+    def __init__(
+        self,
+        seed=0,
+        start=date(2025, 1, 1),
+        robots=1,
+        sessions_per_day=6.0,
+        session_minutes=45.0,
+        cycle_seconds=12.0,
+        block_energy_kwh=0.35,
+        color_weights=COLOR_WEIGHTS,
+    ):
+        """
+        Args:
+            seed: Seed of the whole workload
+            start: Date of day 0
+            robots: Number of robots sorting independently, scales the robotdata rows per day
+            sessions_per_day: Mean number of sorting sessions per robot on a weekday
+            session_minutes: Median length of a sorting session
+            cycle_seconds: Mean time between two sorted blocks within a session
+            block_energy_kwh: Mean energy used per sorted block
+            color_weights: Share of red, blue, green and yellow blocks
+        """
+        self.seed = seed
+        self.start = start
+        self.robots = robots
+        self.sessions_per_day = sessions_per_day
+        self.session_minutes = session_minutes
+        self.cycle_seconds = cycle_seconds
+        self.block_energy_kwh = block_energy_kwh
+        self.color_weights = np.asarray(color_weights, dtype=float) / sum(color_weights)
+        # Last day robot_columns generated, to know which prices a row-limited workload needs
+        self.last_day = None
+
+    def parameters(self):
+        """Returns everything needed to generate the same workload again."""
+        return {
+            "version": VERSION,
+            "seed": self.seed,
+            "start": self.start.isoformat(),
+            "robots": self.robots,
+            "sessions_per_day": self.sessions_per_day,
+            "session_minutes": self.session_minutes,
+            "cycle_seconds": self.cycle_seconds,
+            "block_energy_kwh": self.block_energy_kwh,
+            "color_weights": self.color_weights.tolist(),
+        }
+
+    def _rng(self, stream, day, robot=0):
+        return np.random.default_rng([self.seed, stream, day, robot])
+
+    def day_prices(self, day):
+        """Returns the 24 hourly prices of a day in Eur/MWh."""
+        current = self.start + timedelta(days=day)
+        rng = self._rng(PRICE_STREAM, day)
+        season = 2 * math.pi * (current.timetuple().tm_yday - 15) / 365
+        level = 85 + 15 * math.cos(season) + rng.normal(0, 12)
+        solar = 25 + 45 * max(0.0, -math.cos(season))
+        if current.weekday() >= 5:
+            level *= 0.8
+            solar *= 1.3
+        hours = np.arange(24) + 0.5
+        prices = (
+            level
+            + 25 * _gauss(hours, 8, 1.5)
+            + 45 * _gauss(hours, 19, 2)
+            - solar * _gauss(hours, 13, 2.5)
+            - 20 * _gauss(hours, 3, 2.5)
+            + rng.normal(0, 5, 24)
+        )
+        return np.round(prices, 2)
+
+    def robot_day(self, day, robot=0, prices=None):
+        """Generates the robotdata of one robot on one day as columns sorted by time.
+
+        Returns:
+            dict of arrays: uuid (two uint64 halves per row), seconds since midnight,
+            color index, temperature, humidity, energy_consume and energy_cost
+        """
+        current = self.start + timedelta(days=day)
+        rng = self._rng(ROBOT_STREAM, day, robot)
+        if prices is None:
+            prices = self.day_prices(day)
+        weekend = current.weekday() >= 5
+        sessions = rng.poisson(self.sessions_per_day * (0.3 if weekend else 1.0))
+        seconds, colors = [], []
+        for _ in range(sessions):
+            begin = rng.uniform(6, 20) * 3600
+            length = min(rng.lognormal(math.log(self.session_minutes * 60), 0.5), 86399 - begin)
+            # Blocks need at least a few seconds for the arm, the rest of the gap varies
+            minimum = min(4.0, self.cycle_seconds / 2)
+            gaps = minimum + rng.exponential(self.cycle_seconds - minimum, int(length / minimum) + 1)
+            times = begin + np.cumsum(gaps)
+            times = times[times < begin + length]
+            mix = rng.dirichlet(self.color_weights * 20)
+            seconds.append(times.astype(np.int64))
+            colors.append(rng.choice(len(COLORS), size=len(times), p=mix).astype(np.uint8))
+        if seconds:
+            seconds = np.concatenate(seconds)
+            colors = np.concatenate(colors)
+        else:
+            seconds = np.zeros(0, dtype=np.int64)
+            colors = np.zeros(0, dtype=np.uint8)
+        order = np.argsort(seconds, kind="stable")
+        seconds, colors = seconds[order], colors[order]
+        count = len(seconds)
+
+        hours = seconds / 3600
+        season = 3 * math.sin(2 * math.pi * (current.timetuple().tm_yday - 110) / 365)
+        temperature = 21 + season + 2.5 * np.sin(2 * math.pi * (hours - 9) / 24) + rng.normal(0, 0.3, count)
+        humidity = np.clip(50 - 1.5 * (temperature - 21) + rng.normal(0, 3, count), 20, 90)
+        energy = rng.gamma(6, self.block_energy_kwh / 6, count)
+        energy_cost = energy * prices[np.minimum(seconds // 3600, 23)] / 1000
+        halves = rng.integers(0, 2 ** 64, size=(count, 2), dtype=np.uint64)
+        # Version 4 and RFC 4122 variant bits, so the halves form valid UUID4s
+        halves[:, 0] = (halves[:, 0] & np.uint64(0xFFFFFFFFFFFF0FFF)) | np.uint64(0x4000)
+        halves[:, 1] = (halves[:, 1] & np.uint64(0x3FFFFFFFFFFFFFFF)) | np.uint64(0x8000000000000000)
+        return {
+            "uuid": halves,
+            "seconds": seconds,
+            "color": colors,
+            "temperature": np.round(temperature, 1),
+            "humidity": np.round(humidity, 1),
+            "energy_consume": np.round(energy, 3),
+            "energy_cost": np.round(energy_cost, 5),
+        }
+
+    def robot_columns(self, days):
+        """Yields (day, columns) for every day, with the rows of all robots merged by time."""
+        for day in days:
+            self.last_day = day
+            prices = self.day_prices(day)
+            parts = [self.robot_day(day, robot, prices) for robot in range(self.robots)]
+            columns = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+            order = np.argsort(columns["seconds"], kind="stable")
+            yield day, {name: values[order] for name, values in columns.items()}
+
+    def robotdata(self, days=None, rows=None):
+        """Yields robotdata records in time order.
+
+        Args:
+            days: Day indices to generate, all days from day 0 if None
+            rows: Stop after this many records
+        """
+        if days is None:
+            days = range(sys.maxsize)
+        records = (
+            record
+            for day, columns in self.robot_columns(days)
+            for record in robot_records(self.start + timedelta(days=day), columns)
+        )
+        return records if rows is None else islice(records, rows)
+
+    def energydata(self, days):
+        """Yields hourly energydata records like EnergyPriceFetcher sends them."""
+        for day in days:
+            prefix = (self.start + timedelta(days=day)).isoformat()
+            for hour, price in enumerate(self.day_prices(day).tolist()):
+                yield {"timestamp": f"{prefix} {hour:02d}:00:00", "energy_cost": price}
+
+
+def robot_records(current, columns):
+    """Turns the columns of one day into robotdata records."""
+    prefix = current.isoformat()
+    halves = columns["uuid"].tolist()
+    for (high, low), second, color, temperature, humidity, energy, cost in zip(
+        halves,
+        columns["seconds"].tolist(),
+        columns["color"].tolist(),
+        columns["temperature"].tolist(),
+        columns["humidity"].tolist(),
+        columns["energy_consume"].tolist(),
+        columns["energy_cost"].tolist(),
+    ):
+        high = f"{high:016x}"
+        low = f"{low:016x}"
+        yield {
+            "uuid": f"{high[:8]}-{high[8:12]}-{high[12:]}-{low[:4]}-{low[4:]}",
+            "color": COLORS[color],
+            "sensor_data": {"temperature": temperature, "humidity": humidity},
+            "timestamp": f"{prefix} {_clock(second)}",
+            "energy_consume": energy,
+            "energy_cost": cost,
+        }
+
+
+def _open_text(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def write_ndjson(path, records):
+    """Writes records as one compact JSON object per line and returns their number."""
+    count = 0
+    with _open_text(path, "w") as f:
+        for record in records:
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+            count += 1
+    return count
+
+
+def read_ndjson(path):
+    with _open_text(path, "r") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def write_columns(directory, generator, days):
+    """Writes the robotdata of every day as a compressed column chunk and returns the number of rows."""
+    count = 0
+    for day, columns in generator.robot_columns(days):
+        current = generator.start + timedelta(days=day)
+        np.savez_compressed(os.path.join(directory, f"robotdata-{day:06d}.npz"), date=current.isoformat(), **columns)
+        count += len(columns["seconds"])
+    return count
+
+
+def read_columns(directory):
+    """Yields the robotdata records of all column chunks in a directory in day order."""
+    for path in sorted(glob.glob(os.path.join(directory, "robotdata-*.npz"))):
+        with np.load(path) as chunk:
+            columns = {name: chunk[name] for name in chunk.files if name != "date"}
+            current = date.fromisoformat(str(chunk["date"]))
+        yield from robot_records(current, columns)
+
+
+def write_workload(directory, generator, days, file_format="ndjson"):
+    """Writes robotdata and energydata of the given days plus a manifest for replay.
+
+    Returns:
+        The manifest.
+    """
+    os.makedirs(directory, exist_ok=True)
+    days = list(days)
+    if file_format == "npz":
+        robot_rows = write_columns(directory, generator, days)
+    else:
+        suffix = ".ndjson.gz" if file_format == "ndjson.gz" else ".ndjson"
+        robot_rows = write_ndjson(os.path.join(directory, "robotdata" + suffix), generator.robotdata(days))
+    energy_rows = write_ndjson(os.path.join(directory, "energydata.ndjson"), generator.energydata(days))
+    manifest = dict(
+        generator.parameters(),
+        first_day=days[0] if days else None,
+        days=len(days),
+        format=file_format,
+        robotdata_rows=robot_rows,
+        energydata_rows=energy_rows,
+        created=datetime.now().isoformat(timespec="seconds"),
+    )
+    with open(os.path.join(directory, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def replay(directory):
+    """Returns the manifest and iterators over the robotdata and energydata of a written workload."""
+    with open(os.path.join(directory, "manifest.json"), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest["format"] == "npz":
+        robotdata = read_columns(directory)
+    else:
+        suffix = ".ndjson.gz" if manifest["format"] == "ndjson.gz" else ".ndjson"
+        robotdata = read_ndjson(os.path.join(directory, "robotdata" + suffix))
+    return manifest, robotdata, read_ndjson(os.path.join(directory, "energydata.ndjson"))
+
+
+async def ingest(host, port, password, robotdata, energydata, connections, batch_size, in_flight):
+    from utils.bulk_ingest import BulkIngestClient
+
+    client = BulkIngestClient(host, port, password, size=connections, batch_size=batch_size, max_in_flight=in_flight)
+    if not await client.start():
+        raise ConnectionError(f"Could not connect to {host}:{port}")
+    try:
+        reports = {}
+        # Energydata last, so a row-limited workload knows which days it covers
+        for message_type, records in (("robotdata", robotdata), ("energydata", energydata)):
+            report = await client.ingest(records, message_type)
+            reports[message_type] = report
+            print(
+                f"{message_type}: {report['rows_acked']}/{report['rows']} rows in {report['seconds']:.1f} s, "
+                f"{report['rows_per_second'] or 0:.0f} rows/s, ack p99 {report['ack_latency_ms']['p99'] or 0:.1f} ms"
+            )
+        return reports
+    finally:
+        await client.close()
+
+
+def covered_energydata(generator, first_day):
+    """Yields the prices of the days the robotdata generated so far covers, once it was consumed."""
+    last_day = generator.last_day if generator.last_day is not None else first_day
+    yield from generator.energydata(range(first_day, last_day + 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate, write and replay reproducible database workloads")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--start", type=date.fromisoformat, default=date(2025, 1, 1), help="Date of day 0")
+    parser.add_argument("--first-day", type=int, default=0, help="First day to generate, to split a workload over processes")
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--rows", type=int, help="Generate days until this many robotdata rows, overrides --days for ingest")
+    parser.add_argument("--robots", type=int, default=1)
+    parser.add_argument("--sessions-per-day", type=float, default=6.0)
+    parser.add_argument("--cycle-seconds", type=float, default=12.0)
+    parser.add_argument("--out", help="Directory to write the workload to")
+    parser.add_argument("--format", choices=["ndjson", "ndjson.gz", "npz"], default="ndjson")
+    parser.add_argument("--replay", help="Directory of a written workload to send instead of generating one")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="Send the workload to this server with BulkIngestClient")
+    parser.add_argument("--password", default="1234")
+    parser.add_argument("--connections", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=25)
+    parser.add_argument("--in-flight", type=int, default=4)
+    args = parser.parse_args()
+
+    if args.replay:
+        manifest, robotdata, energydata = replay(args.replay)
+        print(f"Replaying seed {manifest['seed']}: {manifest['robotdata_rows']} robotdata, {manifest['energydata_rows']} energydata rows")
+    else:
+        generator = WorkloadGenerator(
+            args.seed, args.start, args.robots, args.sessions_per_day, cycle_seconds=args.cycle_seconds
+        )
+        if args.rows is not None:
+            days = range(args.first_day, sys.maxsize)
+            robotdata = generator.robotdata(days, args.rows)
+            energydata = covered_energydata(generator, args.first_day)
+        else:
+            days = range(args.first_day, args.first_day + args.days)
+            robotdata = generator.robotdata(days)
+            energydata = generator.energydata(days)
+        if args.out:
+            if args.rows is not None:
+                parser.error("--out writes whole days, use --days instead of --rows")
+            start = perf_counter()
+            manifest = write_workload(args.out, generator, days, args.format)
+            print(
+                f"Wrote {manifest['robotdata_rows']} robotdata and {manifest['energydata_rows']} energydata rows "
+                f"to {args.out} in {perf_counter() - start:.1f} s"
+            )
+            return
+
+    if args.port is None:
+        parser.error("Give --out to write the workload or --port to send it")
+    asyncio.run(ingest(
+        args.host, args.port, args.password, robotdata, energydata, args.connections, args.batch_size, args.in_flight
+    ))
+
+
+if __name__ == "__main__":
+    main()
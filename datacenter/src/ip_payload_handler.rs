@@ -20,16 +20,19 @@ pub async fn process_json(
 ) -> Result<(), String> {
   
     
+    // Echoed back so clients can pipeline several requests on one connection
+    let request_id = json.get("request_id");
+
     if let Some(message_type) = json.get("type") {
         match message_type.as_str() {
             Some("message") => {
                 let result = handle_message(json);
-                send_response(socket, &result).await?;
+                send_response(socket, &result, request_id).await?;
                 Ok(())
             },
             Some("command") => {
                 let result = handle_command(json, db_handler).await;
-                send_response(socket, &result).await?;
+                send_response(socket, &result, request_id).await?;
                 Ok(())
             },
             Some("robotdata") => {
@@ -39,33 +42,33 @@ pub async fn process_json(
                     Err(err) => json!({ "status": "error", "message": err }),
                 };
                 info!("Sending response to TCP client for robotdata: {}", response_to_log);
-                send_response(socket, &result).await?;
+                send_response(socket, &result, request_id).await?;
                 Ok(())
             },
             Some("energydata") => {
                 let result = handle_energydata(json, db_handler, mqtt_client).await;
-                send_response(socket, &result).await?;
+                send_response(socket, &result, request_id).await?;
                 Ok(())
             },
             Some("sensordata") => {
                 let result = handle_sensordata(json, db_handler, mqtt_client).await;
-                send_response(socket, &result).await?;
+                send_response(socket, &result, request_id).await?;
                 Ok(())
             },
             Some("videostream") => { 
                 let result = handle_videostream_data(json, webrtc_server).await;
-                send_response(socket, &result).await?;
+                send_response(socket, &result, request_id).await?;
                 Ok(())
             },
             _ => {
                 let error_msg = format!("Unknown message type: {:?}", message_type);
-                send_error(socket, &error_msg).await?;
+                send_error(socket, &error_msg, request_id).await?;
                 Err(error_msg)
             }
         }
     } else {
         let error_msg = "JSON has no type field".to_string();
-        send_error(socket, &error_msg).await?;
+        send_error(socket, &error_msg, request_id).await?;
         Err(error_msg)
     }
 }
@@ -286,27 +289,30 @@ async fn handle_videostream_data(
     }
 }
 
-async fn send_response(socket: &mut TcpStream, result: &Result<String, String>) -> Result<(), String> {
+async fn send_response(socket: &mut TcpStream, result: &Result<String, String>, request_id: Option<&Value>) -> Result<(), String> {
     let response = match result {
         Ok(msg) => json!({ "status": "success", "message": msg }),
         Err(err) => json!({ "status": "error", "message": err }),
     };
     
-    send_json_response(socket, &response).await
+    send_json_response(socket, response, request_id).await
 }
 
-async fn send_error(socket: &mut TcpStream, error_msg: &str) -> Result<(), String> {
+async fn send_error(socket: &mut TcpStream, error_msg: &str, request_id: Option<&Value>) -> Result<(), String> {
     let response = json!({
         "status": "error",
         "message": error_msg
     });
     
-    send_json_response(socket, &response).await
+    send_json_response(socket, response, request_id).await
 }
 
-async fn send_json_response(socket: &mut TcpStream, json: &Value) -> Result<(), String> {
-    let json_string = json.to_string();
-    let response = format!("{}", json_string);
+async fn send_json_response(socket: &mut TcpStream, mut json: Value, request_id: Option<&Value>) -> Result<(), String> {
+    if let (Some(id), Some(object)) = (request_id, json.as_object_mut()) {
+        object.insert("request_id".to_string(), id.clone());
+    }
+    // Responses are newline-delimited so clients can frame them without guessing
+    let response = format!("{}\n", json.to_string());
     
     match socket.write_all(response.as_bytes()).await {
         Ok(_) => {
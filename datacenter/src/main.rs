@@ -144,90 +144,90 @@ async fn handle_client(
         return Ok(());
     }
 
+    let mut pending: Vec<u8> = Vec::new();
+    let mut chunk = vec![0; 64 * 1024];
+
     loop {
-        match receive_json(&mut socket).await {
+        match next_json(&mut pending) {
             Ok(Some(json)) => {
-                
                 if let Err(e) = ip_payload_handler::process_json(&json, Arc::clone(&db_handler), &mut socket, mqtt_client.as_ref(), Some(&webrtc_server)).await {
                     error!("Error processing JSON: {}", e);
                 }
+                continue;
             },
-            Ok(None) => {
-                info!("Client disconnected: {}", socket.peer_addr().map(|a| a.to_string()).unwrap_or_else(|_| "unknown".to_string()));
-                break;
-            },
+            Ok(None) => {},
             Err(e) => {
-                error!("Error receiving JSON from {}: {:?}", socket.peer_addr().map(|a| a.to_string()).unwrap_or_else(|_| "unknown".to_string()), e);
-                break;
+                let error_msg = format!("Invalid JSON format: {}", e);
+                error!("{}", error_msg);
+                send_framing_error(&mut socket, &error_msg).await;
+                pending.clear();
             }
         }
-    }
 
-    Ok(())
-}
+        let n = match socket.read(&mut chunk).await {
+            Ok(n) => n,
+            Err(e) => {
+                error!("Error receiving JSON from {}: {:?}", socket.peer_addr().map(|a| a.to_string()).unwrap_or_else(|_| "unknown".to_string()), e);
+                break;
+            }
+        };
 
-async fn receive_json(socket: &mut TcpStream) -> io::Result<Option<Value>> {
-    const MAX_JSON_SIZE: usize = 10 * 1024 * 1024;
+        if n == 0 {
+            info!("Client disconnected: {}", socket.peer_addr().map(|a| a.to_string()).unwrap_or_else(|_| "unknown".to_string()));
+            break;
+        }
 
-    let mut buf = vec![0; MAX_JSON_SIZE];
-    let n = socket.read(&mut buf).await?;
+        if pending.len() + n > MAX_JSON_SIZE {
+            let error_msg = "Error: JSON payload too large (exceeds 10MB limit)";
+            error!("{}", error_msg);
+            send_framing_error(&mut socket, error_msg).await;
+            pending.clear();
+            continue;
+        }
 
-    if n == 0 {
-        return Ok(None);
+        pending.extend_from_slice(&chunk[..n]);
     }
 
-    if n >= MAX_JSON_SIZE {
-        let error_msg = "Error: JSON payload too large (exceeds 10MB limit)";
-        error!("{}", error_msg);
+    Ok(())
+}
 
-        let error_response = json!({
-            "status": "error",
-            "message": error_msg
-        });
+const MAX_JSON_SIZE: usize = 10 * 1024 * 1024;
+
+/// Takes the next complete JSON value from the connection buffer.
+///
+/// Messages may be newline-delimited or simply concatenated, and may arrive split
+/// over several reads. Returns `Ok(None)` until a complete value is buffered.
+fn next_json(pending: &mut Vec<u8>) -> Result<Option<Value>, serde_json::Error> {
+    let start = match pending.iter().position(|b| !b.is_ascii_whitespace()) {
+        Some(start) => start,
+        None => {
+            pending.clear();
+            return Ok(None);
+        }
+    };
 
-        let _ = socket.write_all(error_response.to_string().as_bytes()).await;
-        let _ = socket.write_all(b"\n").await;
+    let (result, consumed) = {
+        let mut stream = serde_json::Deserializer::from_slice(&pending[start..]).into_iter::<Value>();
+        match stream.next() {
+            Some(Ok(json)) => (Ok(Some(json)), start + stream.byte_offset()),
+            Some(Err(e)) if e.is_eof() => (Ok(None), 0),
+            Some(Err(e)) => (Err(e), 0),
+            None => (Ok(None), 0),
+        }
+    };
 
-        return Err(io::Error::new(io::ErrorKind::InvalidData, error_msg));
+    if consumed > 0 {
+        pending.drain(..consumed);
     }
+    result
+}
 
-    buf.truncate(n);
-
-    match String::from_utf8(buf) {
-        Ok(data) => {
-            match serde_json::from_str::<Value>(&data) {
-                Ok(json) => {
-                    Ok(Some(json))
-                },
-                Err(e) => {
-                    let error_msg = format!("Invalid JSON format: {}", e);
-                    error!("{}", error_msg);
-
-                    let error_response = json!({
-                        "status": "error",
-                        "message": error_msg
-                    });
-
-                    let _ = socket.write_all(error_response.to_string().as_bytes()).await;
-                    let _ = socket.write_all(b"\n").await;
-
-                    Err(io::Error::new(io::ErrorKind::InvalidData, e))
-                }
-            }
-        },
-        Err(e) => {
-            let error_msg = format!("Invalid UTF-8 data received: {}", e);
-            error!("{}", error_msg);
-
-            let error_response = json!({
-                "status": "error",
-                "message": error_msg
-            });
-
-            let _ = socket.write_all(error_response.to_string().as_bytes()).await;
-            let _ = socket.write_all(b"\n").await;
+async fn send_framing_error(socket: &mut TcpStream, error_msg: &str) {
+    let error_response = json!({
+        "status": "error",
+        "message": error_msg
+    });
 
-            Err(io::Error::new(io::ErrorKind::InvalidData, e))
-        }
-    }
+    let _ = socket.write_all(error_response.to_string().as_bytes()).await;
+    let _ = socket.write_all(b"\n").await;
 }
\ No newline at end of file
@@ -75,7 +75,7 @@ class TcpClient:
         try:
             response_data = ""
 
-            while not response_data.endswith("""status":"success"}"""):
+            while not response_data.endswith("\n"):
                 chunk = self.socket.recv(buffer_size).decode("utf-8")
                 if not chunk:
                     print("INFO: Server closed the connection.")
@@ -0,0 +1,133 @@
+"""
+HDR-style latency histogram.
+
+Values are counted in buckets whose width grows with the value, so every recorded value
+is kept with a fixed number of significant digits, from microseconds up to minutes, in
+a few thousand counters. Histograms with the same settings can be merged, which makes
+per-request-type, per-second and per-run histograms cheap to combine and to compare.
+"""
+
+import math
+from typing import Any, Dict, Iterable, Optional
+
+
+class LatencyHistogram:
+    def __init__(self, lowest_us=1, highest_us=3600 * 1000 * 1000, significant_digits=3):
+        """
+        Args:
+            lowest_us: Smallest value in microseconds that is told apart from 0
+            highest_us: Largest value in microseconds that is tracked, larger values are counted as this
+            significant_digits: Number of significant decimal digits kept of every value
+        """
+        self.lowest_us = lowest_us
+        self.highest_us = highest_us
+        self.significant_digits = significant_digits
+        self.unit_magnitude = int(math.floor(math.log2(lowest_us)))
+        self.sub_bucket_count_magnitude = int(math.ceil(math.log2(2 * 10 ** significant_digits)))
+        self.sub_bucket_half_count_magnitude = self.sub_bucket_count_magnitude - 1
+        self.sub_bucket_count = 1 << self.sub_bucket_count_magnitude
+        self.sub_bucket_half_count = self.sub_bucket_count >> 1
+        self.sub_bucket_mask = (self.sub_bucket_count - 1) << self.unit_magnitude
+        smallest_untrackable = self.sub_bucket_count << self.unit_magnitude
+        bucket_count = 1
+        while smallest_untrackable <= highest_us:
+            smallest_untrackable <<= 1
+            bucket_count += 1
+        self.counts = [0] * ((bucket_count + 1) * self.sub_bucket_half_count)
+        self.total_count = 0
+        self.min_us = None
+        self.max_us = None
+
+    def _index(self, value):
+        bucket_index = (value | self.sub_bucket_mask).bit_length() - self.unit_magnitude - self.sub_bucket_count_magnitude
+        sub_bucket_index = value >> (bucket_index + self.unit_magnitude)
+        return ((bucket_index + 1) << self.sub_bucket_half_count_magnitude) + sub_bucket_index - self.sub_bucket_half_count
+
+    def _value_range(self, index):
+        """Returns the lowest and the highest value counted at an index"""
+        bucket_index = (index >> self.sub_bucket_half_count_magnitude) - 1
+        sub_bucket_index = (index & (self.sub_bucket_half_count - 1)) + self.sub_bucket_half_count
+        if bucket_index < 0:
+            sub_bucket_index -= self.sub_bucket_half_count
+            bucket_index = 0
+        shift = bucket_index + self.unit_magnitude
+        return sub_bucket_index << shift, ((sub_bucket_index + 1) << shift) - 1
+
+    def record(self, seconds, count=1):
+        """Count a latency given in seconds"""
+        self.record_us(int(round(seconds * 1_000_000)), count)
+
+    def record_us(self, value, count=1):
+        value = max(0, value)
+        if self.min_us is None or value < self.min_us:
+            self.min_us = value
+        if self.max_us is None or value > self.max_us:
+            self.max_us = value
+        self.counts[self._index(min(value, self.highest_us))] += count
+        self.total_count += count
+
+    def merge(self, other: "LatencyHistogram"):
+        """Add the counts of a histogram with the same settings"""
+        if len(other.counts) != len(self.counts) or other.unit_magnitude != self.unit_magnitude:
+            raise ValueError("Histograms with different settings cannot be merged")
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        self.total_count += other.total_count
+        if other.min_us is not None:
+            self.min_us = other.min_us if self.min_us is None else min(self.min_us, other.min_us)
+            self.max_us = other.max_us if self.max_us is None else max(self.max_us, other.max_us)
+        return self
+
+    def percentile_us(self, percentile) -> Optional[int]:
+        """Returns the value in microseconds below or at which the given percentage of values lie"""
+        if not self.total_count:
+            return None
+        target = max(1, math.ceil(percentile / 100 * self.total_count))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self._value_range(index)[1], self.max_us)
+        return self.max_us
+
+    def percentiles_ms(self, percentiles: Iterable[float] = (50, 90, 99, 99.9)) -> Dict[str, Optional[float]]:
+        """Returns the percentiles and the maximum in milliseconds, keyed like "p99.9" and "max" """
+        values = {}
+        for percentile in percentiles:
+            value = self.percentile_us(percentile)
+            values[f"p{percentile:g}"] = None if value is None else value / 1000
+        values["max"] = None if self.max_us is None else self.max_us / 1000
+        return values
+
+    def mean_us(self) -> Optional[float]:
+        if not self.total_count:
+            return None
+        total = 0
+        for index, count in enumerate(self.counts):
+            if count:
+                low, high = self._value_range(index)
+                total += count * (low + high) / 2
+        return total / self.total_count
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns the settings and the non-empty buckets as [lowest value in microseconds, count]"""
+        return {
+            "lowest_us": self.lowest_us,
+            "highest_us": self.highest_us,
+            "significant_digits": self.significant_digits,
+            "min_us": self.min_us,
+            "max_us": self.max_us,
+            "counts": [[self._value_range(index)[0], count] for index, count in enumerate(self.counts) if count],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LatencyHistogram":
+        """Rebuilds a histogram written by to_dict, e.g. to merge or compare runs"""
+        histogram = cls(data["lowest_us"], data["highest_us"], data["significant_digits"])
+        for value, count in data["counts"]:
+            histogram.counts[histogram._index(value)] += count
+            histogram.total_count += count
+        histogram.min_us = data.get("min_us")
+        histogram.max_us = data.get("max_us")
+        return histogram
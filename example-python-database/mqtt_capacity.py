@@ -0,0 +1,191 @@
+"""
+Finds the maximum sustainable request rate per request type at a p99 latency SLO.
+
+For every request type the rate is doubled from --start-rate until a step misses the SLO,
+then the last good and the first bad rate are bisected. A step is sustainable if the p99
+latency, measured from the intended send time, stays within the SLO, nearly all
+requests sent in the step complete, and few requests fail or time out. Every
+measured step becomes a point of the capacity curve, which is printed and written to
+logs/capacity_<timestamp>.json.
+
+    python mqtt_capacity.py --tests uuid color page --slo-ms 200 --step-duration 10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, List
+
+from mqtt_load_generator import LoadGenerator, LoadProfile
+from mqtt_multi_client import BROKER, PORT, TEST_TYPES, format_percentiles, summarize_metrics
+
+
+def measure(metrics, offered_rate, duration, slo_ms, max_error_rate, min_throughput_ratio) -> Dict[str, Any]:
+    """Summarize one constant-rate step into a point of the capacity curve"""
+    summary = summarize_metrics(metrics)
+    latency = summary["total_duration_ms"]
+    achieved_rate = summary["completed"] / duration
+    # Poisson arrivals send more or fewer requests than the offered rate by chance, so
+    # throughput is judged against the requests actually sent in this step
+    completed_ratio = summary["completed"] / summary["count"] if summary["count"] else 0.0
+    p99 = latency["p99"]
+    problems = []
+    if p99 is None or p99 > slo_ms:
+        problems.append(f"p99 {p99} ms above SLO" if p99 is not None else "no responses")
+    if summary["error_rate"] + summary["timeout_rate"] > max_error_rate:
+        problems.append(f"{summary['error_rate'] + summary['timeout_rate']:.1%} failed or timed out")
+    if completed_ratio < min_throughput_ratio:
+        problems.append(f"completed only {summary['completed']} of {summary['count']} requests ({achieved_rate:.1f}/s)")
+    return {
+        "offered_rate": offered_rate,
+        "achieved_rate": achieved_rate,
+        "sent_rate": summary["count"] / duration,
+        "completed_ratio": completed_ratio,
+        "count": summary["count"],
+        "error_rate": summary["error_rate"],
+        "timeout_rate": summary["timeout_rate"],
+        "latency_ms": latency,
+        "sustainable": not problems,
+        "problems": problems,
+    }
+
+
+async def find_capacity(
+    generator: LoadGenerator,
+    request_type,
+    slo_ms=200.0,
+    start_rate=10.0,
+    max_rate=10000.0,
+    step_duration=10.0,
+    precision=0.05,
+    max_error_rate=0.01,
+    min_throughput_ratio=0.95,
+) -> Dict[str, Any]:
+    """
+    Search the highest rate of one request type that is sustainable at the SLO.
+
+    Args:
+        generator: Started LoadGenerator whose connections are reused for every step
+        request_type: One of TEST_TYPES
+        slo_ms: Allowed p99 latency in milliseconds
+        start_rate: First rate tried, in requests per second
+        max_rate: The search stops at this rate
+        step_duration: Seconds every rate is held
+        precision: Bisection stops once the gap between good and bad rate is below this fraction
+        max_error_rate: Allowed share of failed and timed out requests
+        min_throughput_ratio: Share of the requests sent in a step that have to complete
+
+    Returns:
+        dict: The capacity curve as points sorted by rate and the highest sustainable rate, None if even start_rate is not
+    """
+    generator.test_type = request_type
+    points: List[Dict[str, Any]] = []
+
+    async def step(rate):
+        metrics = await generator.run_profile(LoadProfile.constant(rate, step_duration))
+        point = measure(metrics, rate, step_duration, slo_ms, max_error_rate, min_throughput_ratio)
+        points.append(point)
+        verdict = "✅ sustainable" if point["sustainable"] else "❌ " + ", ".join(point["problems"])
+        print(f"{request_type} at {rate:.1f}/s: {format_percentiles(point['latency_ms'])} - {verdict}")
+        return point["sustainable"]
+
+    good, bad = None, None
+    rate = start_rate
+    while rate <= max_rate:
+        if await step(rate):
+            good = rate
+            rate *= 2
+        else:
+            bad = rate
+            break
+    if good is not None and bad is None and good < max_rate:
+        # The last doubling overshot max_rate, try max_rate itself
+        if await step(max_rate):
+            good = max_rate
+        else:
+            bad = max_rate
+    if good is not None and bad is not None:
+        while (bad - good) / good > precision:
+            middle = (good + bad) / 2
+            if await step(middle):
+                good = middle
+            else:
+                bad = middle
+    return {
+        "request_type": request_type,
+        "slo_p99_ms": slo_ms,
+        "max_sustainable_rate": good,
+        "points": sorted(points, key=lambda point: point["offered_rate"]),
+    }
+
+
+def print_capacity_curve(curve):
+    print(f"\n📈 CAPACITY CURVE {curve['request_type']} (p99 SLO {curve['slo_p99_ms']:g} ms)")
+    print("-" * 30)
+    for point in curve["points"]:
+        latency = point["latency_ms"]
+        p99 = f"{latency['p99']:.1f} ms" if latency["p99"] is not None else "-"
+        mark = "✅" if point["sustainable"] else "❌"
+        print(f"{mark} offered {point['offered_rate']:>8.1f}/s  achieved {point['achieved_rate']:>8.1f}/s  p99 {p99}")
+    if curve["max_sustainable_rate"] is None:
+        print("No sustainable rate found")
+    else:
+        print(f"Max sustainable rate: {curve['max_sustainable_rate']:.1f} requests/s")
+
+
+async def run_capacity_search(generator, request_types, **search) -> Dict[str, Any]:
+    await generator.start()
+    try:
+        curves = {}
+        for request_type in request_types:
+            curves[request_type] = await find_capacity(generator, request_type, **search)
+            print_capacity_curve(curves[request_type])
+        return curves
+    finally:
+        await generator.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find the maximum sustainable MQTT request rate per request type")
+    parser.add_argument("--host", default=BROKER)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--tests", nargs="+", choices=TEST_TYPES, default=["uuid", "color", "time_range", "page"])
+    parser.add_argument("--slo-ms", type=float, default=200.0, help="Allowed p99 latency in milliseconds")
+    parser.add_argument("--start-rate", type=float, default=10.0)
+    parser.add_argument("--max-rate", type=float, default=10000.0)
+    parser.add_argument("--step-duration", type=float, default=10.0, help="Seconds every rate is held")
+    parser.add_argument("--precision", type=float, default=0.05)
+    parser.add_argument("--clients", type=int, default=1000, help="Number of logical clients")
+    parser.add_argument("--connections", type=int, default=4)
+    parser.add_argument("--arrival", choices=["constant", "poisson"], default="poisson")
+    parser.add_argument("--timeout", type=float, default=15.0)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    generator = LoadGenerator(
+        num_clients=args.clients,
+        connections=args.connections,
+        arrival=args.arrival,
+        timeout=args.timeout,
+        host=args.host,
+        port=args.port,
+        seed=args.seed,
+    )
+    curves = asyncio.run(run_capacity_search(
+        generator,
+        args.tests,
+        slo_ms=args.slo_ms,
+        start_rate=args.start_rate,
+        max_rate=args.max_rate,
+        step_duration=args.step_duration,
+        precision=args.precision,
+    ))
+
+    if not os.path.exists("logs"):
+        os.makedirs("logs")
+    capacity_file = f"logs/capacity_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(capacity_file, "w") as f:
+        json.dump(curves, f, indent=2)
+    print(f"\nCapacity curves saved to: {capacity_file}")
@@ -0,0 +1,597 @@
+"""
+Asyncio load generator for the Rust MQTT request handler.
+
+Instead of one thread and one paho client per user like mqtt_multi_client.py, thousands
+of logical clients share a few broker connections. Every logical client subscribes to
+its response topics rust/response/<client>/# and rust/uuid/<client>, requests go to
+rust/request. Requests arrive open-loop at a constant rate or as a Poisson process, so a
+slow server does not slow down the arrivals, and latency is measured from the intended
+send time. The rate can be constant, stepped or ramped, see LoadProfile. With warm connections (default) all
+connections are opened and subscribed before the first request, with --cold every
+request opens its own connection like mqtt_multi_client.py does.
+
+Responses carry no request ID, so a logical client has at most one request in flight per
+response topic. A request goes to the next logical client that is free on its topic, and
+late responses of timed out requests are dropped instead of completing a later request.
+
+Run against the local stand-in broker:
+    python mqtt_stand_in_broker.py --port 1884
+    python mqtt_load_generator.py --port 1884 --clients 5000 --connections 8 --rate 500 --duration 30
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import random
+import time
+from typing import Any, Dict, List, Tuple
+
+from mqtt_multi_client import (
+    BROKER,
+    PORT,
+    USERNAME,
+    PASSWORD,
+    REQUEST_TOPIC,
+    RESPONSE_TOPIC_BASE,
+    TEST_TYPES,
+    build_request,
+    generate_benchmark_report,
+    vary_params,
+)
+from mqtt_packets import (
+    CONNACK,
+    PINGREQ,
+    PUBACK,
+    PUBLISH,
+    SUBACK,
+    DISCONNECT,
+    connect_packet,
+    packet,
+    parse_publish,
+    publish_packet,
+    read_packet,
+    subscribe_packet,
+)
+
+UUID_TOPIC_BASE = "rust/uuid/"
+# Topic filters per SUBSCRIBE packet
+SUBSCRIBE_BATCH = 200
+
+
+class MqttConnection:
+    """One broker connection shared by many logical clients"""
+
+    def __init__(self, client_id, on_message, host=BROKER, port=PORT, username=USERNAME, password=PASSWORD, keepalive=60):
+        self.client_id = client_id
+        self.on_message = on_message
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.keepalive = keepalive
+        self.reader = None
+        self.writer = None
+        self.connected = False
+        self._packet_ids = itertools.count(1)
+        self._suback_waiters = {}
+        self._tasks = []
+
+    async def connect(self, timeout=10.0):
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), timeout
+        )
+        self.writer.write(connect_packet(self.client_id, self.username, self.password, self.keepalive))
+        header, body = await asyncio.wait_for(read_packet(self.reader), timeout)
+        if header & 0xF0 != CONNACK or len(body) < 2 or body[1] != 0:
+            self.writer.close()
+            raise ConnectionError(f"Broker refused {self.client_id} (Code: {body[1] if len(body) > 1 else '?'})")
+        self.connected = True
+        self._tasks = [
+            asyncio.create_task(self._read_loop()),
+            asyncio.create_task(self._keepalive_loop()),
+        ]
+
+    def _next_packet_id(self):
+        return next(self._packet_ids) % 65535 + 1
+
+    async def subscribe(self, topics, timeout=10.0):
+        """Subscribe to many topics, SUBSCRIBE_BATCH filters per packet"""
+        waiters = []
+        for i in range(0, len(topics), SUBSCRIBE_BATCH):
+            packet_id = self._next_packet_id()
+            waiter = asyncio.get_running_loop().create_future()
+            self._suback_waiters[packet_id] = waiter
+            waiters.append(waiter)
+            self.writer.write(subscribe_packet(packet_id, topics[i:i + SUBSCRIBE_BATCH]))
+        await self.writer.drain()
+        await asyncio.wait_for(asyncio.gather(*waiters), timeout)
+
+    def publish(self, topic, payload):
+        """Queue a QoS 0 publish without waiting for the socket"""
+        self.writer.write(publish_packet(topic, payload))
+
+    async def _read_loop(self):
+        try:
+            while True:
+                header, body = await read_packet(self.reader)
+                kind = header & 0xF0
+                if kind == PUBLISH:
+                    topic, payload, qos, packet_id = parse_publish(header, body)
+                    if qos == 1:
+                        self.writer.write(packet(PUBACK, packet_id.to_bytes(2, "big")))
+                    self.on_message(topic, payload)
+                elif kind == SUBACK:
+                    waiter = self._suback_waiters.pop(int.from_bytes(body[:2], "big"), None)
+                    if waiter and not waiter.done():
+                        waiter.set_result(body[2:])
+        except (asyncio.IncompleteReadError, ConnectionError, OSError):
+            pass
+        finally:
+            self.connected = False
+
+    async def _keepalive_loop(self):
+        while True:
+            await asyncio.sleep(self.keepalive / 2)
+            self.writer.write(packet(PINGREQ))
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self.writer:
+            try:
+                if self.connected:
+                    self.writer.write(packet(DISCONNECT))
+                self.writer.close()
+                await self.writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+        self.connected = False
+
+
+class Request:
+    """
+    One request in flight, its metrics match MqttClient.get_metrics.
+
+    Latencies are measured from the time the schedule intended to send the request, not from
+    the time it was actually sent. When the generator falls behind, the time a request waited
+    to be sent counts as latency, as it would for a real client (no coordinated omission).
+    """
+
+    __slots__ = (
+        "client_id", "request_type", "intended_time", "start_time", "first_response_time", "end_time",
+        "pages", "total_pages", "is_paginated", "completed", "timed_out", "failed", "stage", "timer",
+    )
+
+    def __init__(self, client_id, request_type, intended_time=None, stage=0):
+        self.client_id = client_id
+        self.request_type = request_type
+        self.intended_time = intended_time
+        self.stage = stage
+        self.start_time = None
+        self.first_response_time = None
+        self.end_time = None
+        self.pages = 0
+        self.total_pages = None
+        self.is_paginated = False
+        self.completed = False
+        self.timed_out = False
+        self.failed = False
+        self.timer = None
+
+    def get_metrics(self) -> Dict[str, Any]:
+        intended_time = self.intended_time or self.start_time
+        metrics = {
+            "client_id": self.client_id,
+            "request_type": self.request_type,
+            "stage": self.stage,
+            "intended_time": intended_time,
+            "start_time": self.start_time,
+            "first_response_time": self.first_response_time,
+            "end_time": self.end_time,
+            "is_paginated": self.is_paginated,
+            "total_pages": self.pages,
+            "completed": self.completed,
+            "timed_out": self.timed_out,
+            "failed": self.failed,
+        }
+        if self.start_time and intended_time:
+            metrics["send_delay"] = self.start_time - intended_time
+        if self.first_response_time and intended_time:
+            metrics["first_response_latency"] = self.first_response_time - intended_time
+        if self.end_time and intended_time:
+            metrics["total_duration"] = self.end_time - intended_time
+        if self.end_time and self.start_time:
+            metrics["service_time"] = self.end_time - self.start_time
+        return metrics
+
+
+def split_response_topic(topic):
+    """Returns the client ID, the response suffix and the page kind ("page", "summary" or None) of a response topic"""
+    if topic.startswith(UUID_TOPIC_BASE):
+        return topic[len(UUID_TOPIC_BASE):], "uuid", None
+    if not topic.startswith(RESPONSE_TOPIC_BASE):
+        return None, None, None
+    client_id, _, suffix = topic[len(RESPONSE_TOPIC_BASE):].partition("/")
+    base, separator, _ = suffix.rpartition("/page/")
+    if separator:
+        return client_id, base, "page"
+    if suffix.endswith("/summary"):
+        return client_id, suffix[:-len("/summary")], "summary"
+    return client_id, suffix, None
+
+
+class LoadProfile:
+    """
+    Request rate over time as consecutive stages, each ramping linearly from a start to an end rate.
+    A constant load is one stage, a step load several stages with a fixed rate each.
+    """
+
+    def __init__(self, stages):
+        """
+        Args:
+            stages: (start rate, end rate, seconds) per stage, rates in requests per second
+        """
+        self.stages = [(float(start), float(end), float(seconds)) for start, end, seconds in stages]
+
+    @classmethod
+    def constant(cls, rate, duration):
+        return cls([(rate, rate, duration)])
+
+    @classmethod
+    def steps(cls, rates, step_duration):
+        return cls([(rate, rate, step_duration) for rate in rates])
+
+    @classmethod
+    def ramp(cls, start_rate, end_rate, duration):
+        return cls([(start_rate, end_rate, duration)])
+
+    @property
+    def duration(self):
+        return sum(seconds for _, _, seconds in self.stages)
+
+    def describe(self):
+        return ", ".join(
+            f"{start:g}/s for {seconds:g} s" if start == end else f"{start:g} to {end:g}/s over {seconds:g} s"
+            for start, end, seconds in self.stages
+        )
+
+    def schedule(self, arrival, rng):
+        """
+        Yields the intended send time in seconds since the start and the stage of every request.
+
+        Args:
+            arrival: "constant" for fixed gaps, "poisson" for exponential gaps at the current rate
+            rng: random.Random for the Poisson gaps
+        """
+        stage_start = 0.0
+        for stage, (start_rate, end_rate, seconds) in enumerate(self.stages):
+            # With the rate start_rate + slope * t, start_rate * t + slope * t^2 / 2 requests are
+            # due by t. Each request is sent when that count passes the next target, which grows
+            # by 1 per request for constant gaps and by an exponential draw for Poisson arrivals.
+            slope = (end_rate - start_rate) / seconds if seconds else 0.0
+            total = start_rate * seconds + slope * seconds ** 2 / 2
+            target = 0.0 if arrival == "constant" else rng.expovariate(1.0)
+            while target < total:
+                if slope:
+                    t = (math.sqrt(start_rate ** 2 + 2 * slope * target) - start_rate) / slope
+                else:
+                    t = target / start_rate
+                yield stage_start + t, stage
+                target += 1.0 if arrival == "constant" else rng.expovariate(1.0)
+            stage_start += seconds
+
+
+class LoadGenerator:
+    """Sends requests of many logical clients open-loop over a few broker connections"""
+
+    def __init__(
+        self,
+        num_clients=1000,
+        connections=4,
+        rate=100.0,
+        duration=10.0,
+        arrival="poisson",
+        test_type=None,
+        timeout=15.0,
+        warm=True,
+        host=BROKER,
+        port=PORT,
+        seed=None,
+        profile=None,
+    ):
+        """
+        Args:
+            num_clients: Number of logical clients, each with its own response topics
+            connections: Number of broker connections the logical clients are spread over
+            rate: Requests per second
+            duration: Seconds during which requests are sent
+            arrival: "constant" for fixed gaps between requests, "poisson" for exponential gaps
+            test_type: Request type of all requests, random per request if None
+            timeout: Seconds after which a request without complete response counts as timed out
+            warm: Open and subscribe all connections before the first request, otherwise one connection per request
+            profile: LoadProfile with changing rates, replaces rate and duration
+        """
+        if arrival not in ("constant", "poisson"):
+            raise ValueError(f"Unknown arrival process: {arrival}")
+        self.num_clients = num_clients
+        self.num_connections = max(1, min(connections, num_clients))
+        self.profile = profile or LoadProfile.constant(rate, duration)
+        self.arrival = arrival
+        self.test_type = test_type
+        self.timeout = timeout
+        self.warm = warm
+        self.host = host
+        self.port = port
+        self.random = random.Random(seed)
+        self.run_id = f"{self.random.getrandbits(32):08x}"
+        self.client_ids = [f"load-{self.run_id}-{i+1}" for i in range(num_clients)]
+        self.connections: List[MqttConnection] = []
+        # (client ID, response suffix) -> the one request in flight on that response topic. Responses
+        # carry no request ID, so a topic is only reused once its previous response is accounted for
+        self.in_flight: Dict[Tuple[str, str], Request] = {}
+        # Topics of timed out requests -> time after which they are reused even without a late response
+        self.stale: Dict[Tuple[str, str], float] = {}
+        self.dropped_responses = 0
+        self.no_free_client = 0
+        self.requests: List[Request] = []
+        self.send_lag = 0.0
+        self._idle = None
+        self._sent = 0
+
+    def client_topics(self, client_id):
+        return [f"{RESPONSE_TOPIC_BASE}{client_id}/#", f"{UUID_TOPIC_BASE}{client_id}"]
+
+    async def open_connections(self):
+        """Open the shared connections and subscribe every logical client on its connection"""
+        self.connections = [
+            MqttConnection(f"load-{self.run_id}-conn-{i+1}", self.on_message, self.host, self.port)
+            for i in range(self.num_connections)
+        ]
+        await asyncio.gather(*(connection.connect() for connection in self.connections))
+        await asyncio.gather(*(
+            connection.subscribe([
+                topic
+                for client_id in self.client_ids[i::self.num_connections]
+                for topic in self.client_topics(client_id)
+            ])
+            for i, connection in enumerate(self.connections)
+        ))
+        print(f"✅ {self.num_connections} connections subscribed for {self.num_clients} clients")
+
+    def on_message(self, topic, payload):
+        client_id, suffix, kind = split_response_topic(topic)
+        key = (client_id, suffix)
+        request = self.in_flight.get(key)
+        if request is None:
+            # Late response of a timed out request, the topic is free again once it is complete
+            if key in self.stale and kind != "page":
+                del self.stale[key]
+            self.dropped_responses += 1
+            return
+        now = time.time()
+        if request.first_response_time is None:
+            request.first_response_time = now
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            return
+        if kind == "page":
+            request.is_paginated = True
+            request.pages += 1
+            # Pages carry an estimate, the summary the actual count
+            if request.total_pages is None or request.pages < request.total_pages:
+                return
+        elif kind == "summary":
+            request.is_paginated = True
+            request.total_pages = message.get("total_pages", 0)
+            if request.pages < request.total_pages:
+                return
+        else:
+            if isinstance(message, dict):
+                request.is_paginated = "total_pages" in message and "page_content" in message
+                request.failed = message.get("status") == "error"
+        request.end_time = now
+        request.completed = True
+        self._finish(request)
+
+    def _finish(self, request):
+        del self.in_flight[(request.client_id, request.request_type)]
+        if request.timer:
+            request.timer.cancel()
+        if not self.in_flight and self._idle:
+            self._idle.set()
+
+    def _expire(self, request):
+        request.timed_out = True
+        request.timer = None
+        # Its response may still come and must not be taken for the next request on the topic
+        self.stale[(request.client_id, request.request_type)] = time.time() + self.timeout
+        self._finish(request)
+
+    def _is_free(self, key):
+        if key in self.in_flight:
+            return False
+        expires = self.stale.get(key)
+        if expires is None:
+            return True
+        if expires <= time.time():
+            del self.stale[key]
+            return True
+        return False
+
+    def _free_client(self, i, suffix):
+        """Index of the first logical client from the i-th on without a request in flight on the suffix"""
+        for n in range(self.num_clients):
+            index = (i + n) % self.num_clients
+            if self._is_free((self.client_ids[index], suffix)):
+                return index
+        return None
+
+    def _prepare(self, i, intended_time, stage):
+        request_type = self.test_type or self.random.choice(TEST_TYPES)
+        query_data, suffix = build_request(request_type, vary_params(request_type, i))
+        index = self._free_client(i, suffix)
+        if index is None:
+            # Every logical client is busy on this topic, sending would mix up the responses
+            self.no_free_client += 1
+            request = Request(self.client_ids[i % self.num_clients], suffix, intended_time, stage)
+            request.failed = True
+            return request, None, None
+        client_id = self.client_ids[index]
+        query_data["client_id"] = client_id
+        request = Request(client_id, suffix, intended_time, stage)
+        return request, json.dumps(query_data), index
+
+    def _track(self, request):
+        self.in_flight[(request.client_id, request.request_type)] = request
+        request.timer = asyncio.get_running_loop().call_later(self.timeout, self._expire, request)
+        self.requests.append(request)
+
+    def send(self, i, intended_time=None, stage=0):
+        """Send the i-th request on the connection of its logical client"""
+        request, payload, index = self._prepare(i, intended_time, stage)
+        if payload is None:
+            self.requests.append(request)
+            return
+        connection = self.connections[index % self.num_connections]
+        if not connection.connected:
+            request.failed = True
+            self.requests.append(request)
+            return
+        self._track(request)
+        request.start_time = time.time()
+        connection.publish(REQUEST_TOPIC, payload)
+
+    async def send_cold(self, i, intended_time=None, stage=0):
+        """Send the i-th request on a connection of its own that is closed after the response"""
+        request, payload, index = self._prepare(i, intended_time, stage)
+        if payload is None:
+            self.requests.append(request)
+            return
+        connection = MqttConnection(f"{request.client_id}-{i}", self.on_message, self.host, self.port)
+        try:
+            await connection.connect()
+            await connection.subscribe(self.client_topics(request.client_id))
+        except (OSError, asyncio.TimeoutError, ConnectionError):
+            request.failed = True
+            self.requests.append(request)
+            return
+        try:
+            self._track(request)
+            request.start_time = time.time()
+            connection.publish(REQUEST_TOPIC, payload)
+            while not (request.completed or request.timed_out):
+                await asyncio.sleep(0.05)
+        finally:
+            await connection.close()
+
+    async def start(self):
+        self._idle = asyncio.Event()
+        if self.warm:
+            await self.open_connections()
+
+    async def stop(self):
+        for connection in self.connections:
+            await connection.close()
+        self.connections = []
+
+    async def run_profile(self, profile=None) -> List[Dict[str, Any]]:
+        """
+        Send requests on the schedule of a load profile and wait for the outstanding responses.
+        Connections stay open, so several profiles can be run one after another.
+
+        Returns:
+            list: Metrics of the requests of this profile
+        """
+        profile = profile or self.profile
+        loop = asyncio.get_running_loop()
+        self.requests = []
+        self.send_lag = 0.0
+        self.dropped_responses = 0
+        self.no_free_client = 0
+        cold_tasks = set()
+        print(f"🚀 Sending {self.arrival} arrivals at {profile.describe()}...")
+        started = loop.time()
+        # Intended send times as wall clock time, like the response times
+        wall_clock_offset = time.time() - started
+        sent = 0
+        for offset, stage in profile.schedule(self.arrival, self.random):
+            due = started + offset
+            delay = due - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                # Behind schedule, send right away, the delay is counted in the latency
+                self.send_lag = max(self.send_lag, -delay)
+            intended_time = due + wall_clock_offset
+            if self.warm:
+                self.send(self._sent, intended_time, stage)
+            else:
+                task = asyncio.create_task(self.send_cold(self._sent, intended_time, stage))
+                cold_tasks.add(task)
+                task.add_done_callback(cold_tasks.discard)
+            self._sent += 1
+            sent += 1
+        if cold_tasks:
+            await asyncio.gather(*cold_tasks)
+        if self.in_flight:
+            self._idle.clear()
+            await asyncio.wait_for(self._idle.wait(), self.timeout + 1)
+        elapsed = loop.time() - started
+        completed = sum(1 for request in self.requests if request.completed)
+        print(f"📤 Sent {sent} requests in {profile.duration:g} s ({sent / profile.duration:.1f}/s), max send lag {self.send_lag * 1000:.1f} ms")
+        print(f"📥 Completed {completed} requests ({completed / elapsed:.1f}/s)")
+        if self.dropped_responses or self.no_free_client:
+            print(f"⚠️ Dropped {self.dropped_responses} late responses, {self.no_free_client} requests found no free client")
+        return [request.get_metrics() for request in self.requests]
+
+    async def run(self) -> List[Dict[str, Any]]:
+        """Open the connections, run the profile and close the connections"""
+        await self.start()
+        try:
+            return await self.run_profile()
+        finally:
+            await self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Asyncio MQTT load generator")
+    parser.add_argument("--host", default=BROKER)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--clients", type=int, default=1000, help="Number of logical clients")
+    parser.add_argument("--connections", type=int, default=4, help="Number of broker connections shared by the clients")
+    parser.add_argument("--rate", type=float, default=100.0, help="Requests per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds during which requests are sent, per step for --steps")
+    parser.add_argument("--steps", type=float, nargs="+", metavar="RATE", help="Step load: send at each rate for --duration seconds")
+    parser.add_argument("--ramp-to", type=float, metavar="RATE", help="Ramp linearly from --rate to this rate over --duration seconds")
+    parser.add_argument("--arrival", choices=["constant", "poisson"], default="poisson")
+    parser.add_argument("--test", choices=TEST_TYPES, help="Request type, random per request if not specified")
+    parser.add_argument("--timeout", type=float, default=15.0)
+    parser.add_argument("--cold", action="store_true", help="Open a new connection per request instead of warm shared connections")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    if args.steps:
+        profile = LoadProfile.steps(args.steps, args.duration)
+    elif args.ramp_to is not None:
+        profile = LoadProfile.ramp(args.rate, args.ramp_to, args.duration)
+    else:
+        profile = LoadProfile.constant(args.rate, args.duration)
+    generator = LoadGenerator(
+        num_clients=args.clients,
+        connections=args.connections,
+        rate=args.rate,
+        duration=args.duration,
+        arrival=args.arrival,
+        test_type=args.test,
+        timeout=args.timeout,
+        warm=not args.cold,
+        host=args.host,
+        port=args.port,
+        seed=args.seed,
+        profile=profile,
+    )
+    generate_benchmark_report(asyncio.run(generator.run()))
@@ -5,6 +5,7 @@ import uuid
 import threading
 import random
 import re
+import queue
 import argparse
 import os
 import logging
@@ -13,6 +14,8 @@ from concurrent.futures import ThreadPoolExecutor
 from collections import defaultdict
 from typing import Dict, List, Any, Optional, Tuple
 
+from latency_histogram import LatencyHistogram
+
 # Configuration
 BROKER = "localhost"
 PORT = 1883
@@ -22,6 +25,46 @@ REQUEST_TOPIC = "rust/request"
 RESPONSE_TOPIC_BASE = "rust/response/"
 
 
+PAGE_TOPIC_PATTERN = re.compile(r"(.*)/page/(\d+)")
+
+
+class PageReassembler:
+    """
+    Releases the items of a paginated response in page order while the pages arrive.
+
+    Pages that arrive ahead of a missing page are held until the gap is filled and
+    duplicate pages are dropped, so only the pages after a gap are kept in memory.
+    """
+
+    def __init__(self, on_item):
+        self.on_item = on_item
+        self.next_page = 1
+        self.pending = {}
+        # Pages carry an estimate, the summary the actual number of pages
+        self.total_pages = None
+        self.estimated_pages = 0
+        self.received_pages = 0
+        self.duplicate_pages = 0
+        self.complete = False
+
+    def add_page(self, page_num, items) -> bool:
+        """Add a page and release every item that is in order now, returns False for a duplicate"""
+        if page_num < self.next_page or page_num in self.pending:
+            self.duplicate_pages += 1
+            return False
+        self.pending[page_num] = items
+        self.received_pages += 1
+        while self.next_page in self.pending:
+            for item in self.pending.pop(self.next_page):
+                self.on_item(item)
+            self.next_page += 1
+        return True
+
+    @property
+    def all_pages_released(self) -> bool:
+        return self.total_pages is not None and self.next_page > self.total_pages
+
+
 class MqttClient:
     def __init__(self, client_name=None):
         self.client_id = client_name or f"python-client-{str(uuid.uuid4())[:8]}"
@@ -29,6 +72,7 @@ class MqttClient:
         self.response_received = threading.Event()
         self.start_time = None
         self.first_response_time = None
+        self.first_item_time = None
         self.end_time = None  # To track total response time
 
         self.paginated_messages = {}
@@ -38,9 +82,17 @@ class MqttClient:
         self.client.username_pw_set(USERNAME, PASSWORD)
         self.lock = threading.Lock()
 
+        # Items of paginated responses go to the item sink as soon as they are in order
+        self.item_sink = None
+        self.spill_path = None
+        self.spill_file = None
+        self.collected_items = None
+        self.item_count = 0
+
         # Performance metrics
         self.is_paginated = False
         self.total_pages_received = 0
+        self.duplicate_pages = 0
         self.request_completed = False
         self.request_timed_out = False
         self.request_type = None
@@ -88,13 +140,8 @@ class MqttClient:
             payload = json.loads(msg.payload.decode())
 
             # Check for paginated message format
-            page_pattern = re.compile(r"(.*)/page/(\d+)")
-            page_match = page_pattern.match(msg.topic)
+            page_match = PAGE_TOPIC_PATTERN.match(msg.topic)
             if page_match:
-                with self.lock:
-                    log_msg = f"Client {self.client_id} received paginated message part on {msg.topic}"
-                    print(f"\n📄 {log_msg}")
-                    self.logger.info(log_msg)
                 self.handle_paginated_message(page_match, payload)
                 self.is_paginated = True
                 return
@@ -128,11 +175,9 @@ class MqttClient:
                 log_msg = f"Client {self.client_id} received response on {msg.topic}"
                 print(f"\n📨 {log_msg}")
                 self.logger.info(log_msg)
-
-                payload_str = json.dumps(payload)
-                self.logger.info(f"Payload preview: {payload_str[:200]}...")
-                print(json.dumps(payload, indent=2))
+                self.logger.info(f"Payload preview: {msg.payload[:200].decode(errors='replace')}...")
             self.received_response = payload
+            self.first_item_time = self.first_response_time
             self.end_time = time.time()
             self.request_completed = True
 
@@ -150,7 +195,7 @@ class MqttClient:
         except json.JSONDecodeError:
             with self.lock:
                 log_msg = (
-                    f"Client {self.client_id} received invalid JSON: {msg.payload}"
+                    f"Client {self.client_id} received invalid JSON: {msg.payload[:200]}"
                 )
                 print(f"⚠️ {log_msg}")
                 self.logger.error(log_msg)
@@ -167,10 +212,30 @@ class MqttClient:
             self.logger.info(log_msg)
 
         self.received_response = payload
+        self.first_item_time = self.first_response_time
         self.end_time = time.time()
         self.request_completed = True
         self.response_received.set()
 
+    def emit_item(self, item):
+        """Pass one item of a paginated response on in page order"""
+        if self.first_item_time is None:
+            self.first_item_time = time.time()
+            if isinstance(item, (list, tuple)) and len(item) == 2 and isinstance(item[1], dict):
+                # Rust sends (index, item) pairs
+                first = item[1]
+            else:
+                first = item
+            if isinstance(first, dict) and first.get("status") == "error":
+                self.request_failed = True
+        self.item_count += 1
+        if self.spill_file is not None:
+            self.spill_file.write(json.dumps(item, separators=(",", ":")) + "\n")
+        if self.collected_items is not None:
+            self.collected_items.append(item)
+        if self.item_sink is not None:
+            self.item_sink(item)
+
     def handle_paginated_message(self, match, payload):
         base_topic = match.group(1)
         page_num = int(match.group(2))
@@ -178,7 +243,7 @@ class MqttClient:
         request_id = payload.get("request_id")
         if not request_id:
             with self.lock:
-                log_msg = f"Paginated message missing request_id: {payload}"
+                log_msg = f"Paginated message missing request_id on {match.group(0)}"
                 print(f"⚠️ {log_msg}")
                 self.logger.warning(log_msg)
             return
@@ -186,35 +251,21 @@ class MqttClient:
         message_id = f"{base_topic}_{request_id}"
 
         if message_id not in self.paginated_messages:
-            self.paginated_messages[message_id] = {
-                "total_pages": payload.get("total_pages", 0),
-                "pages": {},
-                "received_pages": 0,
-                "complete": False,
-            }
-
-        if self.paginated_messages[message_id]["total_pages"] == 0:
-            self.paginated_messages[message_id]["total_pages"] = payload.get(
-                "total_pages", 0
-            )
+            self.paginated_messages[message_id] = PageReassembler(self.emit_item)
+        pages = self.paginated_messages[message_id]
+        pages.estimated_pages = max(pages.estimated_pages, payload.get("total_pages", 0))
 
-        self.paginated_messages[message_id]["pages"][page_num] = payload.get("data", [])
-        self.paginated_messages[message_id]["received_pages"] += 1
+        if not pages.add_page(page_num, payload.get("data", [])):
+            self.duplicate_pages += 1
+            self.logger.info(f"Dropped duplicate page {page_num} for {message_id}")
+            return
         self.total_pages_received += 1
+        self.logger.info(
+            f"Received page {page_num}/{pages.total_pages or pages.estimated_pages} for {message_id}, "
+            f"{pages.next_page - 1} pages released"
+        )
 
-        with self.lock:
-            log_msg = f"Received page {page_num}/{self.paginated_messages[message_id]['total_pages']} for {message_id}"
-            print(f"📄 {log_msg}")
-            self.logger.info(log_msg)
-
-        if (
-            self.paginated_messages[message_id]["received_pages"]
-            == self.paginated_messages[message_id]["total_pages"]
-        ):
-            with self.lock:
-                log_msg = f"All pages received for {message_id}, reassembling..."
-                print(f"🔄 {log_msg}")
-                self.logger.info(log_msg)
+        if pages.all_pages_released:
             self.reassemble_paginated_message(message_id)
 
     def handle_pagination_summary(self, topic, payload):
@@ -236,120 +287,120 @@ class MqttClient:
             print(f"📋 {log_msg}")
             self.logger.info(log_msg)
 
-        if (
-            message_id in self.paginated_messages
-            and self.paginated_messages[message_id]["received_pages"] == total_pages
-        ):
-            with self.lock:
-                log_msg = (
-                    f"All pages already received for {message_id}, reassembling..."
-                )
-                print(f"🔄 {log_msg}")
-                self.logger.info(log_msg)
+        if message_id not in self.paginated_messages:
+            self.paginated_messages[message_id] = PageReassembler(self.emit_item)
+        self.paginated_messages[message_id].total_pages = total_pages
+
+        if self.paginated_messages[message_id].all_pages_released:
             self.reassemble_paginated_message(message_id)
 
     def reassemble_paginated_message(self, message_id):
-        if not self.paginated_messages[message_id]["complete"]:
-            data = self.paginated_messages[message_id]
+        """Complete a paginated response once all of its pages were released in order"""
+        pages = self.paginated_messages[message_id]
+        if pages.complete:
+            return
+        pages.complete = True
 
-            all_items = []
-            for page_num in sorted(data["pages"].keys()):
-                all_items.extend(data["pages"][page_num])
+        with self.lock:
+            log_msg = f"Streamed {self.item_count} items from {pages.received_pages} pages"
+            if pages.duplicate_pages:
+                log_msg += f", {pages.duplicate_pages} duplicate pages dropped"
+            print(f"✅ {log_msg}")
+            self.logger.info(log_msg)
 
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
             with self.lock:
-                log_msg = f"Reassembled {len(all_items)} items from {len(data['pages'])} pages"
-                print(f"✅ {log_msg}")
+                log_msg = f"Paginated response saved to {self.spill_path}"
+                print(f"💾 {log_msg}")
                 self.logger.info(log_msg)
 
-            self.paginated_messages[message_id]["complete"] = True
-
-            self.received_response = all_items
-            self.end_time = time.time()
-            self.request_completed = True
-
-            if (
-                isinstance(self.received_response, dict)
-                and self.received_response.get("status") == "error"
-            ):
-                self.request_failed = True
-                with self.lock:
-                    log_msg = f"Client {self.client_id} paginated request marked as FAILED due to status: error"
-                    print(f"❌ {log_msg}")
-                    self.logger.warning(log_msg)
-
-            elif (
-                isinstance(all_items, list)
-                and all_items
-                and isinstance(all_items[0], dict)
-                and all_items[0].get("status") == "error"
-            ):
-                self.request_failed = True
-                with self.lock:
-                    log_msg = f"Client {self.client_id} paginated request marked as FAILED due to status: error in first item"
-                    print(f"❌ {log_msg}")
-                    self.logger.warning(log_msg)
-
-            self.response_received.set()
-
-            filename = f"paginated_response_{self.client_id}_{int(time.time())}.json"
-            with open(filename, "w") as f:
-                json.dump(all_items, f, indent=2)
+        self.received_response = self.collected_items
+        self.end_time = time.time()
+        self.request_completed = True
 
+        if self.request_failed:
             with self.lock:
-                log_msg = f"Paginated response saved to {filename}"
-                print(f"💾 {log_msg}")
-                self.logger.info(log_msg)
+                log_msg = f"Client {self.client_id} paginated request marked as FAILED due to status: error in first item"
+                print(f"❌ {log_msg}")
+                self.logger.warning(log_msg)
 
-    def send_request(self, query_data, response_suffix, timeout=15):
+        self.response_received.set()
+
+    def begin_request(self, query_data, response_suffix, spill_path=None):
+        """Reset the request state, connect, subscribe to the response topics and publish the request"""
         self.response_received.clear()
         self.received_response = None
         self.paginated_messages = {}
         self.first_response_time = None
+        self.first_item_time = None
         self.end_time = None
         self.is_paginated = False
         self.total_pages_received = 0
+        self.duplicate_pages = 0
+        self.item_count = 0
         self.request_completed = False
         self.request_timed_out = False
         self.request_type = response_suffix
         self.request_failed = False
+        self.spill_path = spill_path
+        self.spill_file = open(spill_path, "w") if spill_path else None
 
-        try:
-            self.client.connect(BROKER, PORT)
-            self.client.loop_start()
+        self.client.connect(BROKER, PORT)
+        self.client.loop_start()
 
-            if "request" in query_data and query_data["request"] == "uuid":
-                response_topic = f"rust/uuid/{self.client_id}"
-            else:
-                response_topic = (
-                    f"{RESPONSE_TOPIC_BASE}{self.client_id}/{response_suffix}"
-                )
+        if "request" in query_data and query_data["request"] == "uuid":
+            response_topic = f"rust/uuid/{self.client_id}"
+        else:
+            response_topic = (
+                f"{RESPONSE_TOPIC_BASE}{self.client_id}/{response_suffix}"
+            )
 
-            page_wildcard = f"{response_topic}/page/#"
-            summary_topic = f"{response_topic}/summary"
+        page_wildcard = f"{response_topic}/page/#"
+        summary_topic = f"{response_topic}/summary"
 
-            self.client.subscribe(response_topic)
-            self.client.subscribe(page_wildcard)
-            self.client.subscribe(summary_topic)
+        self.client.subscribe(response_topic)
+        self.client.subscribe(page_wildcard)
+        self.client.subscribe(summary_topic)
 
-            with self.lock:
-                self.logger.info(f"Subscribed to: {response_topic}")
-                self.logger.info(f"Subscribed to: {page_wildcard}")
-                self.logger.info(f"Subscribed to: {summary_topic}")
-                print(f"🔔 Client {self.client_id} subscribed to: {response_topic}")
-                print(f"🔔 Client {self.client_id} subscribed to: {page_wildcard}")
-                print(f"🔔 Client {self.client_id} subscribed to: {summary_topic}")
+        with self.lock:
+            self.logger.info(f"Subscribed to: {response_topic}")
+            self.logger.info(f"Subscribed to: {page_wildcard}")
+            self.logger.info(f"Subscribed to: {summary_topic}")
+            print(f"🔔 Client {self.client_id} subscribed to: {response_topic}")
+            print(f"🔔 Client {self.client_id} subscribed to: {page_wildcard}")
+            print(f"🔔 Client {self.client_id} subscribed to: {summary_topic}")
 
-            query_data["client_id"] = self.client_id
+        query_data["client_id"] = self.client_id
 
-            self.start_time = time.time()
-            self.client.publish(REQUEST_TOPIC, json.dumps(query_data))
+        self.start_time = time.time()
+        self.client.publish(REQUEST_TOPIC, json.dumps(query_data))
 
-            with self.lock:
-                log_msg = (
-                    f"Client {self.client_id} sent request: {json.dumps(query_data)}"
-                )
-                print(f"📤 {log_msg}")
-                self.logger.info(log_msg)
+        with self.lock:
+            log_msg = (
+                f"Client {self.client_id} sent request: {json.dumps(query_data)}"
+            )
+            print(f"📤 {log_msg}")
+            self.logger.info(log_msg)
+
+    def end_request(self):
+        self.client.loop_stop()
+        self.client.disconnect()
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
+
+    def send_request(self, query_data, response_suffix, timeout=15, spill_path=None):
+        """
+        Send a request and wait for the complete response.
+        Paginated responses are returned as one list of items, which is also written
+        to spill_path as one compact JSON line per item if given.
+        """
+        self.item_sink = None
+        self.collected_items = []
+        try:
+            self.begin_request(query_data, response_suffix, spill_path)
 
             timeout = 30 if "all" in response_suffix else timeout
             result = self.response_received.wait(timeout)
@@ -383,8 +434,60 @@ class MqttClient:
             return self.received_response
 
         finally:
-            self.client.loop_stop()
-            self.client.disconnect()
+            self.end_request()
+            self.collected_items = None
+
+    def stream_items(self, query_data, response_suffix, timeout=15, spill_path=None):
+        """
+        Send a request and yield the items of the response in page order while the pages arrive.
+
+        Items are not collected, so memory stays flat however large the response is, unless
+        the consumer keeps them. spill_path optionally receives one compact JSON line per item.
+        timeout is the longest wait for the next item. Non-paginated responses yield the
+        items of a list response, the page_content of a page response or the response itself.
+        """
+        items = queue.Queue()
+        done = object()
+        self.collected_items = None
+        self.item_sink = items.put
+        self.response_received.clear()
+        watcher = None
+        try:
+            self.begin_request(query_data, response_suffix, spill_path)
+
+            def wait_for_completion():
+                self.response_received.wait()
+                items.put(done)
+
+            watcher = threading.Thread(target=wait_for_completion, daemon=True)
+            watcher.start()
+            while True:
+                try:
+                    item = items.get(timeout=timeout)
+                except queue.Empty:
+                    self.request_timed_out = True
+                    with self.lock:
+                        log_msg = f"Client {self.client_id} timed out after {timeout} seconds without an item"
+                        print(f"⌛ {log_msg}")
+                        self.logger.warning(log_msg)
+                    return
+                if item is done:
+                    break
+                yield item
+
+            if not self.is_paginated or self.received_response is not None:
+                response = self.received_response
+                if isinstance(response, dict) and "page_content" in response:
+                    response = response["page_content"]
+                if isinstance(response, list):
+                    yield from response
+                elif response is not None:
+                    yield response
+        finally:
+            self.item_sink = None
+            self.end_request()
+            # Let the watcher thread end if the consumer stopped early
+            self.response_received.set()
 
     def get_metrics(self) -> Dict[str, Any]:
         """Get performance metrics for this client"""
@@ -393,9 +496,12 @@ class MqttClient:
             "request_type": self.request_type,
             "start_time": self.start_time,
             "first_response_time": self.first_response_time,
+            "first_item_time": self.first_item_time,
             "end_time": self.end_time,
             "is_paginated": self.is_paginated,
             "total_pages": self.total_pages_received,
+            "duplicate_pages": self.duplicate_pages,
+            "items": self.item_count,
             "completed": self.request_completed,
             "timed_out": self.request_timed_out,
             "failed": self.request_failed,
@@ -406,25 +512,43 @@ class MqttClient:
                 self.first_response_time - self.start_time
             )
 
+        if self.first_item_time and self.start_time:
+            metrics["time_to_first_item"] = self.first_item_time - self.start_time
+
         if self.end_time and self.start_time:
             metrics["total_duration"] = self.end_time - self.start_time
 
         return metrics
 
 
-def run_test_client(client_name, request_type, params):
-    """Run a single test client with the given parameters"""
-    client = MqttClient(client_name)
-
-    request_handlers = {
-        "uuid": lambda: client.send_request(
+TEST_TYPES = [
+    "uuid",
+    "all",
+    "color",
+    "time_range",
+    "temperature_humidity",
+    "timestamp",
+    "energy_cost",
+    "energy_consume",
+    "newest",
+    "newest_sensor",
+    "newest_energy",
+    "relation",
+    "page",
+]
+
+
+def build_request(request_type, params) -> Optional[Tuple[Dict[str, Any], str]]:
+    """Build the request payload and the response topic suffix of a request type"""
+    request_builders = {
+        "uuid": lambda: (
             {"request": "uuid", "data": [{"uuid": params.get("uuid", 1)}]}, "uuid"
         ),
-        "all": lambda: client.send_request({"request": "all"}, "all"),
-        "color": lambda: client.send_request(
+        "all": lambda: ({"request": "all"}, "all"),
+        "color": lambda: (
             {"request": "color", "data": params.get("color", "red")}, "color"
         ),
-        "time_range": lambda: client.send_request(
+        "time_range": lambda: (
             {
                 "request": "time_range",
                 "start": params.get("start", "2025-01-01T00:00:00Z"),
@@ -432,7 +556,7 @@ def run_test_client(client_name, request_type, params):
             },
             "time_range",
         ),
-        "temperature_humidity": lambda: client.send_request(
+        "temperature_humidity": lambda: (
             {
                 "request": "temperature_humidity",
                 "temperature": params.get("temperature", 22.5),
@@ -440,51 +564,86 @@ def run_test_client(client_name, request_type, params):
             },
             "temperature_humidity",
         ),
-        "timestamp": lambda: client.send_request(
+        "timestamp": lambda: (
             {
                 "request": "timestamp",
                 "data": params.get("timestamp", "2025-02-15T12:30:00Z"),
             },
             "timestamp",
         ),
-        "energy_cost": lambda: client.send_request(
+        "energy_cost": lambda: (
             {"request": "id_energy_cost", "data": params.get("cost", 0.25)},
             "energy_cost",
         ),
-        "energy_consume": lambda: client.send_request(
+        "energy_consume": lambda: (
             {"request": "id_energy_consume", "data": params.get("consume", 150.0)},
             "energy_consume",
         ),
-        "newest": lambda: client.send_request({"request": "newestids"}, "newestids"),
-        "newest_sensor": lambda: client.send_request(
+        "newest": lambda: ({"request": "newestids"}, "newestids"),
+        "newest_sensor": lambda: (
             {"request": "newestsensordata"}, "newestsensordata"
         ),
-        "newest_energy": lambda: client.send_request(
+        "newest_energy": lambda: (
             {"request": "newestenergydata"}, "newestenergydata"
         ),
-        "relation": lambda: client.send_request({"request": "relation"}, "relation"),
-        "page": lambda: client.send_request(
+        "relation": lambda: ({"request": "relation"}, "relation"),
+        "page": lambda: (
             {"request": "page", "data": params.get("page", 1)}, "page"
         ),
-        "add_robot": lambda: client.send_request(
+        "add_robot": lambda: (
             {"request": "addrobotdata", "data": params.get("data", [])}, "add/robotdata"
         ),
-        "add_sensor": lambda: client.send_request(
+        "add_sensor": lambda: (
             {"request": "addsensordata", "data": params.get("data", [])},
             "add/sensordata",
         ),
-        "add_energy": lambda: client.send_request(
+        "add_energy": lambda: (
             {"request": "addenergydata", "data": params.get("data", [])},
             "add/energydata",
         ),
-        "delete": lambda: client.send_request(
+        "delete": lambda: (
             {"request": "delete", "data": params.get("ids", [])}, "delete"
         ),
     }
 
-    # Execute the appropriate handler
-    if request_type in request_handlers:
-        return request_handlers[request_type]()
+    if request_type in request_builders:
+        return request_builders[request_type]()
+
+    return None
+
+
+def vary_params(request_type, i) -> Dict[str, Any]:
+    """Prepare parameters with slight variations for the i-th request"""
+    params = {}
+    if request_type == "uuid":
+        params["uuid"] = i + 1
+    elif request_type == "color":
+        colors = ["red", "green", "blue", "yellow", "purple"]
+        params["color"] = colors[i % len(colors)]
+    elif request_type == "time_range":
+        params["start"] = f"2025-0{(i % 12)+1}-01T00:00:00Z"
+        params["end"] = f"2025-0{((i+1) % 12)+1}-01T00:00:00Z"
+    elif request_type == "temperature_humidity":
+        params["temperature"] = 20.0 + i
+        params["humidity"] = 40.0 + i
+    elif request_type == "timestamp":
+        params["timestamp"] = f"2025-02-{(15+i) % 28}T12:30:00Z"
+    elif request_type == "energy_cost":
+        params["cost"] = 0.20 + (i * 0.05)
+    elif request_type == "energy_consume":
+        params["consume"] = 100.0 + (i * 50.0)
+    elif request_type == "page":
+        params["page"] = (i % 5) + 1  # Pages 1-5
+    return params
+
+
+def run_test_client(client_name, request_type, params):
+    """Run a single test client with the given parameters"""
+    client = MqttClient(client_name)
+
+    request = build_request(request_type, params)
+    if request is not None:
+        return client.send_request(*request)
 
     return None
 
@@ -495,75 +654,9 @@ def run_test_client_with_metrics(
     """Run a test client and return both result and metrics"""
     client = MqttClient(client_name)
 
-    request_handlers = {
-        "uuid": lambda: client.send_request(
-            {"request": "uuid", "data": [{"uuid": params.get("uuid", 1)}]}, "uuid"
-        ),
-        "all": lambda: client.send_request({"request": "all"}, "all"),
-        "color": lambda: client.send_request(
-            {"request": "color", "data": params.get("color", "red")}, "color"
-        ),
-        "time_range": lambda: client.send_request(
-            {
-                "request": "time_range",
-                "start": params.get("start", "2025-01-01T00:00:00Z"),
-                "end": params.get("end", "2025-03-01T00:00:00Z"),
-            },
-            "time_range",
-        ),
-        "temperature_humidity": lambda: client.send_request(
-            {
-                "request": "temperature_humidity",
-                "temperature": params.get("temperature", 22.5),
-                "humidity": params.get("humidity", 45.0),
-            },
-            "temperature_humidity",
-        ),
-        "timestamp": lambda: client.send_request(
-            {
-                "request": "timestamp",
-                "data": params.get("timestamp", "2025-02-15T12:30:00Z"),
-            },
-            "timestamp",
-        ),
-        "energy_cost": lambda: client.send_request(
-            {"request": "id_energy_cost", "data": params.get("cost", 0.25)},
-            "energy_cost",
-        ),
-        "energy_consume": lambda: client.send_request(
-            {"request": "id_energy_consume", "data": params.get("consume", 150.0)},
-            "energy_consume",
-        ),
-        "newest": lambda: client.send_request({"request": "newestids"}, "newestids"),
-        "newest_sensor": lambda: client.send_request(
-            {"request": "newestsensordata"}, "newestsensordata"
-        ),
-        "newest_energy": lambda: client.send_request(
-            {"request": "newestenergydata"}, "newestenergydata"
-        ),
-        "relation": lambda: client.send_request({"request": "relation"}, "relation"),
-        "page": lambda: client.send_request(
-            {"request": "page", "data": params.get("page", 1)}, "page"
-        ),
-        "add_robot": lambda: client.send_request(
-            {"request": "addrobotdata", "data": params.get("data", [])}, "add/robotdata"
-        ),
-        "add_sensor": lambda: client.send_request(
-            {"request": "addsensordata", "data": params.get("data", [])},
-            "add/sensordata",
-        ),
-        "add_energy": lambda: client.send_request(
-            {"request": "addenergydata", "data": params.get("data", [])},
-            "add/energydata",
-        ),
-        "delete": lambda: client.send_request(
-            {"request": "delete", "data": params.get("ids", [])}, "delete"
-        ),
-    }
-
-    # Execute the appropriate handler
-    if request_type in request_handlers:
-        result = request_handlers[request_type]()
+    request = build_request(request_type, params)
+    if request is not None:
+        result = client.send_request(*request)
         return result, client.get_metrics()
 
     client.logger.error(f"Unknown request type: {request_type}")
@@ -572,23 +665,7 @@ def run_test_client_with_metrics(
 
 def run_multiple_clients(num_clients=5, test_type=None):
     """Run multiple clients simultaneously"""
-    test_types = [
-        "uuid",
-        "all",
-        "color",
-        "time_range",
-        "temperature_humidity",
-        "timestamp",
-        "energy_cost",
-        "energy_consume",
-        "newest",
-        "newest_sensor",
-        "newest_energy",
-        "relation",
-        "page",
-    ]
-
-    if test_type and test_type not in test_types:
+    if test_type and test_type not in TEST_TYPES:
         print(f"Invalid test type: {test_type}")
         return
 
@@ -598,31 +675,8 @@ def run_multiple_clients(num_clients=5, test_type=None):
     for i in range(num_clients):
         client_name = f"test-client-{i+1}"
 
-        selected_test = test_type or random.choice(test_types)
-
-        # Prepare parameters with slight variations
-        params = {}
-        if selected_test == "uuid":
-            params["uuid"] = i + 1
-        elif selected_test == "color":
-            colors = ["red", "green", "blue", "yellow", "purple"]
-            params["color"] = colors[i % len(colors)]
-        elif selected_test == "time_range":
-            params["start"] = f"2025-0{(i % 12)+1}-01T00:00:00Z"
-            params["end"] = f"2025-0{((i+1) % 12)+1}-01T00:00:00Z"
-        elif selected_test == "temperature_humidity":
-            params["temperature"] = 20.0 + i
-            params["humidity"] = 40.0 + i
-        elif selected_test == "timestamp":
-            params["timestamp"] = f"2025-02-{(15+i) % 28}T12:30:00Z"
-        elif selected_test == "energy_cost":
-            params["cost"] = 0.20 + (i * 0.05)
-        elif selected_test == "energy_consume":
-            params["consume"] = 100.0 + (i * 50.0)
-        elif selected_test == "page":
-            params["page"] = (i % 5) + 1  # Pages 1-5
-
-        tasks.append((client_name, selected_test, params))
+        selected_test = test_type or random.choice(TEST_TYPES)
+        tasks.append((client_name, selected_test, vary_params(selected_test, i)))
 
     print(f"🚀 Starting {num_clients} clients simultaneously...")
 
@@ -641,8 +695,124 @@ def run_multiple_clients(num_clients=5, test_type=None):
     generate_benchmark_report(all_metrics)
 
 
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def summarize_metrics(metrics) -> Dict[str, Any]:
+    """Summarize request metrics into counts, rates and latency histograms"""
+    first_response = LatencyHistogram()
+    first_item = LatencyHistogram()
+    total_duration = LatencyHistogram()
+    summary = {
+        "count": len(metrics),
+        "completed": 0,
+        "timed_out": 0,
+        "failed": 0,
+        "paginated": 0,
+    }
+    for m in metrics:
+        summary["completed"] += bool(m.get("completed", False))
+        summary["timed_out"] += bool(m.get("timed_out", False))
+        summary["failed"] += bool(m.get("failed", False))
+        summary["paginated"] += bool(m.get("is_paginated", False))
+        if m.get("first_response_latency") is not None:
+            first_response.record(m["first_response_latency"])
+        if m.get("time_to_first_item") is not None:
+            first_item.record(m["time_to_first_item"])
+        if m.get("total_duration") is not None:
+            total_duration.record(m["total_duration"])
+    count = summary["count"] or 1
+    summary["error_rate"] = summary["failed"] / count
+    summary["timeout_rate"] = summary["timed_out"] / count
+    summary["first_response_ms"] = first_response.percentiles_ms(PERCENTILES)
+    summary["time_to_first_item_ms"] = first_item.percentiles_ms(PERCENTILES)
+    summary["total_duration_ms"] = total_duration.percentiles_ms(PERCENTILES)
+    summary["first_response_histogram"] = first_response.to_dict()
+    summary["total_duration_histogram"] = total_duration.to_dict()
+    return summary
+
+
+def throughput_buckets(metrics, bucket_seconds=1.0) -> List[Dict[str, Any]]:
+    """Count sent, completed, failed and timed out requests per time bucket since the first request"""
+    start_times = [m["start_time"] for m in metrics if m.get("start_time")]
+    if not start_times:
+        return []
+    origin = min(start_times)
+    buckets = defaultdict(lambda: {"sent": 0, "completed": 0, "failed": 0, "timed_out": 0, "latency": LatencyHistogram()})
+    for m in metrics:
+        if m.get("start_time"):
+            sent = buckets[int((m["start_time"] - origin) // bucket_seconds)]
+            sent["sent"] += 1
+            sent["failed"] += bool(m.get("failed", False))
+            sent["timed_out"] += bool(m.get("timed_out", False))
+        if m.get("completed", False) and m.get("end_time"):
+            done = buckets[int((m["end_time"] - origin) // bucket_seconds)]
+            done["completed"] += 1
+            if m.get("total_duration") is not None:
+                done["latency"].record(m["total_duration"])
+    return [
+        {
+            "start_time": origin + index * bucket_seconds,
+            "sent": bucket["sent"],
+            "completed": bucket["completed"],
+            "failed": bucket["failed"],
+            "timed_out": bucket["timed_out"],
+            "total_duration_ms": bucket["latency"].percentiles_ms((50, 99)),
+        }
+        for index, bucket in sorted(buckets.items())
+    ]
+
+
+def benchmark_json(metrics, bucket_seconds=1.0) -> Dict[str, Any]:
+    """
+    Build the report in the shape of the server's benchmark.json, so plot_benchmark.py can show it:
+    one "batch_<time>_<run>" entry with batchsize, batchtime and speed per time bucket.
+    The summary of the whole run comes from benchmark_summary().
+    """
+    run = uuid.uuid4().hex[:4]
+    report = {}
+    for bucket in throughput_buckets(metrics, bucket_seconds):
+        key = datetime.fromtimestamp(bucket["start_time"]).strftime("batch_%Y_%m_%d_%H_%M_%S_%f")[:-3] + f"_{run}"
+        report[key] = {
+            "batchsize": bucket["completed"],
+            "batchtime": bucket_seconds,
+            "speed": bucket["completed"] / bucket_seconds,
+            **bucket,
+        }
+    return report
+
+
+def benchmark_summary(metrics) -> Dict[str, Any]:
+    """Summarize the whole run with a breakdown per request type, kept apart from the benchmark.json entries"""
+    request_types = defaultdict(list)
+    for m in metrics:
+        if m.get("request_type"):
+            request_types[m["request_type"]].append(m)
+    start_times = [m["start_time"] for m in metrics if m.get("start_time")]
+    end_times = [m["end_time"] for m in metrics if m.get("end_time")]
+    duration = max(end_times + start_times) - min(start_times) if start_times else 0.0
+    summary = summarize_metrics(metrics)
+    return {
+        "batchsize": summary["completed"],
+        "batchtime": duration,
+        "speed": summary["completed"] / duration if duration else 0.0,
+        **summary,
+        "request_types": {
+            req_type: summarize_metrics(type_metrics)
+            for req_type, type_metrics in sorted(request_types.items())
+        },
+    }
+
+
+def format_percentiles(values):
+    return ", ".join(
+        f"{name} {value:.1f} ms" if value is not None else f"{name} -"
+        for name, value in values.items()
+    )
+
+
 def generate_benchmark_report(metrics):
-    """Generate a report of performance metrics from the test run"""
+    """Generate a text and a JSON report of performance metrics from the test run"""
     if not metrics:
         print("No metrics available to generate report.")
         return
@@ -652,59 +822,19 @@ def generate_benchmark_report(metrics):
 
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     report_file = f"logs/benchmark_report_{timestamp}.txt"
-
-    total_clients = len(metrics)
-    completed_requests = sum(1 for m in metrics if m.get("completed", False))
-    timed_out_requests = sum(1 for m in metrics if m.get("timed_out", False))
-    failed_requests = sum(1 for m in metrics if m.get("failed", False))
-    paginated_requests = sum(1 for m in metrics if m.get("is_paginated", False))
+    json_file = f"logs/benchmark_report_{timestamp}.json"
+    summary_file = f"logs/benchmark_summary_{timestamp}.json"
+
+    report = benchmark_json(metrics)
+    summary = benchmark_summary(metrics)
+    buckets = list(report.values())
+    total_clients = summary["count"]
+    completed_requests = summary["completed"]
+    timed_out_requests = summary["timed_out"]
+    failed_requests = summary["failed"]
+    paginated_requests = summary["paginated"]
     non_paginated_requests = total_clients - paginated_requests
 
-    response_times = [
-        m.get("first_response_latency")
-        for m in metrics
-        if m.get("first_response_latency") is not None
-    ]
-    avg_response_time = (
-        sum(response_times) / len(response_times) if response_times else 0
-    )
-
-    total_durations = [
-        m.get("total_duration") for m in metrics if m.get("total_duration") is not None
-    ]
-    avg_total_duration = (
-        sum(total_durations) / len(total_durations) if total_durations else 0
-    )
-
-    request_types = {}
-    for m in metrics:
-        req_type = m.get("request_type")
-        if req_type:
-            if req_type not in request_types:
-                request_types[req_type] = {
-                    "count": 0,
-                    "completed": 0,
-                    "timed_out": 0,
-                    "failed": 0,
-                    "response_times": [],
-                }
-
-            request_types[req_type]["count"] += 1
-
-            if m.get("completed", False):
-                request_types[req_type]["completed"] += 1
-
-            if m.get("timed_out", False):
-                request_types[req_type]["timed_out"] += 1
-
-            if m.get("failed", False):
-                request_types[req_type]["failed"] += 1
-
-            if m.get("first_response_latency") is not None:
-                request_types[req_type]["response_times"].append(
-                    m.get("first_response_latency")
-                )
-
     # Generate report
     with open(report_file, "w") as f:
         f.write(f"MQTT CLIENT BENCHMARK REPORT - {timestamp}\n")
@@ -714,38 +844,55 @@ def generate_benchmark_report(metrics):
         f.write("-" * 30 + "\n")
         f.write(f"Total Clients: {total_clients}\n")
         f.write(f"Completed Requests: {completed_requests}\n")
-        f.write(f"Timed Out Requests: {timed_out_requests}\n")
-        f.write(f"Failed Requests: {failed_requests}\n")
-        f.write(f"Average Response Time: {avg_response_time:.3f} seconds\n")
-        f.write(f"Average Total Duration: {avg_total_duration:.3f} seconds\n")
+        f.write(f"Timed Out Requests: {timed_out_requests} ({summary['timeout_rate']:.2%})\n")
+        f.write(f"Failed Requests: {failed_requests} ({summary['error_rate']:.2%})\n")
+        f.write(f"Throughput: {summary['speed']:.1f} requests/s over {summary['batchtime']:.1f} seconds\n")
+        f.write(f"First Response Latency: {format_percentiles(summary['first_response_ms'])}\n")
+        f.write(f"Total Duration: {format_percentiles(summary['total_duration_ms'])}\n")
         f.write(f"Paginated Responses: {paginated_requests}\n")
         f.write(f"Non-paginated Responses: {non_paginated_requests}\n\n")
 
         f.write("REQUEST TYPE BREAKDOWN\n")
         f.write("-" * 30 + "\n")
-        for req_type, data in request_types.items():
-            avg_time = (
-                sum(data["response_times"]) / len(data["response_times"])
-                if data["response_times"]
-                else 0
-            )
+        for req_type, data in summary["request_types"].items():
             f.write(f"Type: {req_type}\n")
             f.write(f"  Count: {data['count']}\n")
             f.write(f"  Completed: {data['completed']}\n")
-            f.write(f"  Timed Out: {data['timed_out']}\n")
-            f.write(f"  Failed: {data['failed']}\n")
-            f.write(f"  Average Response Time: {avg_time:.3f} seconds\n\n")
+            f.write(f"  Timed Out: {data['timed_out']} ({data['timeout_rate']:.2%})\n")
+            f.write(f"  Failed: {data['failed']} ({data['error_rate']:.2%})\n")
+            f.write(f"  First Response Latency: {format_percentiles(data['first_response_ms'])}\n")
+            f.write(f"  Total Duration: {format_percentiles(data['total_duration_ms'])}\n\n")
+
+        f.write("THROUGHPUT PER SECOND\n")
+        f.write("-" * 30 + "\n")
+        for bucket in buckets:
+            second = bucket["start_time"] - buckets[0]["start_time"]
+            f.write(
+                f"{second:>5.0f} s: sent {bucket['sent']}, completed {bucket['completed']}, "
+                f"failed {bucket['failed']}, timed out {bucket['timed_out']}, "
+                f"{format_percentiles(bucket['total_duration_ms'])}\n"
+            )
+
+    with open(json_file, "w") as f:
+        json.dump(report, f, indent=2)
+    with open(summary_file, "w") as f:
+        json.dump(summary, f, indent=2)
 
     print("\n📊 BENCHMARK REPORT SUMMARY")
     print("-" * 30)
     print(f"Total Clients: {total_clients}")
     print(f"Completed Requests: {completed_requests}")
-    print(f"Timed Out Requests: {timed_out_requests}")
-    print(f"Failed Requests: {failed_requests}")
-    print(f"Average Response Time: {avg_response_time:.3f} seconds")
+    print(f"Timed Out Requests: {timed_out_requests} ({summary['timeout_rate']:.2%})")
+    print(f"Failed Requests: {failed_requests} ({summary['error_rate']:.2%})")
+    print(f"Throughput: {summary['speed']:.1f} requests/s")
+    print(f"First Response Latency: {format_percentiles(summary['first_response_ms'])}")
+    print(f"Total Duration: {format_percentiles(summary['total_duration_ms'])}")
     print(f"Paginated Responses: {paginated_requests}")
     print(f"Non-paginated Responses: {non_paginated_requests}")
     print(f"Full report saved to: {report_file}")
+    print(f"JSON report saved to: {json_file}")
+    print(f"JSON summary saved to: {summary_file}")
+    return report
 
 
 if __name__ == "__main__":
@@ -0,0 +1,117 @@
+"""
+Minimal MQTT 3.1.1 packet encoding for asyncio streams.
+
+Covers what the load generator and the broker stand-in need: CONNECT/CONNACK,
+SUBSCRIBE/SUBACK, PUBLISH with QoS 0 and 1, PUBACK, PINGREQ/PINGRESP and DISCONNECT.
+"""
+
+import struct
+
+CONNECT = 0x10
+CONNACK = 0x20
+PUBLISH = 0x30
+PUBACK = 0x40
+SUBSCRIBE = 0x80
+SUBACK = 0x90
+PINGREQ = 0xC0
+PINGRESP = 0xD0
+DISCONNECT = 0xE0
+
+
+def encode_length(length):
+    """Encode the remaining length as a variable byte integer"""
+    encoded = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        if length:
+            byte |= 0x80
+        encoded.append(byte)
+        if not length:
+            return bytes(encoded)
+
+
+def encode_string(value):
+    if isinstance(value, str):
+        value = value.encode()
+    return struct.pack("!H", len(value)) + value
+
+
+def decode_string(body, offset):
+    """Decode a length-prefixed string, returns it and the offset after it"""
+    (length,) = struct.unpack_from("!H", body, offset)
+    offset += 2
+    return body[offset:offset + length].decode(), offset + length
+
+
+def packet(header, body=b""):
+    return bytes([header]) + encode_length(len(body)) + body
+
+
+def connect_packet(client_id, username=None, password=None, keepalive=60, clean_session=True):
+    flags = 0x02 if clean_session else 0
+    payload = encode_string(client_id)
+    if username is not None:
+        flags |= 0x80
+        payload += encode_string(username)
+    if password is not None:
+        flags |= 0x40
+        payload += encode_string(password)
+    return packet(CONNECT, encode_string("MQTT") + bytes([4, flags]) + struct.pack("!H", keepalive) + payload)
+
+
+def subscribe_packet(packet_id, topics, qos=0):
+    body = struct.pack("!H", packet_id) + b"".join(encode_string(topic) + bytes([qos]) for topic in topics)
+    return packet(SUBSCRIBE | 0x02, body)
+
+
+def publish_packet(topic, payload, qos=0, packet_id=None):
+    if isinstance(payload, str):
+        payload = payload.encode()
+    body = encode_string(topic)
+    if qos:
+        body += struct.pack("!H", packet_id)
+    return packet(PUBLISH | (qos << 1), body + payload)
+
+
+def parse_publish(header, body):
+    """Returns the topic, payload, QoS and packet ID (None for QoS 0) of a PUBLISH body"""
+    qos = (header >> 1) & 0x03
+    topic, offset = decode_string(body, 0)
+    packet_id = None
+    if qos:
+        (packet_id,) = struct.unpack_from("!H", body, offset)
+        offset += 2
+    return topic, body[offset:], qos, packet_id
+
+
+async def read_packet(reader):
+    """Read one packet, returns its first header byte and its body"""
+    header = (await reader.readexactly(1))[0]
+    length = 0
+    multiplier = 1
+    while True:
+        byte = (await reader.readexactly(1))[0]
+        length += (byte & 0x7F) * multiplier
+        if not byte & 0x80:
+            break
+        multiplier *= 128
+        if multiplier > 128 ** 3:
+            raise ValueError("Malformed remaining length")
+    body = await reader.readexactly(length) if length else b""
+    return header, body
+
+
+def topic_matches(topic_filter, topic):
+    """Check a topic against a subscription filter with + and # wildcards"""
+    filter_levels = topic_filter.split("/")
+    topic_levels = topic.split("/")
+    for i, level in enumerate(filter_levels):
+        if level == "#":
+            return True
+        if i >= len(topic_levels):
+            return False
+        if level != "+" and level != topic_levels[i]:
+            return False
+    return len(filter_levels) == len(topic_levels)
+
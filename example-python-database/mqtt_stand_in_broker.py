@@ -0,0 +1,246 @@
+"""
+Local stand-in for the Mosquitto broker and the Rust request handler.
+
+Speaks enough MQTT 3.1.1 for the load generator and mqtt_multi_client.py: CONNECT,
+SUBSCRIBE with + and # wildcards, PUBLISH with QoS 0 and 1 (delivered with QoS 0),
+PINGREQ and DISCONNECT. Credentials are not checked. Requests published to rust/request
+are answered after --delay seconds on rust/response/<client>/<suffix> or
+rust/uuid/<client> like the Rust server does, responses with more than --page-size
+items are split into /page/<n> messages followed by a /summary.
+
+    python mqtt_stand_in_broker.py --port 1884 --delay 0.005 --items 20
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import uuid
+from collections import defaultdict
+
+from mqtt_packets import (
+    CONNACK,
+    CONNECT,
+    DISCONNECT,
+    PINGREQ,
+    PINGRESP,
+    PUBACK,
+    PUBLISH,
+    SUBACK,
+    SUBSCRIBE,
+    decode_string,
+    packet,
+    parse_publish,
+    publish_packet,
+    read_packet,
+    topic_matches,
+)
+
+REQUEST_TOPIC = "rust/request"
+RESPONSE_SUFFIXES = {
+    "all": "all",
+    "color": "color",
+    "time_range": "time_range",
+    "temperature_humidity": "temperature_humidity",
+    "timestamp": "timestamp",
+    "id_energy_cost": "energy_cost",
+    "id_energy_consume": "energy_consume",
+    "newestids": "newestids",
+    "newestsensordata": "newestsensordata",
+    "newestenergydata": "newestenergydata",
+    "relation": "relation",
+    "page": "page",
+    "addrobotdata": "add/robotdata",
+    "addsensordata": "add/sensordata",
+    "addenergydata": "add/energydata",
+    "delete": "delete",
+}
+
+
+class StandInBroker:
+    def __init__(self, host="127.0.0.1", port=1883, respond=True, delay=0.005, jitter=0.0, items=10, page_size=50, service_time=0.0):
+        """
+        Args:
+            respond: Answer requests on rust/request like the Rust server
+            delay: Seconds before a request is answered
+            jitter: Up to this many seconds are added to the delay at random
+            service_time: Seconds one request keeps the simulated server busy, requests queue up
+                beyond 1 / service_time requests per second
+            items: Number of items in a response
+            page_size: Responses with more items are paginated
+        """
+        self.host = host
+        self.port = port
+        self.respond = respond
+        self.delay = delay
+        self.jitter = jitter
+        self.items = items
+        self.page_size = page_size
+        self.service_time = service_time
+        self._busy_until = 0.0
+        # Filters without wildcards or with a trailing # are found by lookup, the rest by matching
+        self.subscriptions = defaultdict(set)
+        self.wildcard_filters = set()
+        self.requests = 0
+        self.published = 0
+        self._server = None
+
+    def _candidate_filters(self, topic):
+        levels = topic.split("/")
+        yield topic
+        yield "#"
+        for i in range(1, len(levels) + 1):
+            yield "/".join(levels[:i]) + "/#"
+        for topic_filter in self.wildcard_filters:
+            if topic_matches(topic_filter, topic):
+                yield topic_filter
+
+    def deliver(self, topic, payload):
+        """Send a message to every connection with a matching subscription, once per connection"""
+        message = None
+        writers = set()
+        for topic_filter in self._candidate_filters(topic):
+            writers.update(self.subscriptions.get(topic_filter, ()))
+        for writer in writers:
+            if message is None:
+                message = publish_packet(topic, payload)
+            writer.write(message)
+            self.published += 1
+
+    def subscribe(self, writer, topic_filter):
+        self.subscriptions[topic_filter].add(writer)
+        if "+" in topic_filter or ("#" in topic_filter and not topic_filter.endswith("/#") and topic_filter != "#"):
+            self.wildcard_filters.add(topic_filter)
+
+    def unsubscribe_all(self, writer, topic_filters):
+        for topic_filter in topic_filters:
+            subscribers = self.subscriptions.get(topic_filter)
+            if subscribers is None:
+                continue
+            subscribers.discard(writer)
+            if not subscribers:
+                del self.subscriptions[topic_filter]
+                self.wildcard_filters.discard(topic_filter)
+
+    async def _handle(self, reader, writer):
+        topic_filters = set()
+        try:
+            header, _ = await read_packet(reader)
+            if header & 0xF0 != CONNECT:
+                return
+            writer.write(packet(CONNACK, bytes([0, 0])))
+            while True:
+                header, body = await read_packet(reader)
+                kind = header & 0xF0
+                if kind == PUBLISH:
+                    topic, payload, qos, packet_id = parse_publish(header, body)
+                    if qos == 1:
+                        writer.write(packet(PUBACK, packet_id.to_bytes(2, "big")))
+                    if topic == REQUEST_TOPIC and self.respond:
+                        self._schedule_response(payload)
+                    self.deliver(topic, payload)
+                elif kind == SUBSCRIBE:
+                    offset = 2
+                    granted = bytearray()
+                    while offset < len(body):
+                        topic_filter, offset = decode_string(body, offset)
+                        offset += 1
+                        self.subscribe(writer, topic_filter)
+                        topic_filters.add(topic_filter)
+                        granted.append(0)
+                    writer.write(packet(SUBACK, body[:2] + bytes(granted)))
+                elif kind == PINGREQ:
+                    writer.write(packet(PINGRESP))
+                elif kind == DISCONNECT:
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self.unsubscribe_all(writer, topic_filters)
+            writer.close()
+
+    def _schedule_response(self, payload):
+        try:
+            request = json.loads(payload)
+            client_id = request["client_id"]
+        except (ValueError, KeyError, TypeError):
+            return
+        self.requests += 1
+        loop = asyncio.get_running_loop()
+        delay = self.delay + random.uniform(0, self.jitter)
+        if self.service_time:
+            # One request at a time, like a server at its limit
+            self._busy_until = max(self._busy_until, loop.time()) + self.service_time
+            delay += self._busy_until - loop.time()
+        loop.call_later(delay, self._respond, request, client_id)
+
+    def _respond(self, request, client_id):
+        kind = request.get("request")
+        items = [
+            {"uuid": str(uuid.uuid4()), "color": "red", "temperature": 22.5, "humidity": 45.0}
+            for _ in range(self.items)
+        ]
+        if kind == "uuid":
+            self.deliver(f"rust/uuid/{client_id}", json.dumps(items[:1]))
+            return
+        suffix = RESPONSE_SUFFIXES.get(kind)
+        if suffix is None:
+            self.deliver(f"rust/response/{client_id}/error", json.dumps({"status": "error", "message": "Unknown request"}))
+            return
+        topic = f"rust/response/{client_id}/{suffix}"
+        if kind == "page":
+            page = request.get("data", 1)
+            total_pages = max(1, -(-self.items // self.page_size))
+            content = items[(page - 1) * self.page_size:page * self.page_size]
+            self.deliver(topic, json.dumps({"total_pages": total_pages, "current_page": page, "page_content": content}))
+        elif len(items) <= self.page_size:
+            self.deliver(topic, json.dumps(items))
+        else:
+            request_id = str(uuid.uuid4())
+            pages = [items[i:i + self.page_size] for i in range(0, len(items), self.page_size)]
+            for number, data in enumerate(pages, 1):
+                self.deliver(f"{topic}/page/{number}", json.dumps({
+                    "type": "paginated", "request_id": request_id, "page": number,
+                    "total_pages": len(pages), "data": list(enumerate(data)),
+                }))
+            self.deliver(f"{topic}/summary", json.dumps({
+                "type": "summary", "request_id": request_id, "total_pages": len(pages),
+                "total_items": len(items), "topic_base": topic,
+            }))
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the MQTT broker and the Rust request handler")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--delay", type=float, default=0.005, help="Seconds before a request is answered")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random extra delay in seconds")
+    parser.add_argument("--items", type=int, default=10, help="Items per response")
+    parser.add_argument("--page-size", type=int, default=50, help="Responses with more items are paginated")
+    parser.add_argument("--service-time", type=float, default=0.0, help="Seconds per request of a simulated server that answers one request at a time")
+    parser.add_argument("--no-respond", action="store_true", help="Only act as a broker")
+    args = parser.parse_args()
+    broker = await StandInBroker(
+        args.host, args.port, not args.no_respond, args.delay, args.jitter, args.items, args.page_size, args.service_time
+    ).start()
+    print(f"MQTT stand-in listening on {broker.host}:{broker.port}")
+    try:
+        while True:
+            await asyncio.sleep(10)
+            print(f"{broker.requests} requests answered, {broker.published} messages delivered")
+    finally:
+        await broker.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())